@@ -4,9 +4,12 @@
 """
 
 import math
+import os
 import struct
+import concurrent.futures
 import numpy as np
 import pangea.dxextractobj
+import pangea.dxheaders
 import logging
 
 
@@ -15,8 +18,10 @@ logger = logging.getLogger(__name__)
 __version__ = '$Revision:  $'[11:-2]
 
 SAMPLE_BYTE_LEN = 4 # Corresponds to lsb format of data
+DATA_DTYPE = np.dtype('<f4')
 MAXFLOAT = 3.40282347e+38 ## stands for undefined values of parameters
 MAXFLOAT09 = 0.9*3.40282347e+38 ## stands for undefined values of parameters
+MERGE_CHUNKS_PER_WORKER = 4 # inline ranges per worker process, for load balancing and progress reporting
 
 def scalar_prod(xx, yy):
     return sum(x*y for x, y in zip(xx, yy))
@@ -33,6 +38,9 @@ def mult_by_scalar(x, a):
 def round(x):
     return math.floor(x+0.5)
 
+def _as_type(a, dtype):
+    return a if dtype is None else a.astype(dtype)
+
 #######  Utility functions ####
 
 def join_time_axes(t1, t2):
@@ -59,6 +67,23 @@ def recalculate_trace_to_new_time_axis(trace, t1, t_new):
         return trace[i]*(1.-alpha) + trace[i+1]*alpha
     return tuple(trace_value(t_new[0] + i*t_new[1]) for i in range(t_new[2]))
 
+def recalculate_traces_to_new_time_axis(block, t1, t_new):
+    """Vectorized version of recalculate_trace_to_new_time_axis: recalculates block of traces of the shape
+    (n_traces, t1[2]) to the time axis t_new, returns array (n_traces, t_new[2]) of float64"""
+    block = np.asarray(block, dtype=np.float64)
+    n = t1[2]
+    ind = ((t_new[0] + np.arange(t_new[2]) * t_new[1]) - t1[0]) / t1[1]
+    in_range = (ind >= 0) & (ind <= n-1)
+    i0 = np.clip(np.floor(ind), 0, n-1).astype(np.int64)
+    alpha = ind - np.floor(ind)
+    i1 = np.minimum(i0 + 1, n-1)
+    v0 = block[:, i0]
+    v1 = block[:, i1]
+    res = np.where((v0 > MAXFLOAT09) | (v1 > MAXFLOAT09), MAXFLOAT, v0*(1.-alpha) + v1*alpha)
+    res = np.where(i0 == n-1, v0, res)
+    res[:, ~in_range] = MAXFLOAT
+    return res
+
 class DXCube(object):
     "Base class, implements base methods dealing with geometry, etc."
     def __init__(self, object_name=None):
@@ -74,6 +99,7 @@ class DXCube(object):
         self.filename = None
         self.file = None
         self.data_start = None
+        self.data = None  # memory-mapped data, see map_data
         self.UNDEF_TRACE = None
         self.object_name = object_name
 
@@ -92,6 +118,8 @@ class DXCube(object):
             self.file.close()
             self.file = None
             # logger.debug('File %s closed', self.filename)
+        # The mapping is released when the last view of it is garbage collected
+        self.data = None
         return self
 
     def reopen(self):
@@ -147,10 +175,10 @@ class DXCube(object):
         self.set_geometry(origin, v_i, v_x, n_i, n_x)
         return self
 
-    def attach_to_file(self, filename):
-        "Get geometry from DX file with the name filename, and set current geometry accordingly"
-        dx = pangea.dxextractobj.DXParser()
-        dx.parse(filename)
+    def attach_to_file(self, filename, use_mmap=False):
+        """Get geometry from DX file with the name filename, and set current geometry accordingly.
+        If use_mmap is True data of cube are memory-mapped (see map_data)."""
+        dx = pangea.dxheaders.parse_header(filename)
         regarray = None
         for o in dx.obj_list:
             if o.get_class() == 'gridpositions':
@@ -165,7 +193,40 @@ class DXCube(object):
         self.reopen()
         assert (dx.data_list[0][1] == 0) # starting address of data
         assert (dx.data_list[0][0].get_data_repr() == 'lsb')  # data format
+        if use_mmap:
+            self.map_data()
+        return self
+
+    def map_data(self):
+        """Maps data of cube to memory (read only). Data are then accessible as numpy array
+        self.data of the shape (n_i, n_x, n_samples) and type '<f4', traces, inlines, cross-lines
+        and time slices are returned as views of it without reading and copying."""
+        if self.data is None:
+            self.data = np.memmap(self.filename, dtype=DATA_DTYPE, mode='r', offset=self.data_start,
+                                  shape=(self.n_i, self.n_x, self.n_samples))
         return self
+
+    def get_trace_view(self, inl, xln, dtype=None):
+        """Returns trace (inl, xln) as a view of memory-mapped data, the copy of
+        type dtype (e.g. np.float64) is made only if dtype is given. Same for other *_view methods."""
+        assert (inl >= 0) and (inl < self.n_i)
+        assert (xln >= 0) and (xln < self.n_x)
+        return _as_type(self.map_data().data[inl, xln], dtype)
+
+    def get_inline_view(self, inl, dtype=None):
+        "Returns inline inl as array of the shape (n_x, n_samples)"
+        assert (inl >= 0) and (inl < self.n_i)
+        return _as_type(self.map_data().data[inl], dtype)
+
+    def get_xline_view(self, xln, dtype=None):
+        "Returns cross-line xln as array of the shape (n_i, n_samples), the view is strided"
+        assert (xln >= 0) and (xln < self.n_x)
+        return _as_type(self.map_data().data[:, xln], dtype)
+
+    def get_time_slice_view(self, k, dtype=None):
+        "Returns time slice with sample index k as array of the shape (n_i, n_x), the view is strided"
+        assert (k >= 0) and (k < self.n_samples)
+        return _as_type(self.map_data().data[:, :, k], dtype)
     
     def inl_xln_coordinates(self, inl_xln):
         x = self.origin[0] + inl_xln[0] * self.v_i[0] + inl_xln[1] * self.v_x[0]
@@ -187,6 +248,8 @@ class DXCube(object):
         "Return trace as a list of floats corresponding to inl, xln"
         assert (inl >= 0) and (inl < self.n_i)
         assert (xln >= 0) and (xln < self.n_x)
+        if self.data is not None:
+            return tuple(self.data[inl, xln].tolist())
         self.file.seek(self.data_start + (inl*self.n_x + xln)*self.n_samples*SAMPLE_BYTE_LEN)
         buf = self.file.read(self.n_samples*SAMPLE_BYTE_LEN)
         format = '<%df' % self.n_samples
@@ -196,10 +259,11 @@ class DXCube(object):
         "Return trace as a list of floats corresponding to inl, xln"
         assert (inl >= 0) and (inl < self.n_i)
         assert (xln >= 0) and (xln < self.n_x)
+        if self.data is not None:
+            return self.data[inl, xln].astype(np.float64)
         self.file.seek(self.data_start + (inl*self.n_x + xln)*self.n_samples*SAMPLE_BYTE_LEN)
         buf = self.file.read(self.n_samples*SAMPLE_BYTE_LEN)
-        dt = np.dtype('<f')
-        return np.fromstring(buf, dtype=dt).astype(np.float64)
+        return np.frombuffer(buf, dtype=DATA_DTYPE).astype(np.float64)
 
     def xy_to_inline_xline(self, x, y):
         "Convert coordinates into inline-xline numbers"
@@ -210,6 +274,21 @@ class DXCube(object):
         xln = round(xln_coord / self.norm_v_x)
         return (int(inl), int(xln))
 
+    def xy_to_inline_xline_np(self, x, y):
+        """Vectorized is_point_inside and xy_to_inline_xline for arrays of coordinates x, y.
+        Returns tuple (inside, inl, xln): mask of points inside cube and numbers of the nearest traces
+        (the nearest trace of a point near the far border may be outside of the cube)."""
+        px = x - self.origin[0]
+        py = y - self.origin[1]
+        proj_i = px * self.v_i[0] + py * self.v_i[1]
+        proj_x = px * self.v_x[0] + py * self.v_x[1]
+        iinl = proj_i / (self.norm_v_i * self.norm_v_i)
+        ixl = proj_x / (self.norm_v_x * self.norm_v_x)
+        inside = (iinl >= 0) & (iinl < self.n_i) & (ixl >= 0) & (ixl < self.n_x)
+        inl = np.floor(proj_i / self.norm_v_i / self.norm_v_i + 0.5).astype(np.int64)
+        xln = np.floor(proj_x / self.norm_v_x / self.norm_v_x + 0.5).astype(np.int64)
+        return inside, inl, xln
+
     def get_nearest_trace_by_coords(self, x, y):
         "Returns the neares trace inside the cube geometry, otherwise return trace filled with MAX_FLOATS"
         inl, xln = self.xy_to_inline_xline(x, y)
@@ -273,7 +352,7 @@ class DXCubeWriter(DXCube):
         origin = geom[0]
         if len(origin) == 2:
             origin += (0,)
-        self.set_geometry_tp(geom)
+        self.set_geometry_tp((origin,) + tuple(geom[1:]))
         self.set_time_axis(time_axis[0], time_axis[1], time_axis[2])
         self.filename = filename
         if self.filename:
@@ -365,80 +444,120 @@ end
         buf = trace.astype(dt).tobytes()
         self.file.write(buf)
 
+    def np_write_inline(self, block, inl):
+        """
+        Writes the whole inline as one contiguous slab.
+        :param block: array of the shape (n_x, n_samples)
+        :param inl: inline number
+        """
+        assert block.shape == (self.n_x, self.n_samples)
+        assert (inl >= 0) and (inl < self.n_i)
+        self.file.seek(self.data_start + inl*self.n_x*self.n_samples*SAMPLE_BYTE_LEN)
+        self.file.write(np.ascontiguousarray(block, dtype=DATA_DTYPE).tobytes())
+
     def _write_last_trace(self):
         self.write_empty_trace_at_ij(self.n_i-1, self.n_x-1)
 
 #################### Algorithm of joining cubes
-def join_cubes(fname1, fname2, fname_out, messenger = None):
+def merge_inlines(cj, cubes, inlines, messenger=None):
+    """Fills inlines (numbers) of the output cube cj with traces of cubes. Every output trace is taken
+    from the first cube containing it whose nearest trace is defined (its first sample is not undef),
+    the trace is recalculated to the time axis of cj. Traces of one inline are processed at once and
+    written as a contiguous slab. Returns number of traces taken from cubes."""
+    t_new = cj.time_axis()
+    jj = np.arange(cj.n_x)
+    n_from_cubes = 0
+    for k, inl in enumerate(inlines):
+        x = cj.origin[0] + inl * cj.v_i[0] + jj * cj.v_x[0]
+        y = cj.origin[1] + inl * cj.v_i[1] + jj * cj.v_x[1]
+        out = np.full((cj.n_x, cj.n_samples), MAXFLOAT, dtype=np.float64)
+        not_written = np.ones(cj.n_x, dtype=bool)
+        for c in cubes:
+            inside, c_inl, c_xln = c.xy_to_inline_xline_np(x, y)
+            sel = np.nonzero(not_written & inside & (c_inl < c.n_i) & (c_xln < c.n_x))[0]
+            if len(sel) == 0:
+                continue
+            tr = c.map_data().data[c_inl[sel], c_xln[sel]]
+            defined = tr[:, 0] <= MAXFLOAT09   # Undef trace - try another cube
+            sel = sel[defined]
+            out[sel] = recalculate_traces_to_new_time_axis(tr[defined], c.time_axis(), t_new)
+            not_written[sel] = False
+            n_from_cubes += len(sel)
+        cj.np_write_inline(out, inl)
+        if messenger:
+            messenger.setGauge(k+1, len(inlines))
+    return n_from_cubes
+
+# State of worker process of merge_cubes_parallel: output cube and input cubes
+_merge_worker_state = {}
+
+def _merge_worker_init(in_fnames, out_fname, geom, time_axis, data_start):
+    _merge_worker_state['cubes'] = [DXCube().attach_to_file(f, use_mmap=True) for f in in_fnames]
+    cj = DXCubeWriter(geom=geom, time_axis=time_axis)
+    cj.filename = out_fname
+    cj.data_start = data_start
+    _merge_worker_state['cj'] = cj.reopen()
+
+def _merge_worker(inl_start, inl_end):
+    cj = _merge_worker_state['cj']
+    n_from_cubes = merge_inlines(cj, _merge_worker_state['cubes'], range(inl_start, inl_end))
+    cj.file.flush()
+    return inl_end - inl_start, n_from_cubes
+
+def merge_cubes_parallel(cj, in_fnames, n_workers=None, messenger=None):
+    """Same as merge_inlines for all inlines of cj, but ranges of inlines are processed by n_workers
+    processes (number of CPUs by default). Workers read input cubes (files in_fnames) through mmap
+    and write disjoint regions of the output file of cj, which must be already created.
+    Progress of all the workers is reported to messenger. Returns number of traces taken from cubes."""
+    n_workers = n_workers or os.cpu_count()
+    cj.file.flush()
+    chunk = max(1, int(math.ceil(cj.n_i / (n_workers * MERGE_CHUNKS_PER_WORKER))))
+    n_done = 0
+    n_from_cubes = 0
+    init_args = (in_fnames, cj.filename, cj.geometry(), cj.time_axis(), cj.data_start)
+    with concurrent.futures.ProcessPoolExecutor(n_workers, initializer=_merge_worker_init, initargs=init_args) as ex:
+        futures = [ex.submit(_merge_worker, i, min(i + chunk, cj.n_i)) for i in range(0, cj.n_i, chunk)]
+        for f in concurrent.futures.as_completed(futures):
+            n, n_cubes = f.result()
+            n_done += n
+            n_from_cubes += n_cubes
+            if messenger:
+                messenger.setGauge(n_done, cj.n_i)
+    return n_from_cubes
+
+def _merge_files(in_fnames, geom, time_axis, fname_out, messenger, n_workers):
+    cj = DXCubeWriter(geom=geom, time_axis=time_axis, filename=fname_out)
+    if n_workers == 1:
+        cubes = [DXCube().attach_to_file(f, use_mmap=True) for f in in_fnames]
+        n_from_cubes = merge_inlines(cj, cubes, range(cj.n_i), messenger)
+    else:
+        n_from_cubes = merge_cubes_parallel(cj, in_fnames, n_workers, messenger)
+    cj.close()
+    print('Total number of traces written:', cj.number_of_traces())
+    print('Number of points taken from cubes:', n_from_cubes)
+
+def join_cubes(fname1, fname2, fname_out, messenger = None, n_workers = 1):
+    """Joins two cubes into one covering both of them. With n_workers != 1 the output is
+    computed by n_workers processes (None - number of CPUs)"""
     c1 = DXCube()
     c1.attach_to_file(fname1)
     c2 = DXCube()
     c2.attach_to_file(fname2)
     wr = c1.calculate_wraparound_geometry([c2])
     tj = join_time_axes(c1.time_axis(), c2.time_axis())
-    cj = DXCubeWriter(wr, tj, filename=fname_out)
-    n_total = 0
-    n_from_cubes = 0
-    n_final_number_of_traces = cj.number_of_traces()
-    for x, y in cj.traces_coords_iter():
-        trace_not_yet_written = True
-        for c in [c1, c2]:
-            if c.is_point_inside((x, y)):
-#                print 'DEBUG: will write', x, y, c
-                tr = c.get_nearest_trace_by_coords(x, y)
-                if tr[0] > MAXFLOAT09:
-                    #Undef trace - try another cube.
-                    #print 'trace undef', tr[0]
-                    continue
-                new_tr = recalculate_trace_to_new_time_axis(tr, c.time_axis(), cj.time_axis())
-                cj.write_trace_at_xy(new_tr, x, y)
-                trace_not_yet_written = False
-                n_from_cubes += 1
-                break
-        #print 'DEBUG: will write empty trace', x, y
-        if trace_not_yet_written:
-            cj.write_empty_trace_at_xy(x, y)
-        n_total += 1
-        if messenger:
-            messenger.setGauge(n_total, n_final_number_of_traces)
-    print('Total number of traces written:', n_total)
-    print('Number of points taken from cubes:', n_from_cubes)
+    c1.close()
+    c2.close()
+    _merge_files([fname1, fname2], wr, tj, fname_out, messenger, n_workers)
 
 
-def reduce_cube_geometry(fname1, fname2, fname_out, messenger = None):
+def reduce_cube_geometry(fname1, fname2, fname_out, messenger = None, n_workers = 1):
+    """Recalculates cube fname2 to the geometry and time axis of fname1, see join_cubes for n_workers"""
     c1 = DXCube()
     c1.attach_to_file(fname1)
-    c2 = DXCube()
-    c2.attach_to_file(fname2)
     wr = c1.geometry()
     tj = c1.time_axis()
-    cj = DXCubeWriter(wr, tj, filename=fname_out)
-    n_total = 0
-    n_from_cubes = 0
-    n_final_number_of_traces = cj.number_of_traces()
-    for x, y in cj.traces_coords_iter():
-        trace_not_yet_written = True
-        for c in [c2]:
-            if c.is_point_inside((x, y)):
-#                print 'DEBUG: will write', x, y, c
-                tr = c.get_nearest_trace_by_coords(x, y)
-                if tr[0] > MAXFLOAT09:
-                    #Undef trace - try another cube.
-                    #print 'trace undef', tr[0]
-                    continue
-                new_tr = recalculate_trace_to_new_time_axis(tr, c.time_axis(), cj.time_axis())
-                cj.write_trace_at_xy(new_tr, x, y)
-                trace_not_yet_written = False
-                n_from_cubes += 1
-                break
-        #print 'DEBUG: will write empty trace', x, y
-        if trace_not_yet_written:
-            cj.write_empty_trace_at_xy(x, y)
-        n_total += 1
-        if messenger:
-            messenger.setGauge(n_total, n_final_number_of_traces)
-    print('Total number of traces written:', n_total)
-    print('Number of points taken from cubes:', n_from_cubes)
+    c1.close()
+    _merge_files([fname2], wr, tj, fname_out, messenger, n_workers)
 
 if __name__ == '__main__':
     import sys
@@ -56,9 +56,8 @@ class DXObject:
 
     def get_class(self):
         """Returns class of the object"""
-        l = self.get_description_strings()
         # Check if there are cashed values:
-        if not self.dxclass:
+        if self.dxclass:
             return self.dxclass
         # This is first invocation of the function, so let us
         # compute rank and shape
@@ -328,6 +327,69 @@ class DXObject:
         strout += 'Data length: ' + str(self.get_data_length())
         return strout
 
+class ParsedDXObject(DXObject):
+    """DXObject with all the fields extracted from description in advance (by DXHeaderParser or from_object),
+    getters return the stored values without matching the description again.
+    fields - dictionary with keys: id, dxclass, description, start, end, header_line, ext_file,
+    rank_shape, items_no, data_type, data_repr, data_addr, data_length, regarray."""
+    @classmethod
+    def from_object(cls, o):
+        "Makes ParsedDXObject of DXObject o parsed by DXParser, calling each of its getters once"
+        f = {'id': o.id, 'description': o.description, 'start': o.start, 'end': o.end, 'header_line': o.header_line}
+        f['dxclass'] = o.get_class()
+        f['rank_shape'] = o.get_rank_shape()
+        f['items_no'] = o.get_items_no()
+        f['data_type'] = o.get_data_type()
+        f['data_repr'] = o.get_data_repr()
+        f['data_addr'] = o.get_data_addr()
+        f['ext_file'] = o.ext_file  # set by get_data_addr
+        try:
+            f['data_length'] = o.get_data_length()
+        except TypeError:
+            f['data_length'] = None
+        try:
+            f['regarray'] = o.get_regarray_params()
+        except ValueError:
+            f['regarray'] = None
+        return cls(f)
+
+    def __init__(self, fields):
+        super().__init__()
+        self.fields = fields
+        for f in ('id', 'dxclass', 'description', 'start', 'end', 'header_line', 'ext_file', 'items_no', 'data_type', 'data_repr'):
+            setattr(self, f, fields[f])
+        self.rank, self.shape = fields['rank_shape']
+        self._data_addr = fields['data_addr']
+        self._data_length = fields['data_length']
+        self._regarray = fields['regarray']
+
+    def get_class(self):
+        return self.dxclass
+
+    def get_rank_shape(self):
+        return (self.rank, self.shape)
+
+    def get_items_no(self):
+        return self.items_no
+
+    def get_data_type(self):
+        return self.data_type
+
+    def get_data_repr(self):
+        return self.data_repr
+
+    def get_data_addr(self):
+        return self._data_addr
+
+    def get_data_length(self):
+        if self._data_length is None:
+            raise TypeError('Unsupported type %s for object %s' % (self.data_type, self.id))
+        return self._data_length
+
+    def get_regarray_params(self):
+        # copy, callers may modify lists
+        return None if self._regarray is None else [list(a) for a in self._regarray]
+
 ##############################################################################
 # End DXObject
 ##############################################################################
@@ -343,7 +405,7 @@ class LineGeomFromDX:
     (field should have name attribute).
     '''
     def __init__(self, f_name):
-        dx = DXParser()
+        dx = DXHeaderParser()
         self.f_name = f_name
         dx.parse(f_name)
         self.is_optimized = 0
@@ -553,7 +615,7 @@ class Horizon3DFromDX:
     def __init__(self, file_name):
         "Get geometry from DX file with the name filename, and set current geometry accordingly"
         self.file_name = file_name
-        dx = pangea.dxextractobj.DXParser()
+        dx = DXHeaderParser()
         dx.parse(file_name)
         regarray = None
         for o in dx.obj_list:
@@ -891,6 +953,166 @@ class DXParser:
 
 
 
+# Regular expressions used by DXHeaderParser, they are applied to the header line of object (stripped)
+_RE_CLASS = re.compile(r'^object\s+\S+\s+class\s+(\S+)')
+_RE_CLASS_QUOTED = re.compile(r'^object\s+"[^"]+"\s+class\s+(\S+)')
+_RE_ID = re.compile(r'^object\s+(\S+)\s')
+_RE_HEADER = re.compile(r'^object\s+')
+_RE_DATA_LINE = re.compile(r'^object\s+.*data\s+')
+_RE_DATA_EXT = re.compile(r'^object\s+.*data\s+file\s+(\S+)\s*,\s*(\w+)')
+_RE_DATA = re.compile(r'^object\s+.*data\s+(\w+)')
+_RE_TYPE = re.compile(r'^object\s+.*type\s+(\w+)')
+_RE_ITEMS = re.compile(r'^object\s+.*items\s+(\d+)')
+_RE_RANK = re.compile(r'^object\s+.*rank\s+(\d+)')
+_RE_SHAPE = re.compile(r'^object\s+.*shape\s+(\d+)')
+_RE_IEEE = re.compile(r'^object.*ieee\s+')
+_RE_MSB = re.compile(r'^object.*msb\s+')
+_RE_LSB = re.compile(r'^object.*lsb\s+')
+_RE_COUNTS = re.compile(r'^object\s+.*count[s]{0,1}\s+(\d+.*)')
+_RE_ORIGIN = re.compile(r'^origin\s+([ eE\d\.\-\+]+)')
+_RE_DELTA = re.compile(r'^delta\s+([ eE\d\.\-\+]+)')
+
+HEADER_READ_SIZE = 65536  # size of blocks the header is read by
+
+
+class DXHeaderParser(DXParser):
+    """Single pass parser of DX header, same interface as DXParser (obj_list, datastart, data_list).
+    The header (up to the "end" line) is read by large blocks, split into objects, and
+    all the fields of every object are extracted at once into ParsedDXObject."""
+
+    @staticmethod
+    def read_header(fin):
+        """Reads file fin from the start up to and including the line "end".
+        Returns (header bytes, datastart), the whole file is returned if there is no "end" line."""
+        buf = b''
+        while True:
+            if buf.startswith(b'end\n'):
+                return buf[:4], 4
+            pos = buf.find(b'\nend\n', max(0, len(buf) - HEADER_READ_SIZE - 4))
+            if pos >= 0:
+                return buf[:pos + 5], pos + 5
+            block = fin.read(HEADER_READ_SIZE)
+            if not block:
+                return buf, len(buf)
+            buf += block
+
+    @staticmethod
+    def decode_object(lines, start, end):
+        "Makes ParsedDXObject of lines (with line ends) of its description, start and end are byte offsets"
+        description = ''.join(lines)
+        stripped = [s.strip() for s in lines]
+        header_line = -1
+        for i, s in enumerate(stripped):
+            if _RE_HEADER.match(s):
+                header_line = i
+                break
+        h = stripped[header_line] if header_line >= 0 else ''
+        raw_h = lines[header_line] if header_line >= 0 else ''
+        f = {'description': description, 'start': start, 'end': end, 'header_line': header_line, 'ext_file': ''}
+        mo = _RE_CLASS.match(raw_h) or _RE_CLASS_QUOTED.match(raw_h)
+        f['dxclass'] = mo.group(1) if mo else ''
+        mo = _RE_ID.match(raw_h)
+        f['id'] = mo.group(1) if mo else ''
+        # data address
+        addr = None
+        mo = _RE_DATA_EXT.match(h)
+        if mo:
+            f['ext_file'] = mo.group(1)
+            addr = int(mo.group(2))
+        else:
+            mo = _RE_DATA.match(h)
+            if mo:
+                addr = mo.group(1)
+                if addr != 'follows':
+                    try:
+                        addr = int(addr)
+                    except ValueError:
+                        addr = None
+        f['data_addr'] = addr
+        mo = _RE_TYPE.match(h)
+        f['data_type'] = mo.group(1) if mo else ''
+        mo = _RE_ITEMS.match(h)
+        f['items_no'] = int(mo.group(1)) if mo else 0
+        rank = None
+        shape = 0
+        mo = _RE_RANK.match(h)
+        if mo:
+            rank = int(mo.group(1))
+        if rank is not None and rank > 0:
+            mo = _RE_SHAPE.match(h)
+            shape = int(mo.group(1)) if mo else None
+        f['rank_shape'] = (rank, shape)
+        # representation of data
+        data_repr = None
+        if f['dxclass'] in ('array', 'constantarray'):
+            if _RE_IEEE.match(h):
+                data_repr = 'msb' if _RE_MSB.match(h) else ('lsb' if _RE_LSB.match(h) else 'ieee')
+            else:
+                data_repr = 'ascii'
+        f['data_repr'] = data_repr
+        # length of data
+        length = 0
+        if f['dxclass'] == 'array':
+            if data_repr == 'ascii':
+                length = f['items_no']
+            elif f['data_type'] in ('float', 'int') and rank is not None:
+                ul = 4
+                if rank > 0:
+                    ul = ul * rank * shape
+                length = ul * f['items_no']
+            else:
+                length = None  # unsupported type
+        f['data_length'] = length
+        # regular array parameters
+        regarray = None
+        mo = _RE_COUNTS.match(h)
+        if mo:
+            try:
+                ans = [list(map(int, mo.group(1).split()))]
+                orgn = None
+                deltas = []
+                for s in stripped:
+                    mo = _RE_ORIGIN.match(s)
+                    if mo:
+                        orgn = list(map(float, mo.group(1).split()))
+                    mo = _RE_DELTA.match(s)
+                    if mo:
+                        deltas.append(list(map(float, mo.group(1).split())))
+                if orgn is not None and deltas:
+                    regarray = ans + [orgn] + deltas
+            except ValueError:
+                regarray = None
+        f['regarray'] = regarray
+        return ParsedDXObject(f), bool(_RE_DATA_LINE.match(raw_h))
+
+    def parse(self, file_name):
+        self.input_file_name = file_name
+        self.obj_list = []
+        self.data_list = []
+        with open(file_name, 'rb') as fin:
+            header, self.datastart = self.read_header(fin)
+        has_end = header.endswith(b'end\n') and (len(header) == 4 or header.endswith(b'\nend\n'))
+        end_pos = len(header) - 4 if has_end else len(header)
+        parts = header[:end_pos].decode('utf-8').split('\n')
+        lines = [l + '\n' for l in parts[:-1]] + ([parts[-1]] if parts[-1] else [])
+        # byte offsets of lines are needed for start/end of objects
+        offsets = []
+        pos = 0
+        for l in lines:
+            offsets.append(pos)
+            pos += len(l.encode('utf-8'))
+        offsets.append(end_pos)
+        # every line starting with "object" starts new object, lines preceding the first one belong to it
+        starts = [0] + [i for i, l in enumerate(lines) if l.startswith('object')][1:]
+        bounds = starts + [len(lines)]
+        for k in range(len(starts)):
+            i0, i1 = bounds[k], bounds[k + 1]
+            o, has_data = self.decode_object(lines[i0:i1], offsets[i0], offsets[i1])
+            self.obj_list.append(o)
+            if has_data:
+                self.data_list.append((o, o.get_data_addr(), o.get_data_length()))
+
+
 def test(filename = '/home/pangea/efremov/QQQ1/hord.dx'):
     # /home/pangea/efremov/tmp/OpenDX/dxsamples-4.0.8/data/topo_one_deg.dx
     dx = DXParser()
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+# $Id: $
+""" Cache of parsed headers of DX files. Headers are parsed by DXHeaderParser once, the decoded
+description of objects (class, rank/shape, items, representation, data address and length,
+regular array parameters) is kept in LRU cache keyed by file path and checked against
+modification time and size of the file. Optionally the decoded header is saved to a sidecar
+file (JSON) in a separate directory, so that it survives restarts of the process.
+"""
+
+import collections
+import hashlib
+import json
+import logging
+import os
+import threading
+
+import pangea.dxextractobj
+
+logger = logging.getLogger(__name__)
+
+__version__ = '$Revision:  $'[11:-2]
+
+HEADER_CACHE_SIZE = 1024  # number of headers kept in memory
+SIDECAR_FORMAT = 1
+
+class DXHeader:
+    """Parsed header of DX file with the same attributes as DXParser after parse():
+    input_file_name, obj_list, datastart, data_list. Should not be modified, it is shared."""
+    def __init__(self, file_name, datastart, objects, data_ids):
+        self.input_file_name = file_name
+        self.datastart = datastart
+        self.obj_list = [pangea.dxextractobj.ParsedDXObject(d) for d in objects]
+        self.data_list = [(o, o.get_data_addr(), o.get_data_length()) for o, has_data in zip(self.obj_list, data_ids) if has_data]
+        self._objects = objects
+        self._data_ids = data_ids
+
+    @classmethod
+    def parse(cls, file_name):
+        dx = pangea.dxextractobj.DXHeaderParser()
+        dx.parse(file_name)
+        with_data = set(id(item[0]) for item in dx.data_list)
+        return cls(file_name, dx.datastart, [o.fields for o in dx.obj_list],
+                   [id(o) in with_data for o in dx.obj_list])
+
+    def to_json(self, signature):
+        return json.dumps({'format': SIDECAR_FORMAT, 'file': self.input_file_name, 'signature': list(signature),
+                           'datastart': self.datastart, 'objects': self._objects, 'data': self._data_ids})
+
+    @classmethod
+    def from_json(cls, s, file_name, signature):
+        "Returns header or None if the sidecar data do not correspond to file_name with signature"
+        d = json.loads(s)
+        if d.get('format') != SIDECAR_FORMAT or d.get('file') != file_name or d.get('signature') != list(signature):
+            return None
+        for o in d['objects']:
+            o['rank_shape'] = tuple(o['rank_shape'])
+        return cls(file_name, d['datastart'], d['objects'], d['data'])
+
+
+class DXHeaderCache:
+    """LRU cache of DXHeader objects keyed by path of file. Entry is valid while
+    modification time and size of the file are not changed.
+    If sidecar_dir is given headers are stored there as JSON files too."""
+    def __init__(self, max_size=HEADER_CACHE_SIZE, sidecar_dir=None):
+        self.max_size = max_size
+        self.sidecar_dir = sidecar_dir
+        self._headers = collections.OrderedDict()  # path -> (signature, header)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.sidecar_hits = 0
+        self.misses = 0
+
+    def _sidecar_path(self, path):
+        return os.path.join(self.sidecar_dir, hashlib.sha1(path.encode('utf-8')).hexdigest() + '.json')
+
+    def _read_sidecar(self, path, sig):
+        try:
+            with open(self._sidecar_path(path), 'r') as f:
+                return DXHeader.from_json(f.read(), path, sig)
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _write_sidecar(self, path, sig, hdr):
+        sc_path = self._sidecar_path(path)
+        tmp_path = '%s.%d.tmp' % (sc_path, os.getpid())
+        try:
+            with open(tmp_path, 'w') as f:
+                f.write(hdr.to_json(sig))
+            os.replace(tmp_path, sc_path)
+        except OSError as ex:
+            logger.debug('Failed to write DX header sidecar for %s: %s', path, ex)
+
+    def get(self, path):
+        "Returns DXHeader of the file path, parses the file only if needed"
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        sig = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            entry = self._headers.get(path)
+            if entry is not None and entry[0] == sig:
+                self._headers.move_to_end(path)
+                self.hits += 1
+                return entry[1]
+        hdr = self._read_sidecar(path, sig) if self.sidecar_dir else None
+        if hdr is not None:
+            with self._lock:
+                self.sidecar_hits += 1
+        else:
+            hdr = DXHeader.parse(path)
+            with self._lock:
+                self.misses += 1
+            if self.sidecar_dir:
+                self._write_sidecar(path, sig, hdr)
+        with self._lock:
+            self._headers[path] = (sig, hdr)
+            self._headers.move_to_end(path)
+            while len(self._headers) > self.max_size:
+                self._headers.popitem(last=False)
+        return hdr
+
+    def invalidate(self, path=None):
+        with self._lock:
+            if path is None:
+                self._headers.clear()
+            else:
+                self._headers.pop(os.path.abspath(path), None)
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._headers), 'max_size': self.max_size, 'hits': self.hits,
+                    'sidecar_hits': self.sidecar_hits, 'misses': self.misses, 'sidecar_dir': self.sidecar_dir}
+
+
+header_cache = DXHeaderCache()
+
+def parse_header(path):
+    """Returns parsed header of DX file (see DXHeader) from cache. Use instead of
+    DXParser().parse(path) when only the header is needed."""
+    return header_cache.get(path)
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+# $Id: $
+""" Benchmark of DX header parsers: DXParser (line by line) vs DXHeaderParser (single pass).
+Parses a DX file (or generates a synthetic one with many header objects), checks that both
+parsers give the same objects (values of getters and all the decoded fields, see ParsedDXObject)
+and outputs timings of parsing plus reading of objects fields.
+Usage: python -m pangea.dxparser_bench [dx_file] [repeat]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import pangea.dxextractobj
+
+__version__ = '$Revision:  $'[11:-2]
+
+GETTERS = ('get_class', 'get_rank_shape', 'get_items_no', 'get_data_type', 'get_data_repr', 'get_data_addr',
+           'get_data_length', 'get_regarray_params')
+
+
+def generate_dx_file(file_name, n_objects=1000, n_attributes=3):
+    "Writes DX file with n_objects arrays (and a field), each having n_attributes attributes"
+    lines = ['# synthetic file for DX parser benchmark\n',
+             'object 1 class gridpositions counts 10 20 30\n', 'origin 1000.0 2000.0 -100.0\n',
+             'delta 10.0 5.0 0\n', 'delta -2.5 5.0 0\n', 'delta 0 0 -2.0\n', 'attribute "dep" string "positions"\n', '#\n']
+    addr = 0
+    for i in range(n_objects):
+        lines.append('object %d class array type float rank 1 shape 3 items 100 lsb ieee data %d\n' % (i + 2, addr))
+        lines += ['attribute "attr%d" string "value %d"\n' % (k, i) for k in range(n_attributes)]
+        lines.append('#\n')
+        addr += 100 * 12
+    lines += ['object "default" class field\n', 'component "positions" value 1\n', 'component "data" value 2\n',
+              'attribute "name" string "bench"\n', 'end\n']
+    with open(file_name, 'wb') as f:
+        f.write(''.join(lines).encode('utf-8'))
+        f.write(b'\0' * addr)
+    return len(lines)
+
+
+def read_fields(dx):
+    res = []
+    for o in dx.obj_list:
+        fields = [o.id]
+        for g in GETTERS:
+            try:
+                fields.append(getattr(o, g)())
+            except (TypeError, ValueError) as ex:
+                fields.append(type(ex).__name__)
+        res.append(fields)
+    return res, dx.datastart, [(o.id, a, l) for o, a, l in dx.data_list]
+
+
+def bench(parser_class, file_name, repeat):
+    t_start = time.perf_counter()
+    for _ in range(repeat):
+        dx = parser_class()
+        dx.parse(file_name)
+        res = read_fields(dx)
+    return (time.perf_counter() - t_start) / repeat, res, dx
+
+
+def decoded_fields(dx):
+    "Fields of objects as stored by the header cache, objects of DXParser are decoded by their getters"
+    return [o.fields if isinstance(o, pangea.dxextractobj.ParsedDXObject) else
+            pangea.dxextractobj.ParsedDXObject.from_object(o).fields for o in dx.obj_list]
+
+
+def main(file_name=None, repeat=5):
+    tmp_name = None
+    if file_name is None:
+        fd, tmp_name = tempfile.mkstemp(suffix='.dx')
+        os.close(fd)
+        n_lines = generate_dx_file(tmp_name)
+        file_name = tmp_name
+        print('Generated file with %d header lines' % n_lines)
+    try:
+        t_old, res_old, dx_old = bench(pangea.dxextractobj.DXParser, file_name, repeat)
+        t_new, res_new, dx_new = bench(pangea.dxextractobj.DXHeaderParser, file_name, repeat)
+    finally:
+        if tmp_name:
+            os.remove(tmp_name)
+    print('Objects: %d, results coincide: %s, decoded fields coincide: %s' %
+          (len(res_old[0]), res_old == res_new, decoded_fields(dx_old) == decoded_fields(dx_new)))
+    print('DXParser:       %.4f s' % t_old)
+    print('DXHeaderParser: %.4f s (x%.1f)' % (t_new, t_old / t_new if t_new else 0.0))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else None, int(sys.argv[2]) if len(sys.argv) > 2 else 5)
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+# $Id: $
+""" Benchmark of reading of irregular well curves: interleaving of columns byte by byte (the former reader)
+vs readIrregularCurveData (columns read into array, interleaved with one copy) and readIrregularCurveColumns.
+Generates a synthetic curve (or reads the given DX file), checks that the readers give the same data
+and outputs timings of reading and of reading plus packing with msgpack.
+Usage: python -m pangea.irregular_curve_bench [dx_file] [repeat]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import msgpack
+import numpy as np
+
+import pangea.dxheaders
+import pangea.wellcurves as wellcurves
+
+__version__ = '$Revision:  $'[11:-2]
+
+HEADER_TMPL = """object 1 class array type float rank 1 shape 1 items  %d lsb ieee data data 0
+attribute "dep" string "positions"
+#
+object 2 class patharray count %d
+attribute "element type" string "lines"
+attribute "ref" string "positions"
+attribute "dep" string "connections"
+#
+object 3 class array type float rank 0 items %d lsb ieee data %d
+attribute "dep" string "positions"
+#
+object "method" class field
+component "positions" value 1
+component "connections" value 2
+component "data" value 3
+attribute "name" string "bench"
+#
+end
+"""
+
+
+def generate_curve_file(file_name, n_points=1000000):
+    "Writes irregular curve of n_points in the same layout as writeIrregularCurveData2File does"
+    mds = np.cumsum(np.random.uniform(0.05, 0.2, n_points)).astype('<f4') + 1000.0
+    values = np.random.uniform(0.0, 150.0, n_points).astype('<f4')
+    with open(file_name, 'wb') as f:
+        f.write((HEADER_TMPL % (n_points, n_points - 1, n_points, n_points * 4)).encode('utf-8'))
+        f.write(mds.tobytes())
+        f.write(values.tobytes())
+
+
+def read_by_bytes(filepath):
+    "The former reader: columns are interleaved by 4-byte slices"
+    dx = pangea.dxheaders.parse_header(filepath)
+    ol = dx.obj_list
+    with open(filepath, 'rb') as f:
+        f.seek(dx.datastart + ol[0].get_data_addr())
+        bdata1 = f.read(ol[0].get_data_length())
+        f.seek(dx.datastart + ol[2].get_data_addr())
+        bdata2 = f.read(ol[2].get_data_length())
+    bdata = bytearray()
+    for i in range(ol[0].get_items_no()):
+        bdata.extend(bdata1[i*4:i*4+4])
+        bdata.extend(bdata2[i*4:i*4+4])
+    return [bdata]
+
+
+def timed(func, repeat):
+    t_start = time.perf_counter()
+    for _ in range(repeat):
+        res = func()
+    return (time.perf_counter() - t_start) / repeat, res
+
+
+def bench(file_name, repeat):
+    t_bytes, old = timed(lambda: read_by_bytes(file_name), repeat)
+    t_pairs, new = timed(lambda: wellcurves.readIrregularCurveData(file_name), repeat)
+    t_cols, cols = timed(lambda: wellcurves.readIrregularCurveColumns(file_name), repeat)
+    t_bytes_msg, msg_old = timed(lambda: msgpack.packb(read_by_bytes(file_name)), repeat)
+    t_pairs_msg, msg_new = timed(lambda: msgpack.packb(wellcurves.readIrregularCurveData(file_name)), repeat)
+    same = bytes(old[0]) == bytes(new[0]) and msg_old == msg_new and bytes(old[0]) == cols.T.tobytes()
+    print('%s: %d points, results coincide: %s' % (os.path.basename(file_name), cols.shape[1], same))
+    print('  read:           by bytes %.5f s, vectorized %.5f s (x%.1f), columns %.5f s (x%.1f)' %
+          (t_bytes, t_pairs, t_bytes / t_pairs, t_cols, t_bytes / t_cols))
+    print('  read + msgpack: by bytes %.5f s, vectorized %.5f s (x%.1f)' %
+          (t_bytes_msg, t_pairs_msg, t_bytes_msg / t_pairs_msg))
+
+
+def main(file_name=None, repeat=5):
+    if file_name is not None:
+        bench(file_name, repeat)
+        return
+    (fd, tmp_name) = tempfile.mkstemp(suffix='.dx')
+    os.close(fd)
+    try:
+        generate_curve_file(tmp_name)
+        bench(tmp_name, repeat)
+    finally:
+        os.remove(tmp_name)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else None, int(sys.argv[2]) if len(sys.argv) > 2 else 5)
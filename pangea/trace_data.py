@@ -120,12 +120,15 @@ class TraceDataWriter(metaclass=ABCMeta):
 
 
 class SeisCubeReader(TraceDataReader):
-    def __init__(self, file_in=None, object_name=None):
+    """Reader of 3D seismic cube. With use_mmap=True the file data are memory-mapped,
+    inlines, cross-lines and time slices are then returned as views without copying."""
+    def __init__(self, file_in=None, object_name=None, use_mmap=False):
         self.dx_cube = pangea.dxcube.DXCube()
         self.time_axis = None
+        self.use_mmap = use_mmap
         self._name = object_name or 'Unnamed SeisCubeReader'
         if file_in:
-            self.dx_cube.attach_to_file(file_in)
+            self.dx_cube.attach_to_file(file_in, use_mmap=use_mmap)
             t0, dt, n = self.dx_cube.time_axis()
             self.time_axis = Axis(origin=t0, step=dt, n_points=n)
 
@@ -134,12 +137,31 @@ class SeisCubeReader(TraceDataReader):
 
     def reopen(self):
         self.dx_cube.reopen()
+        if self.use_mmap:
+            self.dx_cube.map_data()
         return self
 
     @property
     def geometry(self):
         return self.dx_cube.geometry()
 
+    @property
+    def data(self):
+        "All the cube data as array of the shape (n_i, n_x, n_samples) of '<f4' (memory-mapped)"
+        return self.dx_cube.map_data().data
+
+    def inline(self, i, dtype=None):
+        "Inline i as array (n_x, n_samples), the view of data unless dtype is given"
+        return self.dx_cube.get_inline_view(i, dtype)
+
+    def xline(self, j, dtype=None):
+        "Cross-line j as array (n_i, n_samples), the view of data unless dtype is given"
+        return self.dx_cube.get_xline_view(j, dtype)
+
+    def time_slice(self, k, dtype=None):
+        "Time slice with sample index k as array (n_i, n_x), the view of data unless dtype is given"
+        return self.dx_cube.get_time_slice_view(k, dtype)
+
     def trace_at_xy(self, x, y):
         i, j = self.dx_cube.xy_to_inline_xline(x, y)
         return self.trace_at(i, j)
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# $Id: $
+""" Reading of irregular well curves stored in DX files: column of mds and column of values
+(objects 0 and 2 of the file). Columns are read directly into numpy array, pairs (md, value) are made
+of them with one copy.
+"""
+
+import numpy as np
+
+import pangea.dxheaders
+from pangea.wellstats import CURVE_DTYPE
+
+__version__ = '$Revision:  $'[11:-2]
+
+
+def readIrregularCurveColumns(filepath):
+    """Read data of irregular well log curve as stored in file: column of mds and column of values.
+    Data are read directly into the array, without intermediate copies.
+    Return: array (2 x n_points) of <f4, row 0 - mds, row 1 - values
+    """
+    dx = pangea.dxheaders.parse_header(filepath)
+    ol = dx.obj_list
+    datastart = dx.datastart
+    assert (ol[0].get_class() == 'array'), 'Illegal DX Object class in well curve[0] - must be array'
+    assert (ol[0].get_data_repr() == 'lsb'), 'Illegal DX Object representation: must be lsb'
+    assert (ol[2].get_data_repr() == 'lsb'), 'Illegal DX Object representation: must be lsb'
+    n_points = ol[0].get_items_no()
+    cols = np.empty((2, n_points), dtype=CURVE_DTYPE)
+    with open(filepath, 'rb') as f:
+        for (col, o) in zip(cols, (ol[0], ol[2])):
+            f.seek(datastart + o.get_data_addr())
+            n_read = f.readinto(memoryview(col).cast('B')[:o.get_data_length()])
+            n_points = min(n_points, n_read // cols.itemsize)
+    return cols[:, :n_points]
+
+
+def readIrregularCurveData(filepath):
+    """Read data of irregular well log curve.
+    Return: [bdata], bdata are pairs (md, value) of <f4 (bytes-like object)
+    """
+    cols = readIrregularCurveColumns(filepath)
+    # columns are interleaved with one copy
+    return [memoryview(np.ascontiguousarray(cols.T)).cast('B')]
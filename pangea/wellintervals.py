@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+# $Id: $
+""" Columnar binary storage of interval well methods (layers, lithology, saturation, stratigraphy,
+measurements, tests, coring...), data of which are lists of rows (md_top, md_bottom, value, ...).
+Every column is stored as a contiguous typed array, so that it is loaded with numpy without
+copying and without unpickling Python objects:
+    b'PWIC', version (u2), reserved (u2), length of header (u4), header (msgpack), columns
+Header is {'rows': number of rows, 'columns': [[kind, offset, length, dictionary], ...]},
+offsets of columns are counted from the start of file and aligned to 8 bytes. Kinds of columns:
+    f8 - float64, i8 - int64, b1 - bool,
+    dict - strings (or None) encoded as indices into the dictionary (u1, u2 or u4, the narrowest one
+           for the size of dictionary, the width is length of column divided by number of rows),
+    obj - values that don't fit the above types, the whole column is packed with msgpack.
+Files in the old format (pickled list of rows) are read as well, see load_rows.
+Rows are packed with msgpack directly from columns (IntervalTable.msgpack_rows), the result is the same
+as msgpack.packb(rows), but Python objects for values are not created.
+Usage: python -m pangea.wellintervals [--dry-run] projects_root  - converts pickled methods to the new format
+"""
+
+import logging
+import os
+import pickle
+import struct
+import sys
+
+import msgpack
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+__version__ = '$Revision:  $'[11:-2]
+
+MAGIC = b'PWIC'
+FORMAT_VERSION = 1
+FILE_EXT = '.icol'
+_PREAMBLE = struct.Struct('<4sHHI')
+_ALIGN = 8
+_DTYPES = {'f8': np.dtype('<f8'), 'i8': np.dtype('<i8'), 'b1': np.dtype('bool')}
+_CODE_DTYPES = {1: np.dtype('u1'), 2: np.dtype('<u2'), 4: np.dtype('<u4')}
+_INT64_MIN, _INT64_MAX = -2**63, 2**63 - 1
+# Suffixes of files with pickled interval methods written by storeMethodData2Db
+PICKLED_SUFFIXES = ('_lr.pickled', '_lt.pickled', '_st.pickled', '_sr.pickled', '_ms.pickled', '_ts.pickled',
+                    '_cr.pickled')
+
+
+def _column_kind(values):
+    if all(isinstance(v, bool) for v in values):
+        return 'b1'
+    if all(isinstance(v, float) for v in values):
+        return 'f8'
+    if all(isinstance(v, int) and not isinstance(v, bool) and _INT64_MIN <= v <= _INT64_MAX for v in values):
+        return 'i8'
+    if all(v is None or isinstance(v, str) for v in values):
+        return 'dict'
+    return 'obj'
+
+
+def pack_rows(rows):
+    """Returns bytes of rows (list of tuples of equal length) in the columnar format,
+    None if rows can't be stored in columns (rows of different length, values msgpack can't pack)."""
+    if not isinstance(rows, (list, tuple)) or not all(isinstance(r, (list, tuple)) for r in rows):
+        return None
+    n_cols = len(rows[0]) if rows else 0
+    if any(len(r) != n_cols for r in rows):
+        return None
+    columns = []
+    blobs = []
+    for values in zip(*rows):
+        kind = _column_kind(values)
+        dictionary = None
+        if kind == 'dict':
+            codes = {}
+            arr = np.fromiter((codes.setdefault(v, len(codes)) for v in values), _CODE_DTYPES[4], len(values))
+            dictionary = list(codes.keys())
+            width = 1 if len(codes) <= 0x100 else (2 if len(codes) <= 0x10000 else 4)
+            blob = arr.astype(_CODE_DTYPES[width]).tobytes()
+        elif kind == 'obj':
+            try:
+                blob = msgpack.packb(list(values), use_bin_type=True)
+            except (TypeError, ValueError, OverflowError):
+                return None
+        else:
+            blob = np.array(values, dtype=_DTYPES[kind]).tobytes()
+        columns.append([kind, 0, len(blob), dictionary])
+        blobs.append(blob)
+    # Header length depends on offsets, so offsets are computed for the header with the widest ones
+    header_len = len(msgpack.packb({'rows': len(rows), 'columns': [[k, 2**63, l, d] for (k, _, l, d) in columns]}))
+    offset = _PREAMBLE.size + header_len
+    for (c, blob) in zip(columns, blobs):
+        offset += -offset % _ALIGN
+        c[1] = offset
+        offset += len(blob)
+    header = msgpack.packb({'rows': len(rows), 'columns': columns})
+    header += b' ' * (header_len - len(header))  # unpacker stops at the end of map, padding is ignored
+    res = bytearray(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, 0, header_len))
+    res += header
+    for (c, blob) in zip(columns, blobs):
+        res += b'\0' * (c[1] - len(res))
+        res += blob
+    return bytes(res)
+
+
+class IntervalTable:
+    """Interval method loaded from buffer in the columnar format. Numeric columns are numpy arrays
+    sharing memory with the buffer, strings are kept as codes plus dictionary until rows are requested."""
+    def __init__(self, buf):
+        (magic, version, _, header_len) = _PREAMBLE.unpack_from(buf, 0)
+        if magic != MAGIC:
+            raise ValueError('Not a columnar interval method')
+        if version > FORMAT_VERSION:
+            raise ValueError('Unsupported version of columnar interval method: %d' % version)
+        unpacker = msgpack.Unpacker(raw=False, strict_map_key=False)
+        unpacker.feed(bytes(buf[_PREAMBLE.size:_PREAMBLE.size + header_len]))
+        header = next(unpacker)
+        self.n_rows = header['rows']
+        self.kinds = []
+        self.dictionaries = []
+        self.data = []
+        for (kind, offset, length, dictionary) in header['columns']:
+            if kind == 'obj':
+                data = msgpack.unpackb(bytes(buf[offset:offset + length]), raw=False, strict_map_key=False)
+            elif kind == 'dict':
+                dtype = _CODE_DTYPES[length // self.n_rows] if self.n_rows else _CODE_DTYPES[1]
+                data = np.frombuffer(buf, dtype, self.n_rows, offset)
+            else:
+                data = np.frombuffer(buf, _DTYPES[kind], self.n_rows, offset)
+            self.kinds.append(kind)
+            self.dictionaries.append(dictionary)
+            self.data.append(data)
+
+    @property
+    def n_columns(self):
+        return len(self.kinds)
+
+    def column(self, i):
+        """Returns column i as numpy array: view of the buffer for numeric columns,
+        array of objects for strings and other values."""
+        kind = self.kinds[i]
+        if kind == 'dict':
+            return np.array(self.dictionaries[i], dtype=object)[self.data[i]]
+        if kind == 'obj':
+            res = np.empty(self.n_rows, dtype=object)
+            res[:] = self.data[i]
+            return res
+        return self.data[i]
+
+    def column_list(self, i):
+        "Returns column i as list of Python values"
+        kind = self.kinds[i]
+        if kind == 'dict':
+            d = self.dictionaries[i]
+            return [d[c] for c in self.data[i].tolist()]
+        if kind == 'obj':
+            return self.data[i]
+        return self.data[i].tolist()
+
+    def rows(self):
+        "Returns list of rows (tuples), the same as was stored"
+        return list(zip(*[self.column_list(i) for i in range(self.n_columns)]))
+
+    def msgpack_rows(self):
+        """Returns rows packed with msgpack, the same bytes as msgpack.packb(self.rows()).
+        Values of numeric and dictionary columns are encoded with numpy as matrices (rows x length of value).
+        """
+        n = self.n_rows
+        if n == 0 or self.n_columns >= 16 or 'obj' in self.kinds:
+            return msgpack.packb(self.rows())
+        # Every column gives lengths of its packed values (array or number if they are the same for all rows)
+        # and matrix of packed values (rows x max length)
+        encoded = [_ENCODERS[kind](self.data[i], self.dictionaries[i]) for (i, kind) in enumerate(self.kinds)]
+        header = np.full((n, 1), 0x90 | self.n_columns, dtype=np.uint8)  # fixarray of values of row
+        packed = np.hstack([header] + [mat for (_, mat) in encoded])
+        if all(np.isscalar(lens) for (lens, _) in encoded):
+            return _array_header(n) + packed.tobytes()
+        # Matrices of values of different lengths are padded, padding is dropped by mask (row by row)
+        mask = np.hstack([np.ones((n, 1), dtype=bool)] +
+                         [np.ones(mat.shape, dtype=bool) if np.isscalar(lens) else np.arange(mat.shape[1]) < lens[:, None]
+                          for (lens, mat) in encoded])
+        return _array_header(n) + packed[mask].tobytes()
+
+
+def _array_header(n):
+    if n < 16:
+        return bytes([0x90 | n])
+    if n < 0x10000:
+        return b'\xdc' + struct.pack('>H', n)
+    return b'\xdd' + struct.pack('>I', n)
+
+
+def _encode_fixed(prefix, values, dtype):
+    "Values packed as prefix byte followed by big endian value of dtype"
+    out = np.empty((len(values), 1 + dtype.itemsize), dtype=np.uint8)
+    out[:, 0] = prefix
+    out[:, 1:] = values.astype(dtype).view(np.uint8).reshape(len(values), dtype.itemsize)
+    return out
+
+
+def _encode_floats(values, dictionary):
+    return (9, _encode_fixed(0xcb, values, np.dtype('>f8')))
+
+
+def _encode_bools(values, dictionary):
+    return (1, np.where(values, 0xc3, 0xc2).astype(np.uint8)[:, None])
+
+
+def _encode_ints(values, dictionary):
+    "The narrowest encodings of integers, the same as msgpack chooses"
+    lens = np.empty(len(values), dtype=np.int64)
+    mat = np.zeros((len(values), 9), dtype=np.uint8)
+    classes = ((values >= 0) & (values < 0x80), None, None, 1,
+               (values >= 0x80) & (values < 0x100), 0xcc, np.dtype('u1'), 2,
+               (values >= 0x100) & (values < 0x10000), 0xcd, np.dtype('>u2'), 3,
+               (values >= 0x10000) & (values < 0x100000000), 0xce, np.dtype('>u4'), 5,
+               values >= 0x100000000, 0xcf, np.dtype('>u8'), 9,
+               (values < 0) & (values >= -0x20), None, None, 1,
+               (values < -0x20) & (values >= -0x80), 0xd0, np.dtype('i1'), 2,
+               (values < -0x80) & (values >= -0x8000), 0xd1, np.dtype('>i2'), 3,
+               (values < -0x8000) & (values >= -0x80000000), 0xd2, np.dtype('>i4'), 5,
+               values < -0x80000000, 0xd3, np.dtype('>i8'), 9)
+    for i in range(0, len(classes), 4):
+        (mask, prefix, dtype, length) = classes[i:i + 4]
+        idx = np.flatnonzero(mask)
+        if len(idx) == 0:
+            continue
+        lens[idx] = length
+        if prefix is None:   # positive and negative fixint
+            mat[idx, 0] = values[idx] & 0xff
+        else:
+            mat[idx, :length] = _encode_fixed(prefix, values[idx], dtype)
+    return (lens, mat)
+
+
+def _encode_codes(codes, dictionary):
+    "Dictionary entries are packed once and taken by codes"
+    packed = [msgpack.packb(v) for v in dictionary]
+    table = np.zeros((len(packed), max(len(p) for p in packed)), dtype=np.uint8)
+    for (i, p) in enumerate(packed):
+        table[i, :len(p)] = np.frombuffer(p, dtype=np.uint8)
+    lens = np.array([len(p) for p in packed], dtype=np.int64)
+    if (lens == lens[0]).all():
+        return (int(lens[0]), table[codes])
+    return (lens[codes], table[codes])
+
+
+_ENCODERS = {'f8': _encode_floats, 'b1': _encode_bools, 'i8': _encode_ints, 'dict': _encode_codes}
+
+
+def is_columnar(buf):
+    return bytes(buf[:len(MAGIC)]) == MAGIC
+
+
+def load_table(file_name):
+    "Reads interval method in the columnar format, returns IntervalTable"
+    with open(file_name, 'rb') as f:
+        return IntervalTable(f.read())
+
+
+def load_rows(file_name):
+    "Returns rows of interval method stored in file_name in the columnar format or pickled"
+    with open(file_name, 'rb') as f:
+        buf = f.read()
+    if is_columnar(buf):
+        return IntervalTable(buf).rows()
+    return pickle.loads(buf)
+
+
+def load_rows_msgpack(file_name):
+    "Returns rows of interval method stored in file_name (in any format) packed with msgpack"
+    with open(file_name, 'rb') as f:
+        buf = f.read()
+    if is_columnar(buf):
+        return IntervalTable(buf).msgpack_rows()
+    return msgpack.packb(pickle.loads(buf))
+
+
+def dump_rows(rows, f):
+    """Writes rows to file object f in the columnar format, falls back to pickle for rows
+    that can't be stored in columns. Returns True if the columnar format was used."""
+    buf = pack_rows(rows)
+    if buf is None:
+        logger.warning('Interval method can not be stored in columns, pickled')
+        pickle.dump(rows, f)
+        return False
+    f.write(buf)
+    return True
+
+
+def same_output(rows_a, rows_b):
+    "Checks that two lists of rows are output to clients identically (tuples and lists are not distinguished)"
+    return msgpack.packb(rows_a, use_bin_type=True) == msgpack.packb(rows_b, use_bin_type=True)
+
+
+def migrate_file(file_name, dry_run=False):
+    """Converts pickled interval method in file_name to the columnar format in place (the name is kept,
+    so paths stored in DB remain valid). The converted data are checked against the original ones.
+    Returns tuple (status, old size, new size), status is one of 'converted', 'columnar' (already converted),
+    'skipped' (can't be stored in columns)."""
+    with open(file_name, 'rb') as f:
+        old = f.read()
+    if is_columnar(old):
+        return ('columnar', len(old), len(old))
+    rows = pickle.loads(old)
+    new = pack_rows(rows)
+    if new is None or not same_output(rows, IntervalTable(new).rows()):
+        return ('skipped', len(old), len(old))
+    if not dry_run:
+        tmp_name = file_name + '.tmp'
+        with open(tmp_name, 'wb') as f:
+            f.write(new)
+        st = os.stat(file_name)
+        os.chmod(tmp_name, st.st_mode)
+        os.replace(tmp_name, file_name)
+    return ('converted', len(old), len(new))
+
+
+def migrate_tree(root, suffixes=PICKLED_SUFFIXES, dry_run=False):
+    """Converts all pickled interval methods (files with names ending with suffixes) under root.
+    Returns dictionary of counters of files and sizes by status."""
+    stats = {}
+    for (dir_path, _, files) in os.walk(root):
+        for name in files:
+            if not name.endswith(suffixes):
+                continue
+            path = os.path.join(dir_path, name)
+            try:
+                (status, old_sz, new_sz) = migrate_file(path, dry_run)
+            except Exception as ex:
+                logger.error('Failed to convert %s: %s', path, ex)
+                status, old_sz, new_sz = 'failed', 0, 0
+            logger.debug('%s: %s', path, status)
+            s = stats.setdefault(status, {'files': 0, 'old_size': 0, 'new_size': 0})
+            s['files'] += 1
+            s['old_size'] += old_sz
+            s['new_size'] += new_sz
+    return stats
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    args = [a for a in sys.argv[1:] if a != '--dry-run']
+    if len(args) != 1:
+        print(__doc__)
+        sys.exit(1)
+    for (status, s) in sorted(migrate_tree(args[0], dry_run='--dry-run' in sys.argv).items()):
+        print('%-10s files: %6d, size: %d -> %d' % (status, s['files'], s['old_size'], s['new_size']))
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# $Id: $
+""" Benchmark of storage of interval well methods: pickled rows vs the columnar format (pangea.wellintervals).
+Generates methods of typical structure (or converts the given pickled file), checks that the columnar
+format gives the same rows and outputs file sizes and times of loading: rows (as the service outputs them),
+columns (numpy arrays only) and loading plus packing of rows with msgpack (as the service streams them).
+Usage: python -m pangea.wellintervals_bench [pickled_file] [repeat]
+"""
+
+import os
+import pickle
+import random
+import sys
+import tempfile
+import time
+
+import msgpack
+
+import pangea.wellintervals as wellintervals
+
+__version__ = '$Revision:  $'[11:-2]
+
+LITHOLOGIES = ('sandstone', 'siltstone', 'clay', 'limestone', 'dolomite', 'coal', 'argillite', 'marl')
+
+
+def generate_methods(n_rows=20000):
+    "Returns dictionary {name: rows} of synthetic interval methods"
+    tops = [1000.0 + 0.2 * i for i in range(n_rows)]
+    return {
+        'lithology': [(t, t + 0.2, random.choice(LITHOLOGIES)) for t in tops],
+        'measurement': [(t, t + 0.2, random.uniform(0.0, 0.35)) for t in tops],
+        'stratigraphy': [(t, t + 0.2, 'Unit_%d' % (i // 500), i // 500) for (i, t) in enumerate(tops)],
+    }
+
+
+def timed(func, repeat):
+    t_start = time.perf_counter()
+    for _ in range(repeat):
+        res = func()
+    return (time.perf_counter() - t_start) / repeat, res
+
+
+def bench(name, rows, repeat):
+    tmp_dir = tempfile.mkdtemp()
+    p_name = os.path.join(tmp_dir, name + '.pickled')
+    c_name = os.path.join(tmp_dir, name + wellintervals.FILE_EXT)
+    try:
+        with open(p_name, 'wb') as f:
+            pickle.dump(rows, f)
+        with open(c_name, 'wb') as f:
+            columnar = wellintervals.dump_rows(rows, f)
+        t_pickle, rows_p = timed(lambda: wellintervals.load_rows(p_name), repeat)
+        t_rows, rows_c = timed(lambda: wellintervals.load_rows(c_name), repeat)
+        t_cols, table = timed(lambda: wellintervals.load_table(c_name), repeat)
+        t_pickle_msg, msg_p = timed(lambda: msgpack.packb(wellintervals.load_rows(p_name)), repeat)
+        t_rows_msg, msg_c = timed(lambda: wellintervals.load_rows_msgpack(c_name), repeat)
+        print('%s: %d rows, columnar: %s, kinds: %s, results coincide: %s' %
+              (name, len(rows), columnar, table.kinds, rows_c == rows_p and msg_c == msg_p))
+        print('  size:           pickle %9d, columnar %9d (x%.2f)' %
+              (os.path.getsize(p_name), os.path.getsize(c_name), os.path.getsize(p_name) / os.path.getsize(c_name)))
+        print('  load rows:      pickle %.5f s, columnar %.5f s (x%.1f)' % (t_pickle, t_rows, t_pickle / t_rows))
+        print('  load columns:   columnar %.5f s (x%.1f)' % (t_cols, t_pickle / t_cols))
+        print('  load + msgpack: pickle %.5f s, columnar %.5f s (x%.1f)' % (t_pickle_msg, t_rows_msg, t_pickle_msg / t_rows_msg))
+    finally:
+        for fn in (p_name, c_name):
+            if os.path.exists(fn):
+                os.remove(fn)
+        os.rmdir(tmp_dir)
+
+
+def main(file_name=None, repeat=10):
+    if file_name is None:
+        methods = generate_methods()
+    else:
+        methods = {os.path.basename(file_name): wellintervals.load_rows(file_name)}
+    for (name, rows) in methods.items():
+        bench(name, rows, repeat)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else None, int(sys.argv[2]) if len(sys.argv) > 2 else 10)
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+# $Id: $
+""" Statistics of well methods data: top, bottom, number of defined values, min, max, mean and percentiles.
+Undefined values (MAXFLOAT and NaN) are masked. Binary data are processed as views (np.frombuffer)
+without unpacking them to Python objects, defined values are sorted once and all the statistics
+of values are taken from the sorted array.
+"""
+
+import numpy as np
+
+from pangea.np_utils import MAXFLOAT, MAXFLOAT09
+
+__version__ = '$Revision:  $'[11:-2]
+
+PERCENTILES = (10, 50, 90)
+CURVE_DTYPE = np.dtype('<f4')
+
+
+def percentile_names(percentiles=PERCENTILES):
+    return ['p%g' % p for p in percentiles]
+
+
+def values_stats(values, percentiles=PERCENTILES):
+    """Returns dictionary with count, min, max, mean and percentiles (p10, p50...) of defined values,
+    statistics of values are MAXFLOAT if there are no defined values.
+    Percentiles are linearly interpolated, the same as np.percentile does."""
+    v = np.asarray(values)
+    s = np.sort(v[v < MAXFLOAT09])  # NaNs are dropped by comparison as well
+    n = len(s)
+    res = {'count': n}
+    names = percentile_names(percentiles)
+    if n == 0:
+        res.update(dict.fromkeys(['min', 'max', 'mean'] + names, MAXFLOAT))
+        return res
+    res['min'] = float(s[0])
+    res['max'] = float(s[-1])
+    res['mean'] = float(s.mean(dtype=np.float64))
+    for (name, p) in zip(names, percentiles):
+        pos = (n - 1) * p / 100.0
+        lo = int(pos)
+        hi = min(lo + 1, n - 1)
+        res[name] = float(s[lo]) + (float(s[hi]) - float(s[lo])) * (pos - lo)
+    return res
+
+
+def curve_stats(bdata, start, step, percentiles=PERCENTILES):
+    "Statistics of regular curve: bdata are values (<f4) starting at start with step"
+    v = np.frombuffer(bdata, CURVE_DTYPE, len(bdata) // CURVE_DTYPE.itemsize)
+    res = values_stats(v, percentiles)
+    res['top'] = start
+    res['bottom'] = start + step * len(v)
+    return res
+
+
+def irregular_curve_stats(bdata, percentiles=PERCENTILES):
+    "Statistics of irregular curve: bdata are pairs (md, value) of <f4"
+    n_points = len(bdata) // (2 * CURVE_DTYPE.itemsize)
+    a = np.frombuffer(bdata, CURVE_DTYPE, 2 * n_points).reshape(n_points, 2)
+    res = values_stats(a[:, 1], percentiles)
+    if n_points:
+        res['top'] = float(a[0, 0])
+        res['bottom'] = float(a[-1, 0])
+    else:
+        res['top'] = res['bottom'] = MAXFLOAT
+    return res
+
+
+def intervals_stats(tops, bottoms, values=None, percentiles=PERCENTILES):
+    """Statistics of interval method: top is the minimal top of intervals, bottom is the maximal bottom.
+    Statistics of values are added if values (numeric) are given, otherwise count is the number of intervals."""
+    tops = np.asarray(tops, dtype=np.float64)
+    bottoms = np.asarray(bottoms, dtype=np.float64)
+    if values is not None:
+        res = values_stats(np.asarray(values, dtype=np.float64), percentiles)
+    else:
+        res = {'count': len(tops)}
+    res['top'] = float(tops.min()) if len(tops) else MAXFLOAT
+    res['bottom'] = float(bottoms.max()) if len(bottoms) else MAXFLOAT
+    return res
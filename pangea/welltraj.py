@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+# $Id: $
+""" Vectorized conversion of MD of wells to TVD and XY by conversion tables (directional logs, trajectories).
+Conversion table is the list of points (md, value, ...) sorted by md, represented as the pair of arrays
+(mds, values). Values are linearly interpolated between the nearest points of table, MDs beyond the last point
+are extrapolated by the last two points, MDs before the first point are undefined (MAXFLOAT).
+Results are the same as given by pangea.misc_util.valueFromTableLinInter with extrapolation of the last points,
+but MDs of any number of wells are converted with one call.
+"""
+
+import numpy as np
+
+from pangea.misc_util import DEF_ZACCUR
+from pangea.np_utils import MAXFLOAT, MAXFLOAT09
+
+__version__ = '$Revision:  $'[11:-2]
+
+
+def conversion_table(points):
+    """Returns conversion table (mds, values) made of list of points (md, value, ...) sorted by md:
+    mds is array of shape (n,), values is array of shape (n, k)"""
+    a = np.asarray(points, dtype=np.float64).reshape(len(points), -1)
+    return (a[:, 0].copy(), a[:, 1:])
+
+
+def trajectory_table(coords, dl_data):
+    """Returns conversion table MD -> (x, y, tvd) made of directional log data [{'md': MD, 'dx': dX, 'dy': dY, 'tvd': TVD}, ...].
+    coords: (x_well, y_well, alt), the collar point is added at md 0 if the log does not start there."""
+    points = [(p['md'] + 0.0, p['dx'] + coords[0], p['dy'] + coords[1], p['tvd'] + 0.0) for p in dl_data]
+    if len(points) == 0 or points[0][0] != 0.0:
+        points.insert(0, (0.0, coords[0], coords[1], coords[2]))
+    return conversion_table(points)
+
+
+def extrapolate(mds, table):
+    """Values at mds extrapolated (or interpolated) linearly by the last two points of table. Returns array (len(mds), k).
+    Raises ValueError if the last two points have the same md."""
+    (t_md, t_val) = table
+    if t_md[-1] == t_md[-2]:
+        raise ValueError('Two last points of conversion table have the same md %s' % t_md[-1])
+    z = np.asarray(mds, dtype=np.float64).reshape(-1, 1)
+    return t_val[-2] + (t_val[-1] - t_val[-2]) * ((z - t_md[-2]) / (t_md[-1] - t_md[-2]))
+
+
+def convert(mds, table, zaccur=DEF_ZACCUR):
+    "Converts mds by single table, see convert_wells. Returns array (len(mds), k)"
+    return convert_wells([mds], [table], zaccur)[0]
+
+
+def convert_wells(mds_list, tables, zaccur=DEF_ZACCUR):
+    """Converts MDs of many wells at once: mds_list[i] are converted by tables[i]. Tables must have at least
+    2 points and the same number of values columns. Raises ValueError if an MD should be extrapolated
+    by the table which last two points have the same md.
+    Returns list of arrays of values, of shape (len(mds_list[i]), k)."""
+    if len(tables) == 0:
+        return []
+    if min(len(t[0]) for t in tables) < 2:
+        raise ValueError('Conversion table must contain at least 2 points')
+    t_counts = np.array([len(t[0]) for t in tables])
+    q_counts = np.array([len(m) for m in mds_list])
+    t_md = np.concatenate([t[0] for t in tables])
+    t_val = np.concatenate([t[1] for t in tables])
+    z = np.concatenate([np.asarray(m, dtype=np.float64).reshape(-1) for m in mds_list])
+    n_q = len(z)
+    t_well = np.repeat(np.arange(len(tables)), t_counts)
+    q_well = np.repeat(np.arange(len(tables)), q_counts)
+    t_start = np.cumsum(t_counts) - t_counts
+    # Position of md in the table of its well (the same as bisect(table, (md,))) is the number of points
+    # of the table with smaller md: MDs and points of all tables are sorted together by well and md,
+    # MD goes before the points having the same md
+    is_point = np.concatenate((np.zeros(n_q, dtype=bool), np.ones(len(t_md), dtype=bool)))
+    order = np.lexsort((is_point, np.concatenate((z, t_md)), np.concatenate((q_well, t_well))))
+    points_before = np.cumsum(is_point[order]) - is_point[order]
+    q_sorted = ~is_point[order]
+    ind = np.empty(n_q, dtype=np.intp)
+    ind[order[q_sorted]] = points_before[q_sorted]
+    base = t_start[q_well]
+    n = t_counts[q_well]
+    ind -= base
+
+    hi = base + np.clip(ind, 1, n - 1)
+    lo = hi - 1
+    zc = z.reshape(-1, 1)
+    z0 = t_md[hi].reshape(-1, 1)
+    z1 = t_md[lo].reshape(-1, 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # values outside of tables are replaced below
+        res = (t_val[lo] * (z0 - zc) + t_val[hi] * (zc - z1)) / (z0 - z1)
+
+    last = base + n - 1
+    after = ind >= n
+    near_last = after & (np.abs(z - t_md[last]) < zaccur)
+    extra = after & ~near_last
+    if extra.any():
+        e_last = last[extra]
+        zl1 = t_md[e_last].reshape(-1, 1)
+        zl2 = t_md[e_last - 1].reshape(-1, 1)
+        if (zl1 == zl2).any():
+            raise ValueError('Two last points of conversion table have the same md %s' % zl1[zl1 == zl2][0])
+        vl1 = t_val[e_last]
+        vl2 = t_val[e_last - 1]
+        res[extra] = vl2 + (vl1 - vl2) * ((zc[extra] - zl2) / (zl1 - zl2))
+    res[near_last] = t_val[last[near_last]]
+
+    before = ind == 0
+    near_first = before & (np.abs(z - t_md[base]) < zaccur)
+    res[before] = MAXFLOAT
+    res[near_first] = t_val[base[near_first]]
+    return np.split(res, np.cumsum(q_counts)[:-1])
+
+
+def resample_nearest(keys, values, step, max_samples=None):
+    """Resamples values given at keys (depth or time of samples along the well) to the regular grid with step,
+    the value of the nearest sample is taken (as makeCurveDenser does along MD). Samples with undefined keys
+    (MAXFLOAT, NaN) are dropped, keys are made non-decreasing (parts of well going up are skipped).
+    Raises ValueError if the grid would have more than max_samples samples.
+    Returns (start, array of resampled values), start is MAXFLOAT if there are no samples."""
+    keys = np.asarray(keys, dtype=np.float64)
+    ok = keys < MAXFLOAT09
+    k = np.maximum.accumulate(keys[ok])
+    v = np.asarray(values)[ok]
+    if len(k) < 2:
+        return (float(k[0]) if len(k) else MAXFLOAT, v)
+    n = (k[-1] - k[0]) // step + 1
+    if max_samples is not None and n > max_samples:
+        raise ValueError('Step %s gives %g samples, more than %d allowed' % (step, n, max_samples))
+    grid = k[0] + step * np.arange(int(n))
+    i = np.clip(np.searchsorted(k, grid), 1, len(k) - 1)
+    nearest = np.where(grid - k[i - 1] <= k[i] - grid, i - 1, i)
+    return (float(k[0]), v[nearest])
@@ -1 +1 @@
-from .db import pool, ConnectionContext
+from .db import pool, ConnectionContext, AsyncConnectionContext
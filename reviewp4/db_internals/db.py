@@ -1,9 +1,12 @@
-from threading import BoundedSemaphore
+import threading
+import asyncio
+import collections
 import logging
 import warnings
 import time
 from .. import settings
 from . import p4db
+from .p4dbexceptions import DBPoolTimeoutException
 # logging.basicConfig(level=logging.DEBUG)
 
 log = logging.getLogger(__name__)
@@ -14,6 +17,12 @@ except ModuleNotFoundError:
     log.debug('Using fall-back driver for MySQL')
     import pymysql as mysql_driver # fall-back module
 
+p4db.CATALOG_TTL = settings.DB_CATALOG_TTL
+p4db.PERMISSIONS_CACHE_TTL = settings.DB_PERMISSIONS_CACHE_TTL
+p4db.SHARED_PERMISSIONS_CACHE = settings.DB_PERMISSIONS_CACHE_SHARED
+p4db.shared_permissions_cache.ttl = settings.DB_PERMISSIONS_CACHE_TTL
+p4db.CHANGELOG_KEY = settings.DB_CHANGELOG_KEY
+
 def create_db_connection():
     with warnings.catch_warnings():
         warnings.simplefilter('ignore')
@@ -21,29 +30,307 @@ def create_db_connection():
     db = p4db.P4DBbase(c)
     return db
 
-class MyConnectionsPool:
-    def __init__(self, n_connections):
-        self.sema = BoundedSemaphore(n_connections)
-        self.connections = set(create_db_connection() for i in range(n_connections))
-        self.start_times = {id(o): time.time() for o in self.connections}
-        log.debug('Created connections pool: %d', len(self.connections))
+def close_db_connection(c):
+    try:
+        c.connection.close()
+    except Exception as ex:
+        log.debug('Error while closing connection %d: %s', id(c), ex)
+
+
+class _Waiter:
+    """Entry of the queue of clients waiting for a connection. Synchronous waiters
+    are woken up with the event, asynchronous ones receive the connection through the future
+    set in the event loop they are waiting in."""
+    __slots__ = ('event', 'loop', 'future', 'conn')
+
+    def __init__(self, loop=None):
+        self.loop = loop
+        self.conn = None
+        if loop is None:
+            self.event = threading.Event()
+            self.future = None
+        else:
+            self.event = None
+            self.future = loop.create_future()
+
+
+class ElasticConnectionsPool:
+    """Pool of connections to DB that grows on demand from min_size up to max_size connections
+    and shrinks back to min_size when connections stay idle longer than max_idle seconds.
+    No connections are opened on creation: min_size connections are opened by open_min (on startup
+    of application) or on demand, idle connections are closed when returned to pool and by reaper
+    (see start_reaper), so that the pool shrinks when there are no requests too.
+    Connections are validated on checkout: connections older than max_age seconds are
+    reopened, connections that have been idle longer than max_idle seconds are pinged,
+    the rest are handed out as is.
+    Clients that can't get a connection immediately are queued in FIFO order, a connection
+    being returned is passed directly to the first waiter. Waiting longer than timeout seconds
+    raises DBPoolTimeoutException.
+    Both blocking (get_connection) and asynchronous (acquire) checkouts are supported.
+    """
+    def __init__(self, min_size, max_size, timeout=30.0, max_age=3600.0, max_idle=300.0):
+        self.min_size = min_size
+        self.max_size = max(min_size, max_size)
+        self.timeout = timeout
+        self.max_age = max_age
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._idle = collections.deque()   # connections ready to use, the most recently returned at the right
+        self._waiters = collections.deque()
+        self._size = 0                     # number of open connections, including ones being opened
+        self.created_at = {}
+        self.last_used = {}
+        self.start_times = {}
+        self._counters = {'checkouts': 0, 'waits': 0, 'timeouts': 0, 'created': 0, 'recycled': 0, 'pinged': 0, 'closed': 0,
+                          'checkout_time_total': 0.0, 'checkout_time_max': 0.0, 'wait_time_total': 0.0, 'wait_time_max': 0.0}
+        self._reaper = None
+
+    # Internal helpers, methods with the _locked suffix should be called with the lock held
+
+    def _register(self, c):
+        now = time.time()
+        self.created_at[id(c)] = now
+        self.last_used[id(c)] = now
+        self._counters['created'] += 1
+
+    def _forget(self, c):
+        self.created_at.pop(id(c), None)
+        self.last_used.pop(id(c), None)
+        self.start_times.pop(id(c), None)
+
+    def _checkout_locked(self, loop=None):
+        """Returns tuple (connection, waiter). Connection is None if the new one should be
+        opened by the caller (the slot for it is already reserved), waiter is not None if the caller
+        should wait for a connection to be returned to pool."""
+        if self._idle and not self._waiters:
+            return self._idle.pop(), None
+        if self._size < self.max_size:
+            self._size += 1
+            return None, None
+        w = _Waiter(loop)
+        self._waiters.append(w)
+        return None, w
+
+    def _open_reserved(self):
+        try:
+            c = create_db_connection()
+        except Exception:
+            with self._lock:
+                self._size -= 1
+            raise
+        with self._lock:
+            self._register(c)
+        log.debug('Pool grown, size: %d', self._size)
+        return c
+
+    def _shrink_locked(self, now):
+        "Removes connections idle longer than max_idle above min_size from pool, returns them to be closed"
+        to_close = []
+        # The least recently used connections are at the left end
+        while self._size > self.min_size and self._idle and now - self.last_used[id(self._idle[0])] > self.max_idle:
+            old = self._idle.popleft()
+            self._forget(old)
+            self._size -= 1
+            self._counters['closed'] += 1
+            to_close.append(old)
+        return to_close
+
+    def _needs_check(self, c, now):
+        return now - self.created_at.get(id(c), now) > self.max_age or now - self.last_used.get(id(c), now) > self.max_idle
+
+    def _check(self, c):
+        """Reopens outdated connection or pings long idle one, returns the connection to use."""
+        now = time.time()
+        try:
+            if now - self.created_at.get(id(c), now) > self.max_age:
+                log.debug('Recycling connection %d', id(c))
+                with self._lock:
+                    self._forget(c)
+                    self._counters['recycled'] += 1
+                close_db_connection(c)
+                c = create_db_connection()
+                with self._lock:
+                    self._register(c)
+            else:
+                c.connection.ping(True)
+                with self._lock:
+                    self._counters['pinged'] += 1
+        except Exception:
+            with self._lock:
+                self._forget(c)
+                self._size -= 1
+            raise
+        return c
+
+    def _forget_waiter(self, w, timed_out=False):
+        with self._lock:
+            try:
+                self._waiters.remove(w)
+            except ValueError:
+                pass
+            if timed_out:
+                self._counters['timeouts'] += 1
+
+    def _release_abandoned(self, fut):
+        "Done callback of checkout step abandoned by cancelled task: returns connection it gave to pool"
+        if not fut.cancelled() and fut.exception() is None:
+            self.return_connection(fut.result())
 
-    def get_connection(self) -> p4db.P4DBbase:
+    async def _in_executor(self, loop, func, *args):
+        """Runs func (opening or checking of connection) in the default executor (see utilities.async_utils).
+        The executor job can't be stopped, so if the awaiting task is cancelled the connection
+        is returned to pool when the job is done, otherwise the slot of pool would be lost."""
+        fut = loop.run_in_executor(None, func, *args)
+        try:
+            return await asyncio.shield(fut)
+        except asyncio.CancelledError:
+            fut.add_done_callback(self._release_abandoned)
+            raise
+
+    def _deliver_async(self, fut, c):
+        if fut.done():
+            # Waiter gave up (timed out or cancelled) before getting the connection
+            self.return_connection(c)
+        else:
+            fut.set_result(c)
+
+    def _account(self, c, t_start, waited):
+        now = time.time()
+        with self._lock:
+            self.start_times[id(c)] = now
+            dt = time.perf_counter() - t_start
+            cnt = self._counters
+            cnt['checkouts'] += 1
+            cnt['checkout_time_total'] += dt
+            cnt['checkout_time_max'] = max(cnt['checkout_time_max'], dt)
+            if waited:
+                cnt['waits'] += 1
+                cnt['wait_time_total'] += dt
+                cnt['wait_time_max'] = max(cnt['wait_time_max'], dt)
+        log.debug('Connections left (get %d): %d, size %d', id(c), len(self._idle), self._size)
+
+    def _timeout_exception(self, timeout):
+        return DBPoolTimeoutException('No DB connection available in %s s (pool size %d)' % (timeout, self.max_size))
+
+    # Public interface
+
+    def get_connection(self, timeout=None) -> p4db.P4DBbase:
+        "Blocking checkout of connection"
         log.debug('Getting connection to DB %s as %s', settings.DB_HOST, settings.DB_USER)
-        self.sema.acquire()
-        c = self.connections.pop()
-        self.start_times[id(c)] = time.time()
-        log.debug('Connections left (get %d): %d', id(c), len(self.connections))
-        
-        c.connection.ping(True)
+        timeout = self.timeout if timeout is None else timeout
+        t_start = time.perf_counter()
+        with self._lock:
+            c, w = self._checkout_locked()
+        if w is not None:
+            got_it = w.event.wait(timeout)
+            with self._lock:
+                if not got_it and w.conn is None:
+                    self._waiters.remove(w)
+                    self._counters['timeouts'] += 1
+                    raise self._timeout_exception(timeout)
+            c = w.conn
+        elif c is None:
+            c = self._open_reserved()
+        if self._needs_check(c, time.time()):
+            c = self._check(c)
+        self._account(c, t_start, w is not None)
+        return c
+
+    async def acquire(self, timeout=None) -> p4db.P4DBbase:
+        "Checkout of connection not blocking the event loop"
+        log.debug('Acquiring connection to DB %s as %s', settings.DB_HOST, settings.DB_USER)
+        timeout = self.timeout if timeout is None else timeout
+        t_start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            c, w = self._checkout_locked(loop)
+        if w is not None:
+            try:
+                c = await asyncio.wait_for(w.future, timeout)
+            except asyncio.TimeoutError:
+                self._forget_waiter(w, timed_out=True)
+                if w.future.done():
+                    self._release_abandoned(w.future)
+                raise self._timeout_exception(timeout)
+            except asyncio.CancelledError:
+                self._forget_waiter(w)
+                if w.future.done():
+                    # the connection was delivered just before cancellation
+                    self._release_abandoned(w.future)
+                raise
+        elif c is None:
+            c = await self._in_executor(loop, self._open_reserved)
+        if self._needs_check(c, time.time()):
+            c = await self._in_executor(loop, self._check, c)
+        self._account(c, t_start, w is not None)
         return c
 
     def return_connection(self, c):
-        self.connections.add(c)
-        self.sema.release()
-        log.debug('Connections left (return %d): %d, elapsed %s', id(c), len(self.connections), time.time()-self.start_times[id(c)])
+        to_close = []
+        now = time.time()
+        with self._lock:
+            self.last_used[id(c)] = now
+            elapsed = now - self.start_times.get(id(c), now)
+            if self._waiters:
+                w = self._waiters.popleft()
+                if w.loop is None:
+                    w.conn = c
+                    w.event.set()
+                else:
+                    try:
+                        w.loop.call_soon_threadsafe(self._deliver_async, w.future, c)
+                    except RuntimeError:
+                        # Event loop of the waiter is closed
+                        self._idle.append(c)
+            else:
+                self._idle.append(c)
+                to_close = self._shrink_locked(now)
+        for old in to_close:
+            close_db_connection(old)
+        log.debug('Connections left (return %d): %d, elapsed %s', id(c), len(self._idle), elapsed)
+
+    def open_min(self):
+        "Opens connections until there are min_size of them (blocking), called on startup of application"
+        while True:
+            with self._lock:
+                if self._size >= self.min_size:
+                    break
+                self._size += 1
+            c = self._open_reserved()
+            self.return_connection(c)
+        log.debug('Connections pool opened: %d (max %d)', self._size, self.max_size)
+
+    def reap(self):
+        "Closes connections idle longer than max_idle above min_size"
+        with self._lock:
+            to_close = self._shrink_locked(time.time())
+        for old in to_close:
+            close_db_connection(old)
+        if to_close:
+            log.debug('Pool shrunk by %d idle connections, size: %d', len(to_close), self._size)
 
-pool = MyConnectionsPool(settings.DB_POOL_SZ)
+    def start_reaper(self, loop, interval=None):
+        """Runs reap in the default executor of loop every interval seconds (max_idle / 2 by default),
+        called on startup of application"""
+        interval = interval or max(1.0, self.max_idle / 2)
+        def tick():
+            loop.run_in_executor(None, self.reap)
+            self._reaper = loop.call_later(interval, tick)
+        if self._reaper is None:
+            self._reaper = loop.call_later(interval, tick)
+
+    def stats(self):
+        "Returns dictionary with current state of pool and checkout counters"
+        with self._lock:
+            res = dict(self._counters)
+            res.update({'size': self._size, 'idle': len(self._idle), 'in_use': self._size - len(self._idle),
+                        'waiting': len(self._waiters), 'min_size': self.min_size, 'max_size': self.max_size})
+        res['checkout_time_avg'] = res['checkout_time_total'] / res['checkouts'] if res['checkouts'] else 0.0
+        res['wait_time_avg'] = res['wait_time_total'] / res['waits'] if res['waits'] else 0.0
+        return res
+
+pool = ElasticConnectionsPool(settings.DB_POOL_SZ, settings.DB_POOL_MAX_SZ, timeout=settings.DB_POOL_TIMEOUT,
+                              max_age=settings.DB_CONN_MAX_AGE, max_idle=settings.DB_CONN_MAX_IDLE)
 
 class ConnectionContext:
     def __init__(self):
@@ -55,3 +342,15 @@ class ConnectionContext:
 
     def __exit__(self, type, value, traceback):
         pool.return_connection(self.db)
+
+class AsyncConnectionContext:
+    "Same as ConnectionContext, but connection is acquired without blocking the event loop"
+    def __init__(self):
+        self.db = None
+
+    async def __aenter__(self):
+        self.db = await pool.acquire()
+        return self.db
+
+    async def __aexit__(self, type, value, traceback):
+        pool.return_connection(self.db)
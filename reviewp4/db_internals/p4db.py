@@ -7,15 +7,145 @@ __version__ = "$Revision: 16671 $"[11:-2]  # code version
 import os
 import os.path
 import types
+import time
+import threading
 import collections
 from .p4dbexceptions import DBException, DBCorruptionException, DBAuthoritiesException, DBNotFoundException
 from .classes_def import className2classIdString
+from .p4dbqueries import queries
 
 ############################################################
 ## Required version of storage DataModel
 VERSION_MAJOR = 1
 VERSION_MINOR = 62
 MAXFLOAT = 3.40282347e+38 ## stands for undefined values of parameters
+## Maximum number of containers IDs in one bulk query
+BULK_IDS_CHUNK = 1000
+## Maximum number of rows in one multi-row insert of array values
+ARRAY_INSERT_CHUNK = 1000
+
+## Auto-increment key of the ChangeLog table (set from settings by db module), maximum number of ChangeLog records read at once
+CHANGELOG_KEY = 'CodeLog'
+CHANGELOG_READ_LIMIT = 10000
+
+## Tables and columns holding values of attributes by form of attribute
+VALUE_TABLES = {'C': ('DataValuesC', 'DataValue'),
+                'T': ('DataValuesT', 'DataValue'),
+                'I': ('DataValuesI', 'DataValue'),
+                'F': ('DataValuesF', 'DataValue'),
+                'D': ('DataValuesD', 'DataValue'),
+                'R': ('DataValuesR', 'DataValue'),
+                'X': ('DataValuesX', 'DataValueD, DataValueR'),
+                'P': ('DataValuesP', 'DataValueX, DataValueY, DataValueZ')}
+
+for (form, (table, columns)) in VALUE_TABLES.items():
+    queries.register('getContainerSingleAttribute.' + form,
+                     """SELECT %s FROM %s
+                     WHERE LinkContainer = %%s
+                     AND LinkMetaData = %%s
+                     AND Status = 'Actual' """ % (columns, table))
+
+for (form, (table, columns)) in VALUE_TABLES.items():
+    queries.register('setContainerArrayAttribute.' + form,
+                     """INSERT %s (LinkContainer, LinkMetaData, ValueIndex, %s)
+                     VALUES (%%s, %%s, %%s, %s)""" % (table, columns, ', '.join(['%s'] * len(columns.split(',')))))
+
+queries.register('getContainerByName', """SELECT CodeContainer, TopParent
+                 FROM Containers
+                 WHERE LinkUp = %s
+                 AND ContainerName = %s
+                 AND Status = 'Actual' """)
+queries.register('getContainerByName.type', """SELECT CodeContainer, TopParent
+                 FROM Containers
+                 WHERE LinkUp = %s
+                 AND ContainerName = %s
+                 AND ContainerType = %s
+                 AND Status = 'Actual' """)
+queries.register('getContainerByName.types', """SELECT CodeContainer, TopParent
+                 FROM Containers
+                 WHERE LinkUp = %s
+                 AND ContainerName = %s
+                 AND ContainerType IN %s
+                 AND Status = 'Actual' """)
+queries.register('getProjectByName', """SELECT CodeContainer FROM Containers
+                 WHERE ContainerType = 'proj'
+                 AND ContainerName = %s
+                 AND Status = 'Actual' """)
+queries.register('getParentContainer', """SELECT LinkUp, TopParent FROM Containers
+                 WHERE CodeContainer = %s """)
+queries.register('getParentProject', """SELECT TopParent FROM Containers
+                 WHERE CodeContainer = %s """)
+queries.register('getContainerStatus', """SELECT Status, TopParent FROM Containers
+                 WHERE CodeContainer = %s """)
+for (suffix, cond) in (('', " AND Status = 'Actual' "), ('.all', '')):
+    queries.register('getContainerType' + suffix, """SELECT ContainerType, TopParent FROM Containers
+                     WHERE CodeContainer = %s """ + cond)
+    queries.register('getContainerName' + suffix, """SELECT ContainerType, ContainerName, TopParent FROM Containers
+                     WHERE CodeContainer = %s """ + cond)
+    queries.register('getSubContainersList' + suffix, """SELECT CodeContainer, ContainerType, ContainerName
+                     FROM Containers
+                     WHERE LinkUp = %s """ + cond)
+queries.register('getSubContainersListByType', """SELECT CodeContainer, ContainerName
+                 FROM Containers
+                 WHERE LinkUp = %s AND Status = 'Actual'
+                 AND ContainerType = %s """)
+queries.register('getSubContainersTypes', """SELECT CodeContainer, ContainerType
+                 FROM Containers
+                 WHERE LinkUp = %s AND Status = 'Actual' """)
+queries.register('getSubContainersListWithCAttribute', """SELECT CodeContainer, Containers.ContainerType, ContainerName, DataValue
+                 FROM Containers, MetaData, DataValuesC
+                 WHERE Containers.LinkUp = %s
+                 AND Containers.Status = 'Actual'
+                 AND MetaData.CodeData = %s
+                 AND MetaData.KeyWord = %s
+                 AND DataValuesC.LinkMetaData = MetaData.CodeData
+                 AND DataValuesC.LinkContainer = Containers.CodeContainer
+                 AND DataValuesC.Status = 'Actual' """)
+queries.register('getSubContainersListWithPVAttribute', """SELECT ContainerName, DataValueX, DataValueY, DataValueZ
+                 FROM Containers, DataValuesP
+                 WHERE Containers.LinkUp = %s
+                 AND Containers.Status = 'Actual'
+                 AND DataValuesP.LinkMetaData = %s
+                 AND DataValuesP.LinkContainer = Containers.CodeContainer
+                 AND DataValuesP.Status = 'Actual' """)
+queries.register('getSubContainersListWithCCAttributes', """SELECT CodeContainer, Containers.ContainerType, ContainerName, D1.DataValue, D2.DataValue
+                 FROM Containers, DataValuesC as D1, DataValuesC as D2
+                 WHERE Containers.LinkUp = %s
+                 AND Containers.Status = 'Actual'
+                 AND D1.LinkMetaData = %s
+                 AND D1.LinkContainer = Containers.CodeContainer
+                 AND D1.Status = 'Actual'
+                 AND D2.LinkMetaData = %s
+                 AND D2.LinkContainer = Containers.CodeContainer
+                 AND D2.Status = 'Actual' """)
+queries.register('getSubContainersListWithProtectionOwner', """SELECT c.CodeContainer, c.ContainerName, c.isProtected, u.UserName, NULL AS UserGroup
+                 FROM Containers c LEFT JOIN Users AS u ON c.ownerID = u.UserID
+                 WHERE c.LinkUp = %s AND c.ContainerType = %s AND c.Status = 'Actual' """)
+
+for (form, (table, columns)) in VALUE_TABLES.items():
+    queries.register('getContainerArrayAttribute.' + form,
+                     """SELECT ValueIndex, %s FROM %s
+                     WHERE LinkContainer = %%s
+                     AND LinkMetaData = %%s
+                     AND Status = 'Actual'
+                     ORDER BY ValueIndex""" % (columns, table))
+
+# Attributes of log data (weld) methods returned by getWellMethodsLocations
+METHOD_LOCATION_ATTRIBUTES = ('format', 'DPath', 'units', 'path')
+
+def _convertValue(form, sign_val, data):
+    """Converts columns of DataValues row (as listed in VALUE_TABLES) to value of attribute
+    the same way as getContainerSingleAttribute does."""
+    if form == 'X' or form == 'P':
+        return tuple(data)
+    val = data[0]
+    if val is None:
+        return None
+    if form == 'I':
+        return int(val)
+    if form == 'F':
+        return float(val) / pow(10., sign_val)
+    return val
 
 def makeUniqueNameNew(name, nm_list, separator, max_try = 100):
     """Makes new name not in the list nm_list.
@@ -49,6 +179,81 @@ def makeUniqueNameNew(name, nm_list, separator, max_try = 100):
     raise RuntimeError('Maximum number of tries %d reached' % max_try)
 
 
+class PermissionsCache:
+    """Cache of permission flags keyed by (user ID, container ID). Entries live ttl seconds.
+    Each Authorities object has its own cache (i.e. cache lives as long as request does),
+    the process-wide cache shared by all connections is used instead if SHARED_PERMISSIONS_CACHE is True.
+    Hits and misses are counted per cache and in total for all caches.
+    """
+    totals = {'hits': 0, 'misses': 0, 'invalidations': 0}
+    _totals_lock = threading.Lock()
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.data = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, userid, containerID):
+        "Returns cached flags or None if there is no valid entry"
+        key = (userid, containerID)
+        now = time.time()
+        with self._lock:
+            entry = self.data.get(key)
+            if entry is not None and entry[1] < now:
+                del self.data[key]
+                entry = None
+            hit = entry is not None
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        with PermissionsCache._totals_lock:
+            PermissionsCache.totals['hits' if hit else 'misses'] += 1
+        return entry[0] if hit else None
+
+    def put(self, userid, containerID, flags):
+        with self._lock:
+            self.data[(userid, containerID)] = (tuple(flags), time.time() + self.ttl)
+
+    def invalidate(self, userid=None):
+        "Drops entries of the user (all entries if userid is None)"
+        with self._lock:
+            if userid is None:
+                self.data.clear()
+            else:
+                for k in [k for k in self.data if k[0] == userid]:
+                    del self.data[k]
+        with PermissionsCache._totals_lock:
+            PermissionsCache.totals['invalidations'] += 1
+
+    def stats(self):
+        with self._lock:
+            n = self.hits + self.misses
+            return {'entries': len(self.data), 'hits': self.hits, 'misses': self.misses,
+                    'hit_rate': self.hits / n if n else 0.0, 'ttl': self.ttl}
+
+    @classmethod
+    def total_stats(cls):
+        "Counters summed over all caches created in process"
+        with cls._totals_lock:
+            res = dict(cls.totals)
+        n = res['hits'] + res['misses']
+        res['hit_rate'] = res['hits'] / n if n else 0.0
+        return res
+
+## Time (s) permissions of user are cached for
+PERMISSIONS_CACHE_TTL = 5.0
+## Use one cache for all connections instead of cache per Authorities object
+SHARED_PERMISSIONS_CACHE = False
+shared_permissions_cache = PermissionsCache(PERMISSIONS_CACHE_TTL)
+
+def invalidatePermissionsCache(userid=None):
+    "Drops entries of the user (all entries if userid is None) in the process-wide cache"
+    shared_permissions_cache.invalidate(userid)
+
+
 class Authorities:
     """Encapsulates authorities checks and operations"""
     # Operations
@@ -72,11 +277,16 @@ class Authorities:
             a_passwd - password of user"""
         self.c = connection.cursor()
         self.userid = None
+        if SHARED_PERMISSIONS_CACHE:
+            self.permissions_cache = shared_permissions_cache
+        else:
+            self.permissions_cache = PermissionsCache(PERMISSIONS_CACHE_TTL)
         self.changeUser(a_user)
 
     def changeUser(self, a_user):
         """Change user name and password"""
         self.user = a_user
+        self.userid = None
         self.userid = self.getID()
 
     def getPermissions(self, containerID):
@@ -85,6 +295,19 @@ class Authorities:
         if containerID == 0:
             # impossible proj. ID - default permissions
             return [Authorities.CREATE_PROJ]
+        flags = self.permissions_cache.get(self.userid, containerID)
+        if flags is None:
+            flags = self._readPermissions(containerID)
+            self.permissions_cache.put(self.userid, containerID, flags)
+        return list(flags)
+
+    def invalidatePermissions(self):
+        "Drops cached permissions of the current user"
+        self.permissions_cache.invalidate(self.userid)
+        if self.permissions_cache is not shared_permissions_cache:
+            shared_permissions_cache.invalidate(self.userid)
+
+    def _readPermissions(self, containerID):
         n = self.c.execute("""SELECT p.PermissionFlags from UserPermissions p, Containers c 
                            where p.UserID = %d and p.ContainerLink = c.TopParent 
                            and c.CodeContainer = %d """ % (self.userid, containerID))
@@ -233,6 +456,13 @@ class Authorities:
         # !!!efremov - need to check if object type is valid
         n = self.c.execute("""INSERT ChangeLog(TableType, UserID, Link, Operation)
                 VALUES("%s", %d, %d, "%s") """ % (objType, self.userid, objID, operation))
+
+    def addLogMany(self, records):
+        """Add strings to changelog table, records is a list of tuples (objType, objID, operation).
+        Driver sends all the records in one multi-row insert."""
+        if records:
+            self.c.executemany("""INSERT ChangeLog(TableType, UserID, Link, Operation)
+                VALUES(%s, %s, %s, %s)""", [(t, self.userid, oid, op) for (t, oid, op) in records])
     
     def setProtectionFlag(self, objID, flag):
         "Sets protection flag for container designated by objID"
@@ -297,6 +527,7 @@ class AuthoritiesAdmin:
             else:
                 self.c.execute("""INSERT UserPermissions (UserID, ContainerLink, PermissionFlags)
                         VALUES(%d, %d, "%s")""" % (userid, projID, perm_str))
+        self.auth.invalidatePermissions()
 
     def deletePermissions(self, projID):
         """Delete all permissions relating to projID and
@@ -305,6 +536,7 @@ class AuthoritiesAdmin:
         n = self.c.execute("""DELETE FROM UserPermissions
                 WHERE UserID = %d
                 AND ContainerLink = %d """ % (userid, projID))
+        self.auth.invalidatePermissions()
 
     # def close(self):
     #     """Closes connection"""
@@ -386,6 +618,87 @@ class MetaDataDict(collections.UserDict):
         return super().__getitem__(self.casingDict.get(key.lower()) or key.lower())
 
 
+class FrozenMetaDataDict(MetaDataDict):
+    'Read-only MetaDataDict, used in catalog shared between connections'
+    def __init__(self, m_d):
+        self.data = m_d.data
+        self.casingDict = m_d.casingDict
+
+    def __setitem__(self, key, item):
+        raise TypeError('MetaData catalog is read-only')
+
+    def __delitem__(self, key):
+        raise TypeError('MetaData catalog is read-only')
+
+
+class MetaDataCatalog:
+    """Immutable snapshot of the ContainerTypes and MetaData tables. One instance is shared
+    by all the P4DBbase objects in process, it is replaced as a whole when the version of
+    datamodel in ParamTable changes, when TTL expires, or on explicit refresh."""
+    def __init__(self, version, container_types, meta_data, ttl):
+        self.version = tuple(version)
+        self.ContainerTypes = types.MappingProxyType(container_types)
+        self.MetaData = types.MappingProxyType(dict([(t, FrozenMetaDataDict(m_d)) for (t, m_d) in meta_data.items()]))
+        self.ttl = ttl
+        self.loaded_at = time.time()
+        self.checked_at = self.loaded_at
+
+    @classmethod
+    def load(cls, cursor, version, ttl):
+        "Loads both tables with a single query"
+        cursor.execute("""SELECT t.CodeContainerType, t.NameContainerType,
+                       m.KeyWord, m.TypeData, m.DotPosition, m.Dimension, m.CodeData, m.ReferencedContainerType, m.LinkPermission
+                       FROM ContainerTypes AS t LEFT JOIN MetaData AS m ON m.ContainerType = t.CodeContainerType""")
+        container_types = {}
+        meta_data = {}
+        for row in cursor.fetchall():
+            c_type = row[0]
+            if c_type not in container_types:
+                container_types[c_type] = row[1]
+                # We use special type of dictionary which ignores case of keys when seting or
+                # getting values, but preserves casing when asked about set of keys or iterated over.
+                # Case considered right is taken from knownAttributes list
+                meta_data[c_type] = MetaDataDict(None, knownAttrD)
+            if row[2] is not None:
+                meta_data[c_type][row[2]] = tuple(row[3:9])
+        return cls(version, container_types, meta_data, ttl)
+
+    def expired(self):
+        return time.time() - self.checked_at > self.ttl
+
+    def info(self):
+        return {'version': self.version[:2], 'loaded_at': self.loaded_at, 'checked_at': self.checked_at, 'ttl': self.ttl,
+                'container_types': len(self.ContainerTypes), 'attributes': sum(len(m) for m in self.MetaData.values())}
+
+## Time (s) after which catalog is checked against the version in ParamTable
+CATALOG_TTL = 600.0
+_catalog = None
+_catalog_lock = threading.Lock()
+
+def getMetaDataCatalog(cursor, version, force=False):
+    """Returns the shared catalog, (re)loading it using cursor if there is no catalog yet,
+    the version differs from the one the catalog has been loaded with, or force is True.
+    Input:
+        cursor: cursor to query DB
+        version: current row of ParamTable
+        force: reload catalog unconditionally
+    """
+    global _catalog
+    with _catalog_lock:
+        cat = _catalog
+        if force or cat is None or cat.version != tuple(version):
+            _catalog = cat = MetaDataCatalog.load(cursor, version, CATALOG_TTL)
+        else:
+            cat.checked_at = time.time()
+    return cat
+
+def invalidateMetaDataCatalog():
+    "Drops the shared catalog, it will be reloaded on the next access"
+    global _catalog
+    with _catalog_lock:
+        _catalog = None
+
+
 class P4DBbase:
     "Class for base operations with P4 DB"
     def __init__(self, connection, user=None):
@@ -397,6 +710,7 @@ class P4DBbase:
         self.connection = connection
         self.c = self.connection.cursor()
         self.auth = None
+        self.last_array_insert_stats = None
         if user:
             self.set_user(user)        
         
@@ -409,26 +723,38 @@ class P4DBbase:
         if ver[1] < VERSION_MINOR:
             raise DBException('Wrong version of datamodel: need %d.%d or better, got %d.%d'
                               % (VERSION_MAJOR, VERSION_MINOR, ver[0], ver[1]) )
-            
-        self.c.execute("SELECT CodeContainerType, NameContainerType FROM ContainerTypes")
-        ConTypes = self.c.fetchall()
-        self.ContainerTypes = {}
-        self.MetaData = {}
-
-        for ConType in ConTypes:
-            self.ContainerTypes[ConType[0]] = ConType[1]
-
-            self.c.execute("""SELECT KeyWord, TypeData, DotPosition, Dimension, CodeData, ReferencedContainerType, LinkPermission
-                           FROM MetaData WHERE ContainerType = "%s" """ % ConType[0])
-            m_d = self.c.fetchall()
-##            self.MetaData[ConType[0]] = {}
-            # We use special type of dictionary which ignores case of keys when seting or
-            # getting values, but preserves casing when asked about set of keys or iterated over.
-            # Case considered right is taken from knownAttributes list
-            self.MetaData[ConType[0]] = MetaDataDict(None, dict([(s.lower(), s) for s in knownAttributes]))
-
-            for item in m_d:
-                self.MetaData[ConType[0]][item[0]] = (item[1],item[2],item[3],item[4],item[5],item[6])
+
+        self.version = ver
+        self.catalog = getMetaDataCatalog(self.c, ver)
+
+    @property
+    def MetaData(self):
+        "Descriptions of attributes by container type, taken from the shared catalog"
+        return self._getCatalog().MetaData
+
+    @property
+    def ContainerTypes(self):
+        "Names of container types by their codes, taken from the shared catalog"
+        return self._getCatalog().ContainerTypes
+
+    def _getCatalog(self):
+        """Returns current catalog. The catalog is revalidated against ParamTable
+        after its TTL has expired."""
+        cat = _catalog
+        if cat is None or cat.expired():
+            self.c.execute("SELECT * FROM ParamTable")
+            self.version = self.c.fetchall()[0]
+            cat = getMetaDataCatalog(self.c, self.version)
+        self.catalog = cat
+        return cat
+
+    def refreshCatalog(self):
+        """Forces reloading of MetaData and ContainerTypes, e.g. after the structure of
+        DB has been changed. The new catalog is shared by all connections."""
+        self.c.execute("SELECT * FROM ParamTable")
+        self.version = self.c.fetchall()[0]
+        self.catalog = getMetaDataCatalog(self.c, self.version, force=True)
+        return self.catalog.info()
 
     def set_user(self, user):
         self.auth = Authorities(self.connection, user)
@@ -511,9 +837,7 @@ class P4DBbase:
         Returns 1 if project does exist, 0 otherwise.
         Exceptions: DBCorruptionException if there are duplicate names.
         """
-        n = self.c.execute("""SELECT CodeContainer FROM Containers
-            WHERE ContainerType = "proj"
-            AND ContainerName = "%s" AND Status = "Actual" """ % project_name)
+        n = queries.execute(self.c, 'getProjectByName', (project_name,))
         if n == 0:
             return 0
         elif n > 1:
@@ -621,27 +945,11 @@ class P4DBbase:
         """
         if a_type:
             if type(a_type) == list:
-                c_types = ','.join(['"' + s + '"' for s in a_type])
-                sql = """SELECT CodeContainer, TopParent
-                     FROM Containers
-                     WHERE LinkUp = %d
-                     AND ContainerName = "%s"
-                     AND ContainerType IN (%s)
-                     AND Status = "Actual" """ % (a_parentID, a_name, c_types)
+                n = queries.execute(self.c, 'getContainerByName.types', (a_parentID, a_name, tuple(a_type)))
             else:
-                sql = """SELECT CodeContainer, TopParent
-                     FROM Containers
-                     WHERE LinkUp = %d
-                     AND ContainerName = "%s"
-                     AND ContainerType = "%s"
-                     AND Status = "Actual" """ % (a_parentID, a_name, a_type)
+                n = queries.execute(self.c, 'getContainerByName.type', (a_parentID, a_name, a_type))
         else:
-            sql = """SELECT CodeContainer, TopParent
-                     FROM Containers
-                     WHERE LinkUp = %d
-                     AND ContainerName = "%s"
-                     AND Status = "Actual" """ % (a_parentID, a_name)
-        n = self.c.execute(sql)
+            n = queries.execute(self.c, 'getContainerByName', (a_parentID, a_name))
         if n == 0:
             raise DBNotFoundException('ERROR: Cannot find container type %s, parent  %d, name %s' % (a_type, a_parentID, a_name))
         if n > 1:
@@ -652,9 +960,7 @@ class P4DBbase:
 
     def getProjectByName(self, project_name):
         """Returns ID of project with name project_name"""
-        n = self.c.execute("""SELECT CodeContainer FROM Containers
-            WHERE ContainerType = "proj"
-            AND ContainerName = "%s" AND Status = "Actual" """ % project_name)
+        n = queries.execute(self.c, 'getProjectByName', (project_name,))
         if n == 0:
             raise DBNotFoundException('Cannot find project %s' % project_name)
         elif n > 1:
@@ -694,9 +1000,7 @@ class P4DBbase:
         """Returns ID of upper container
         Input:
             containerID - ID of current container"""
-        sql = """SELECT LinkUp, TopParent FROM Containers
-                WHERE CodeContainer = %d """ % containerID
-        n = self.c.execute(sql)
+        n = queries.execute(self.c, 'getParentContainer', (containerID,))
         if n == 0:
             raise DBNotFoundException('No parent containers for %d' % containerID)
         if n > 1:
@@ -707,8 +1011,7 @@ class P4DBbase:
 
     def getParentProject(self, containerID):
         """Returns ID of project container belongs to"""
-        n = self.c.execute("""SELECT TopParent FROM Containers
-                WHERE CodeContainer = %d """ % containerID)
+        n = queries.execute(self.c, 'getParentProject', (containerID,))
         if n == 0:
             raise DBNotFoundException('Multiple or none top parent containers for %d' % containerID)
         if n > 1:
@@ -720,8 +1023,7 @@ class P4DBbase:
     def getContainerStatus(self, containerID):
         """Returns status of container. Status may be 'Actual', 'Deleted'
         or 'Archived'"""
-        n = self.c.execute("""SELECT Status, TopParent FROM Containers
-                    WHERE CodeContainer = %d """ % containerID)
+        n = queries.execute(self.c, 'getContainerStatus', (containerID,))
         if not n:
             raise DBNotFoundException('Cannot find container with ID %d' % containerID)
         (status, pr_id) = self.c.fetchall()[0]
@@ -791,11 +1093,7 @@ class P4DBbase:
             type string corresponding to a containerID
             project ID container belongs to (0 for root)"""
         # getting type of container
-        sql = """SELECT ContainerType, TopParent FROM Containers
-                WHERE CodeContainer = %d """ % containerID
-        if actualOnly:
-            sql += "  AND Status = 'Actual' "
-        n = self.c.execute(sql)
+        n = queries.execute(self.c, 'getContainerType' if actualOnly else 'getContainerType.all', (containerID,))
         if not n:
             raise DBNotFoundException('Cannot find container with ID %d' % containerID)
         (a_type, pr_id) = self.c.fetchall()[0]
@@ -806,11 +1104,7 @@ class P4DBbase:
         """Returns tuple:
             (type string corresponding to a containerID,  Container name)"""
         # getting type of container
-        sql = """SELECT ContainerType, ContainerName, TopParent FROM Containers
-                WHERE CodeContainer = %d """ % containerID
-        if actualOnly:
-            sql += " AND Status = 'Actual' "
-        n = self.c.execute(sql)
+        n = queries.execute(self.c, 'getContainerName' if actualOnly else 'getContainerName.all', (containerID,))
         if not n:
             raise DBNotFoundException('Cannot find container with ID %d' % containerID)
         (a_type, name, pr_id) = self.c.fetchall()[0]
@@ -825,12 +1119,7 @@ class P4DBbase:
             list of tuples (ContainerID, type, name)"""
         # checking access permissions for project container belongs to
         self.getParentProject(containerID)
-        sql = """SELECT CodeContainer, ContainerType, ContainerName
-                FROM Containers
-                WHERE LinkUp = %d """ % containerID
-        if actualOnly:
-            sql += " AND Status = 'Actual' "
-        n = self.c.execute(sql)
+        n = queries.execute(self.c, 'getSubContainersList' if actualOnly else 'getSubContainersList.all', (containerID,))
         return list(self.c.fetchall())
 
     def getSubContainersListByType(self, containerID, type):
@@ -843,11 +1132,7 @@ class P4DBbase:
         """
         # checking access permissions for project container belongs to
         self.getParentProject(containerID)
-        sql = """SELECT CodeContainer, ContainerName
-                FROM Containers
-                WHERE LinkUp = %d AND Status = "Actual"
-                AND ContainerType = "%s" """ % (containerID, type)
-        n = self.c.execute(sql)
+        n = queries.execute(self.c, 'getSubContainersListByType', (containerID, type))
         ans = list(self.c.fetchall())
         return ans
         
@@ -861,9 +1146,7 @@ class P4DBbase:
         # checking access permissions for project container belongs to
         self.getParentProject(containerID)
         # try to fetch all subcontainers - to know its types
-        n = self.c.execute("""SELECT CodeContainer, ContainerType
-                FROM Containers
-                WHERE LinkUp = %d AND Status = "Actual" """ % containerID)
+        n = queries.execute(self.c, 'getSubContainersTypes', (containerID,))
         c_list = self.c.fetchall()
         # now check if attribute a_name exists for all subcontainers
         checked_types = {}
@@ -886,17 +1169,7 @@ class P4DBbase:
         out_list = []
         for cur_type in list(checked_types.keys()):
             (form, sign_val, dim, md_id, ref_type, link_perms) = checked_types[cur_type]
-            sql_template = """SELECT CodeContainer, Containers.ContainerType, ContainerName, DataValue
-            FROM Containers, MetaData, DataValuesC
-            WHERE Containers.LinkUp = %d
-            and Containers.Status = 'Actual'
-            AND MetaData.CodeData = %d
-            AND MetaData.KeyWord = "%s"
-            AND DataValuesC.LinkMetaData = MetaData.CodeData
-            AND DataValuesC.LinkContainer = Containers.CodeContainer
-            AND DataValuesC.Status = "Actual"
-            """ % (containerID, md_id, a_name)
-            n = self.c.execute(sql_template)
+            n = queries.execute(self.c, 'getSubContainersListWithCAttribute', (containerID, md_id, a_name))
             if n:
                out_list.extend( self.c.fetchall())
                
@@ -919,20 +1192,11 @@ class P4DBbase:
             raise DBException('Container type %s has no attribute %s' % (c_type, a_name))
         if (form != 'P') and (dim != 1):
             raise DBException('Wrong attribute type for %s: %s is not a vector of points' % (c_type, a_name))
-        sql_template = """SELECT  ContainerName, DataValueX, DataValueY, DataValueZ
-            FROM Containers, MetaData, DataValuesP
-            WHERE Containers.LinkUp = %d
-            and Containers.Status = 'Actual'
-            AND MetaData.CodeData = %d
-            AND DataValuesP.LinkMetaData = MetaData.CodeData
-            AND DataValuesP.LinkContainer = Containers.CodeContainer
-            AND DataValuesP.Status = "Actual"
-            """ % (containerID, md_id)
         # @IMPORTANT NOTE: We've removed ORDER BY CodeContainer, ValueIndex from
         # this SQL operator since it caused creating temporary table and sorting it,
         # which sometimes lead to error (on _very_ large datasets).
         # that means that the result can (theretically) be sorted illegaly.
-        n = self.c.execute(sql_template)
+        n = queries.execute(self.c, 'getSubContainersListWithPVAttribute', (containerID, md_id))
         out_list = self.c.fetchall()
         return out_list
 
@@ -948,9 +1212,7 @@ class P4DBbase:
         # checking access permissions for project container belongs to
         self.getParentProject(containerID)
         # try to fetch all subcontainers - to know its types
-        n = self.c.execute("""SELECT CodeContainer, ContainerType
-                FROM Containers
-                WHERE LinkUp = %d AND Status = "Actual" """ % containerID)
+        n = queries.execute(self.c, 'getSubContainersTypes', (containerID,))
         c_list = self.c.fetchall()
         # now check if attribute a_name exists for all subcontainers
         checked_types = {}
@@ -980,18 +1242,7 @@ class P4DBbase:
         for cur_type in list(checked_types.keys()):
             ((form1, sign_val1, dim1, md_id1, ref_type1, link_perms1),
              (form2, sign_val2, dim2, md_id2, ref_type2, link_perms2)) = checked_types[cur_type]
-            sql_template = """SELECT CodeContainer, Containers.ContainerType, ContainerName, D1.DataValue, D2.DataValue
-                FROM Containers, DataValuesC as D1, DataValuesC as D2
-                WHERE Containers.LinkUp = %d
-                and Containers.Status = 'Actual'
-                AND D1.LinkMetaData = %d
-                AND D1.LinkContainer = Containers.CodeContainer
-                AND D1.Status = "Actual"
-                AND D2.LinkMetaData = %d
-                AND D2.LinkContainer = Containers.CodeContainer
-                AND D2.Status = "Actual"
-                """ % (containerID, md_id1, md_id2)
-            n = self.c.execute(sql_template)
+            n = queries.execute(self.c, 'getSubContainersListWithCCAttributes', (containerID, md_id1, md_id2))
             if n:
                out_list.extend( self.c.fetchall())
                
@@ -1021,24 +1272,26 @@ class P4DBbase:
             if dim != 0:
                 DBException('Array containers not permited in getSubContainersListWithAttributes')
             fields_list.append((form, md_id))
-        # collect sql operator
-        sql_head = "SELECT CodeContainer, ContainerName "
-        sql_from = " FROM Containers "
-        sql_where = " WHERE Containers.LinkUp = %d AND Containers.Status = 'Actual' AND Containers.ContainerType = '%s' " % (containerID, c_type)
-
-        ind = 1
-        for f in fields_list:
-            cn = "D%d" % ind
-            an = "DataValues%s" % f[0]
-            if f[0] == 'P':
-               sql_head += ", %s.DataValueX, %s.DataValueY, %s.DataValueZ " %(cn, cn, cn)
-            else:
-                sql_head += ", %s.DataValue " % cn
-            sql_from += ", %s AS %s " % (an, cn)
-            sql_where += " AND %s.LinkMetaData = %d  AND %s.LinkContainer = Containers.CodeContainer AND  %s.Status = \"Actual\" " % (cn, f[1], cn, cn)
-            ind += 1
-        sql_template = sql_head + sql_from + sql_where
-        n = self.c.execute(sql_template)
+        # SQL depends only on forms of attributes, IDs are bound as parameters
+        forms = tuple([f[0] for f in fields_list])
+        def build_sql():
+            sql_head = "SELECT CodeContainer, ContainerName "
+            sql_from = " FROM Containers "
+            sql_where = " WHERE Containers.LinkUp = %s AND Containers.Status = 'Actual' AND Containers.ContainerType = %s "
+            ind = 1
+            for form in forms:
+                cn = "D%d" % ind
+                an = "DataValues%s" % form
+                if form == 'P':
+                    sql_head += ", %s.DataValueX, %s.DataValueY, %s.DataValueZ " %(cn, cn, cn)
+                else:
+                    sql_head += ", %s.DataValue " % cn
+                sql_from += ", %s AS %s " % (an, cn)
+                sql_where += " AND %s.LinkMetaData = %%s AND %s.LinkContainer = Containers.CodeContainer AND %s.Status = 'Actual' " % (cn, cn, cn)
+                ind += 1
+            return sql_head + sql_from + sql_where
+        params = (containerID, c_type) + tuple([f[1] for f in fields_list])
+        n = queries.execute(self.c, 'getSubContainersListWithAttributes', params, key=forms, build_sql=build_sql)
         out_list = self.c.fetchall()
         return out_list
 
@@ -1066,23 +1319,25 @@ class P4DBbase:
             if dim != 0:
                 DBException('Array containers not permited in getSubContainersListWithAttributes')
             fields_list.append((form, md_id))
-        # collect sql operator
-        sql_head = "SELECT CodeContainer, ContainerName "
-        sql_from = " FROM Containers "
-        sql_where = " WHERE Containers.LinkUp = %d AND Containers.ContainerType = \"%s\" AND Containers.Status = 'Actual' " % (containerID, c_type)
-        ind = 1
-        for f in fields_list:
-            cn = "D%d" % ind
-            an = "DataValues%s" % f[0]
-            if f[0] == 'P':
-               sql_head += ", %s.DataValueX, %s.DataValueY, %s.DataValueZ " %(cn, cn, cn)
-            else:
-                sql_head += ", %s.DataValue " % cn
-            sql_from += " LEFT JOIN %s AS %s ON %s.LinkContainer = Containers.CodeContainer AND %s.LinkMetaData = %d AND  %s.Status = \"Actual\" " % (an, cn, cn, cn, f[1], cn)
-
-            ind += 1
-        sql_template = sql_head + sql_from + sql_where
-        n = self.c.execute(sql_template)
+        # SQL depends only on forms of attributes, IDs are bound as parameters
+        forms = tuple([f[0] for f in fields_list])
+        def build_sql():
+            sql_head = "SELECT CodeContainer, ContainerName "
+            sql_from = " FROM Containers "
+            sql_where = " WHERE Containers.LinkUp = %s AND Containers.ContainerType = %s AND Containers.Status = 'Actual' "
+            ind = 1
+            for form in forms:
+                cn = "D%d" % ind
+                an = "DataValues%s" % form
+                if form == 'P':
+                    sql_head += ", %s.DataValueX, %s.DataValueY, %s.DataValueZ " %(cn, cn, cn)
+                else:
+                    sql_head += ", %s.DataValue " % cn
+                sql_from += " LEFT JOIN %s AS %s ON %s.LinkContainer = Containers.CodeContainer AND %s.LinkMetaData = %%s AND  %s.Status = 'Actual' " % (an, cn, cn, cn, cn)
+                ind += 1
+            return sql_head + sql_from + sql_where
+        params = tuple([f[1] for f in fields_list]) + (containerID, c_type)
+        n = queries.execute(self.c, 'getSubContainersListWithAttributesMissingAsNone', params, key=forms, build_sql=build_sql)
         out_list = self.c.fetchall()
         return out_list
 
@@ -1093,8 +1348,7 @@ class P4DBbase:
         Output:
            list of tuples (ContainerID, name, protection_flag, owner_name, None)
         """
-        sql = "SELECT c.CodeContainer, c.ContainerName, c.isProtected, u.UserName, NULL AS UserGroup FROM Containers c  LEFT JOIN Users AS u ON c.ownerID = u.UserID WHERE c.LinkUp = %d AND c.ContainerType='%s' AND c.Status = 'Actual'" % (containerID, c_type)
-        self.c.execute(sql)
+        queries.execute(self.c, 'getSubContainersListWithProtectionOwner', (containerID, c_type))
         out_list = self.c.fetchall()
         return out_list
 
@@ -1605,7 +1859,12 @@ class P4DBbase:
         return n_changed
 
     def setContainerArrayAttribute(self, containerID, a_name, value):
-        """Sets attribute value when it is array attribute"""
+        """Sets attribute value when it is array attribute.
+        Values are converted and references are checked before tables are locked, then values are
+        inserted with multi-row inserts of ARRAY_INSERT_CHUNK rows. Statistics of the last call
+        (rows, seconds, rows per second) are kept in last_array_insert_stats.
+        Returns number of elements stored."""
+        t_start = time.perf_counter()
         self.auth.assertNotProtected(containerID)
         (c_type, pr_id) = self.getContainerType(containerID)
         perm_flags = self.auth.getPermissions(pr_id)
@@ -1615,132 +1874,92 @@ class P4DBbase:
             raise DBException('Non - array attribute value requested for %d, array attr. %s' % (containerID, a_name))
         if dim > 1:
             raise DBException('Multidimension attributes not implemented. ID %d, array attr. %s' % (containerID, a_name))
+        if form not in VALUE_TABLES:
+            raise DBException('Attribute type %s not supported in setContainerArrayAttribute' % form)
 
-        # Doing preparative work
-        if form in ['R', 'X']:
-            # Locking both Containers and data values in case of references
-            self.c.execute('LOCK TABLES Containers WRITE, DataValues%s WRITE' % form)
-        else:
-            self.c.execute('LOCK TABLES DataValues%s WRITE' % form)
+        # Doing preparative work: converting values to rows of table
+        if form == 'C':
+            data = [(str(val),) for val in value]
+        elif form == 'T':
+            data = [(val,) for val in value]
+        elif form == 'I':
+            data = [(int(val),) for val in value]
+        elif form == 'F':
+            data = [(int(val * pow(10., sign_val)),) for val in value]
+        elif form == 'D':
+            data = [(float(val),) for val in value]
+        elif form == 'P':
+            data = []
+            for val in value:
+                try:
+                    valx, valy, valz = val
+                    data.append((float(valx), float(valy), float(valz)))
+                except ValueError:
+                    raise DBException('Invalid argument')
+        elif form == 'R':
+            data = [(int(val),) for val in value]
+            self._checkReferences([d[0] for d in data], a_name, ref_type, link_perms, pr_id, containerID)
+        elif form == 'X':
+            data = [(float(val[0]), int(val[1])) for val in value]
+            self._checkReferences([d[1] for d in data], a_name, ref_type, link_perms, pr_id, containerID)
+        rows = [(containerID, md_id, ind) + d for (ind, d) in enumerate(data)]
+
+        table = VALUE_TABLES[form][0]
+        self.c.execute('LOCK TABLES %s WRITE' % table)
         #a_desc[3] - line number in MetaData
         try:
-            n = self.c.execute("""SELECT CodeValue FROM DataValues%s
+            n = self.c.execute("""SELECT CodeValue FROM %s
                 WHERE LinkContainer = %d
                 AND LinkMetaData = %d
-                AND Status = "Actual" """ % (form, containerID, md_id))
+                AND Status = "Actual" """ % (table, containerID, md_id))
             replaced_values = self.c.fetchall()
             # now - mark all replaced values as deleted
             if n:
                 # trying to update attribute values
-                try:
-                    self.auth.checkPermissions(pr_id, Authorities.UPDT_ATTR, perm_flags)
-                except DBAuthoritiesException as ex:
-                    raise ex
-                self.c.execute("""UPDATE DataValues%s
+                self.auth.checkPermissions(pr_id, Authorities.UPDT_ATTR, perm_flags)
+                self.c.execute("""UPDATE %s
                         SET Status = "Deleted"
                         WHERE LinkContainer = %d
                         AND LinkMetaData = %d
-                        AND Status = "Actual" """ % (form, containerID, md_id))
+                        AND Status = "Actual" """ % (table, containerID, md_id))
             else:
-                try:
-                    self.auth.checkPermissions(pr_id, Authorities.CREATE_ATTR, perm_flags)
-                except DBAuthoritiesException as ex:
-                    raise ex
-            val = None
-            ind = 0
-            if form == 'C':
-                # chars
-                for val in value:
-                    self.c.execute("""INSERT DataValuesC (LinkContainer, LinkMetaData, ValueIndex, DataValue)
-                        VALUES (%d, %d, %d, "%s") """ % (containerID, md_id, ind, val))
-                    ind += 1
-            elif form == 'T':
-                # chars
-                for val in value:
-                    self.c.execute("""INSERT DataValuesT (LinkContainer, LinkMetaData, ValueIndex, DataValue)
-                        VALUES (%d, %d, %d, "%s") """ % (containerID, md_id, ind, val))
-                    ind += 1
-            elif form == 'I':
-                # ints
-                for val in value:
-                    val = int(val)
-                    self.c.execute("""INSERT DataValuesI (LinkContainer, LinkMetaData, ValueIndex, DataValue)
-                        VALUES (%d, %d, %d, %d) """ % (containerID, md_id, ind, val))
-                    ind += 1
-            elif form == 'F':
-                # fixed
-                for val in value:
-                    val = val * pow(10., sign_val)
-                    val = int(val)
-                    self.c.execute("""INSERT DataValuesF (LinkContainer, LinkMetaData, ValueIndex, DataValue)
-                        VALUES (%d, %d, %d, %d) """ % (containerID, md_id, ind, val))
-                    ind += 1
-            elif form == 'D':
-                # doubles
-                for val in value:
-                    val = float(val)
-                    self.c.execute("""INSERT DataValuesD (LinkContainer, LinkMetaData, ValueIndex, DataValue)
-                        VALUES (%d, %d, %d, %f) """ % (containerID, md_id, ind, val))
-                    ind += 1
-            elif form == 'P':
-                # points
-                for val in value:
-                    try:
-                        valx, valy, valz = val
-                        valx, valy, valz = (float(valx), float(valy), float(valz))
-                    except ValueError:
-                        raise DBException('Invalid argument')
-                    self.c.execute("""INSERT DataValuesP (LinkContainer, LinkMetaData, ValueIndex, DataValueX, DataValueY, DataValueZ)
-                        VALUES (%d, %d, %d, %f, %f, %f) """ % (containerID, md_id, ind, valx, valy, valz))
-                    ind += 1
-            elif form == 'R':
-                for val in value:
-                    a_value = int(val)
-                    n = self.c.execute("""SELECT ContainerType, TopParent FROM Containers
-                        WHERE CodeContainer = %d AND Status = "Actual" """ % a_value)
-                    if n == 0:
-                        raise DBNotFoundException('Referenced container %d does not exist' % a_value)
-                    (cur_ref_type, ref_project) = self.c.fetchall()[0]
-                    if  not (ref_type is None) and (cur_ref_type != ref_type):
-                        raise DBException('Type %s not allowed to be referenced by %s' % (ref_type, a_name))
-                    if (link_perms == 'OwnProject') and (ref_project != pr_id):
-                        raise DBException('Reference permission violation: ref. OwnProject references from %d to %d for container %d' % (ref_project, pr_id, container_id))
-                    # Store reference value
-                    obj_type = 'DataValuesR'
-                    self.c.execute("""INSERT DataValuesR (LinkContainer, LinkMetaData, ValueIndex, DataValue)
-                        VALUES (%d, %d, %d, %d) """ % (containerID, md_id, ind, a_value))
-                    ind += 1
-            elif form == 'X':
-                for val in value:
-                    a_valuer = int(val[1])
-                    a_valued = float(val[0])
-                    n = self.c.execute("""SELECT ContainerType, TopParent FROM Containers
-                        WHERE CodeContainer = %d AND Status = "Actual" """ % a_valuer)
-                    if n == 0:
-                        raise DBNotFoundException('Referenced container %d does not exist' % a_valuer)
-                    (cur_ref_type, ref_project) = self.c.fetchall()[0]
-                    if  not (ref_type is None) and (cur_ref_type != ref_type):
-                        raise DBException('Type %s not allowed to be referenced by %s' % (ref_type, a_name))
-                    if (link_perms == 'OwnProject') and (ref_project != pr_id):
-                        raise DBException('Reference permission violation: ref. OwnProject references from %d to %d for container %d' % (ref_project, pr_id, container_id))
-                    # Store reference value
-                    obj_type = 'DataValuesX'
-                    self.c.execute("""INSERT DataValuesX (LinkContainer, LinkMetaData, ValueIndex, DataValueD, DataValueR)
-                        VALUES (%d, %d, %d, %f, %d) """ % (containerID, md_id, ind, a_valued, a_valuer))
-                    ind += 1
-            else:
-                raise DBException('Attribute type %s not supported in setContainerArrayAttribute' % form)
-
-            self.c.execute("SELECT LAST_INSERT_ID()")
+                self.auth.checkPermissions(pr_id, Authorities.CREATE_ATTR, perm_flags)
+            for i in range(0, len(rows), ARRAY_INSERT_CHUNK):
+                queries.executemany(self.c, 'setContainerArrayAttribute.' + form, rows[i:i+ARRAY_INSERT_CHUNK])
+            # ID of the last element, IDs of elements are consecutive as table is locked
+            self.c.execute("""SELECT MAX(CodeValue) FROM %s
+                WHERE LinkContainer = %d
+                AND LinkMetaData = %d
+                AND Status = "Actual" """ % (table, containerID, md_id))
             attr_id = self.c.fetchall()[0][0]
         finally:
             self.c.execute("""UNLOCK TABLES""")
-        self.auth.addLog('DataValues' + form, attr_id)
-        if replaced_values:
-            pass
-        for v_id in replaced_values:
-            self.auth.addLog('DataValues' + form, v_id[0], 'Delete')
-        return ind
+        log_records = [(table, v_id[0], 'Delete') for v_id in replaced_values]
+        if attr_id is not None:
+            log_records.insert(0, (table, attr_id, 'Create'))
+        self.auth.addLogMany(log_records)
+        dt = time.perf_counter() - t_start
+        self.last_array_insert_stats = {'rows': len(rows), 'seconds': dt, 'rows_per_s': len(rows) / dt if dt else 0.0}
+        return len(rows)
+
+    def _checkReferences(self, refs, a_name, ref_type, link_perms, pr_id, containerID):
+        """Checks that all the containers referenced from the attribute a_name of containerID
+        exist and are allowed to be referenced, raises DBException otherwise."""
+        found = {}
+        uniq_refs = list(set(refs))
+        for i in range(0, len(uniq_refs), BULK_IDS_CHUNK):
+            self.c.execute("""SELECT CodeContainer, ContainerType, TopParent FROM Containers
+                WHERE CodeContainer IN (%s) AND Status = "Actual" """ % ', '.join(['%d' % r for r in uniq_refs[i:i+BULK_IDS_CHUNK]]))
+            for (cid, cur_ref_type, ref_project) in self.c.fetchall():
+                found[cid] = (cur_ref_type, ref_project)
+        for a_value in uniq_refs:
+            if a_value not in found:
+                raise DBNotFoundException('Referenced container %d does not exist' % a_value)
+            (cur_ref_type, ref_project) = found[a_value]
+            if  not (ref_type is None) and (cur_ref_type != ref_type):
+                raise DBException('Type %s not allowed to be referenced by %s' % (ref_type, a_name))
+            if (link_perms == 'OwnProject') and (ref_project != pr_id):
+                raise DBException('Reference permission violation: ref. OwnProject references from %d to %d for container %d' % (ref_project, pr_id, containerID))
 
     def getContainerSingleAttributeWithDefault(self, containerID, a_name, default_val):
         """Returns default value if there is no associated value.
@@ -1765,103 +1984,14 @@ class P4DBbase:
             raise DBException('Container type %s has no attribute %s' % (a_type, a_name))
         if dim:
             return self.getContainerArrayAttribute(containerID, a_name)
-        val = None
-        sql_template = """SELECT DataValue FROM Containers, MetaData, %s
-                WHERE Containers.CodeContainer = %d
-                AND MetaData.CodeData = %d
-                AND MetaData.KeyWord = "%s"
-                AND %s.LinkMetaData = MetaData.CodeData
-                AND %s.LinkContainer = Containers.CodeContainer
-                AND %s.Status = "Actual"
-                """
-        # (valType, containerID, md_id, a_name, valType, valType, valType)
-        if form == 'C':
-            # chars
-            valType = 'DataValuesC'
-            n = self.c.execute(sql_template % (valType, containerID, md_id, a_name, valType, valType, valType))
-            if n > 1:
-                raise DBException('More than one attribute values for %d %s' % (containerID, a_name))
-            if n == 1:
-                val = self.c.fetchall()[0][0]
-        elif form == 'T':
-            # Time
-            valType = 'DataValuesT'
-            n = self.c.execute(sql_template % (valType, containerID, md_id, a_name, valType, valType, valType))
-            if n > 1:
-                raise DBException('More than one attribute values for %d %s' % (containerID, a_name))
-            if n == 1:
-                ## val = str(self.c.fetchall()[0][0])
-                val = self.c.fetchall()[0][0]  # !TODO: check if that works
-        elif form == 'I':
-            # ints
-            valType = 'DataValuesI'
-            n = self.c.execute(sql_template % (valType, containerID, md_id, a_name, valType, valType, valType))
-            if n > 1:
-                raise DBException('More than one attribute values for %d %s' % (containerID, a_name))
-            if n == 1:
-                val = int(self.c.fetchall()[0][0])
-        elif form == 'F':
-            # fixed
-            valType = 'DataValuesF'
-            n = self.c.execute(sql_template % (valType, containerID, md_id, a_name, valType, valType, valType))
-            if n > 1:
-                raise DBException('More than one attribute values for %d %s' % (containerID, a_name))
-            if n == 1:
-                val = float(self.c.fetchall()[0][0])
-                val = val / pow(10., sign_val)
-        elif form == 'D':
-            # double
-            valType = 'DataValuesD'
-            n = self.c.execute(sql_template % (valType, containerID, md_id, a_name, valType, valType, valType))
-            if n > 1:
-                raise DBException('More than one attribute values for %d %s' % (containerID, a_name))
-            if n == 1:
-                val = self.c.fetchall()[0][0]
-        elif form == 'R':
-            # Reference
-            valType = 'DataValuesR'
-            n = self.c.execute(sql_template % (valType, containerID, md_id, a_name, valType, valType, valType))
-            if n > 1:
-                raise DBException('More than one attribute values for %d %s' % (containerID, a_name))
-            if n == 1:
-                val = self.c.fetchall()[0][0]
-        elif form == 'X':
-            # Reference and double value
-            valType = 'DataValuesX'
-            sql_template = """SELECT DataValueD, DataValueR
-                    FROM Containers, MetaData, %s
-                    WHERE Containers.CodeContainer = %d
-                    AND MetaData.CodeData = %d
-                    AND MetaData.KeyWord = "%s"
-                    AND %s.LinkMetaData = MetaData.CodeData
-                    AND %s.LinkContainer = Containers.CodeContainer
-                    AND %s.Status = "Actual"
-                    """
-            n = self.c.execute(sql_template % (valType, containerID, md_id, a_name, valType, valType, valType))
-            if n > 1:
-                raise DBException('More than one attribute values for %d %s' % (containerID, a_name))
-            if n == 1:
-                val = self.c.fetchall()[0]
-        elif form == 'P':
-            # point: (x, y, z)
-            valType = 'DataValuesP'
-            sql_template = """SELECT DataValueX, DataValueY, DataValueZ
-                    FROM Containers, MetaData, %s
-                    WHERE Containers.CodeContainer = %d
-                    AND MetaData.CodeData = %d
-                    AND MetaData.KeyWord = "%s"
-                    AND %s.LinkMetaData = MetaData.CodeData
-                    AND %s.LinkContainer = Containers.CodeContainer
-                    AND %s.Status = "Actual"
-                    """
-            # (valType, containerID, md_id, a_name, valType, valType, valType)
-            n = self.c.execute(sql_template % (valType, containerID, md_id, a_name, valType, valType, valType))
-            if n > 1:
-                raise DBException('More than one attribute values for %d %s' % (containerID, a_name))
-            if n == 1:
-                val = self.c.fetchall()[0]
-        else:
+        if form not in VALUE_TABLES:
             raise DBException('Usupported attribute type %s for container %d' % (form, containerID))
+        val = None
+        n = queries.execute(self.c, 'getContainerSingleAttribute.' + form, (containerID, md_id))
+        if n > 1:
+            raise DBException('More than one attribute values for %d %s' % (containerID, a_name))
+        if n == 1:
+            val = _convertValue(form, sign_val, self.c.fetchall()[0])
         if val is None:
             raise DBException('Container %d: value not set for %s' % (containerID, a_name))
         return val
@@ -1882,102 +2012,10 @@ class P4DBbase:
             raise DBException('Non - array attribute value requested for %d, array attr. %s' % (containerID, a_name))
         if dim > 1:
             raise DBException('Multidimension attributes not implemented. ID %d, array attr. %s' % (containerID, a_name))
-        sql_templ = """SELECT ValueIndex, DataValue FROM Containers, MetaData, %s
-                WHERE Containers.CodeContainer = %d
-                AND MetaData.CodeData = %d
-                AND MetaData.KeyWord = "%s"
-                AND %s.LinkMetaData = MetaData.CodeData
-                AND %s.LinkContainer = Containers.CodeContainer
-                AND %s.Status = "Actual"
-                ORDER BY ValueIndex
-                """
-        values = []
-        if form == 'C':
-            # chars
-            valType = 'DataValuesC'
-            n = self.c.execute(sql_templ % (valType, containerID, md_id, a_name, valType, valType, valType))
-            if n:
-                vallist = self.c.fetchall()
-                for ind_and_val in vallist:
-                    val = ind_and_val[1]
-                    values.append(val)
-        elif form == 'I':
-            # ints
-            valType = 'DataValuesI'
-            n = self.c.execute(sql_templ % (valType, containerID, md_id, a_name, valType, valType, valType))
-            if n:
-                vallist = self.c.fetchall()
-                for ind_and_val in vallist:
-                    val = int(ind_and_val[1])
-                    values.append(val)
-        elif form == 'F':
-            # fixed
-            valType = 'DataValuesF'
-            n = self.c.execute(sql_templ % (valType, containerID, md_id, a_name, valType, valType, valType))
-            if n:
-                vallist = self.c.fetchall()
-                for ind_and_val in vallist:
-                    val = float(ind_and_val[1])
-                    val = val / pow(10., sign_val)
-                    values.append(val)
-        elif form == 'D':
-            # doubles
-            valType = 'DataValuesD'
-            n = self.c.execute(sql_templ % (valType, containerID, md_id, a_name, valType, valType, valType))
-            if n:
-                vallist = self.c.fetchall()
-                for ind_and_val in vallist:
-                    val = ind_and_val[1]
-                    values.append(val)
-        elif form == 'R':
-            # reference
-            valType = 'DataValuesR'
-            n = self.c.execute(sql_templ % (valType, containerID, md_id, a_name, valType, valType, valType))
-            if n:
-                vallist = self.c.fetchall()
-                for ind_and_val in vallist:
-                    val = ind_and_val[1]
-                    values.append(val)
-        elif form == 'X':
-            # reference
-            valType = 'DataValuesX'
-            sql_templ = """SELECT ValueIndex, DataValueD, DataValueR
-                    FROM Containers, MetaData, %s
-                    WHERE Containers.CodeContainer = %d
-                    AND MetaData.CodeData = %d
-                    AND MetaData.KeyWord = "%s"
-                    AND %s.LinkMetaData = MetaData.CodeData
-                    AND %s.LinkContainer = Containers.CodeContainer
-                    AND %s.Status = "Actual"
-                    ORDER BY ValueIndex
-                    """
-            n = self.c.execute(sql_templ % (valType, containerID, md_id, a_name, valType, valType, valType))
-            if n:
-                vallist = self.c.fetchall()
-                for ind_and_val in vallist:
-                    val = ind_and_val[1:3]
-                    values.append(tuple(val))
-        elif form == 'P':
-            # points array
-            valType = 'DataValuesP'
-            sql_templ = """SELECT ValueIndex, DataValueX, DataValueY, DataValueZ
-                    FROM Containers, MetaData, %s
-                    WHERE Containers.CodeContainer = %d
-                    AND MetaData.CodeData = %d
-                    AND MetaData.KeyWord = "%s"
-                    AND %s.LinkMetaData = MetaData.CodeData
-                    AND %s.LinkContainer = Containers.CodeContainer
-                    AND %s.Status = "Actual"
-                    ORDER BY ValueIndex
-                    """
-            n = self.c.execute(sql_templ % (valType, containerID, md_id, a_name, valType, valType, valType))
-            if n:
-                vallist = self.c.fetchall()
-                for ind_and_val in vallist:
-                    val = ind_and_val[1:4]
-                    values.append(tuple(val))
-        else:
+        if form not in VALUE_TABLES:
             raise DBException('Usupported attribute type %s for container %d' % (form, containerID))
+        queries.execute(self.c, 'getContainerArrayAttribute.' + form, (containerID, md_id))
+        values = [_convertValue(form, sign_val, row[1:]) for row in self.c.fetchall()]
         if not values:
             raise DBException('Container %d: value not set for %s' % (containerID, a_name))
         return values
@@ -2018,17 +2056,274 @@ class P4DBbase:
 
     def getContainerAttributes(self, containerID):
         """Returns dictionary of values of container attributes"""
-        (a_type, pr_id) = self.getContainerType(containerID)
-        m_d = self.MetaData[a_type]
-        vals = {}
-        for a_name in list(m_d.keys()):
-            try:
-                val = self.getContainerSingleAttribute(containerID, a_name, a_type, m_d)
-            except DBException:
+        return self.getContainersAttributes([containerID])[containerID]
+
+    def getContainersInfo(self, ids):
+        """Returns dictionary {containerID: (type, name, project ID)} for actual containers from ids.
+        Raises DBNotFoundException if some container is not found."""
+        ids = list(set(ids))
+        res = {}
+        for i in range(0, len(ids), BULK_IDS_CHUNK):
+            chunk = ids[i:i+BULK_IDS_CHUNK]
+            self.c.execute("""SELECT CodeContainer, ContainerType, ContainerName, TopParent FROM Containers
+                    WHERE CodeContainer IN (%s) AND Status = 'Actual' """ % ', '.join(['%d' % cid for cid in chunk]))
+            for (cid, a_type, name, pr_id) in self.c.fetchall():
+                res[cid] = (a_type, name, pr_id)
+        missing = [cid for cid in ids if cid not in res]
+        if missing:
+            raise DBNotFoundException('Cannot find container with ID %d' % missing[0])
+        for pr_id in set(t[2] for t in res.values()):
+            self.auth.checkPermissions(pr_id, Authorities.ACCESS_PROJ)
+        return res
+
+    def resolveReferences(self, ids):
+        """Returns dictionary {containerID: (name, name of parent, containerID)} for referenced
+        containers from ids, the form is the same as used by getSubContainersListByPath.
+        Raises DBNotFoundException if some container or its parent is not found."""
+        ids = list(set(ids))
+        res = {}
+        projects = set()
+        for i in range(0, len(ids), BULK_IDS_CHUNK):
+            chunk = ids[i:i+BULK_IDS_CHUNK]
+            self.c.execute("""SELECT c.CodeContainer, c.ContainerName, p.ContainerName, c.TopParent
+                    FROM Containers AS c JOIN Containers AS p ON p.CodeContainer = c.LinkUp AND p.Status = 'Actual'
+                    WHERE c.CodeContainer IN (%s) AND c.Status = 'Actual' """ % ', '.join(['%d' % cid for cid in chunk]))
+            for (cid, name, p_name, pr_id) in self.c.fetchall():
+                res[cid] = (name, p_name, cid)
+                projects.add(pr_id)
+        missing = [cid for cid in ids if cid not in res]
+        if missing:
+            raise DBNotFoundException('Cannot find container with ID %d' % missing[0])
+        for pr_id in projects:
+            self.auth.checkPermissions(pr_id, Authorities.ACCESS_PROJ)
+        return res
+
+    def getContainersAttributes(self, ids, a_names=None):
+        """Returns dictionary {containerID: {attribute name: value}} of attributes of
+        containers from ids, values are the same as returned by getContainerSingleAttribute.
+        Attributes that have no values are omitted. If a_names is given, only attributes
+        from this list are fetched (names not defined for container type are ignored).
+        Values are read with at most one query per DataValues table (for every BULK_IDS_CHUNK containers).
+        """
+        ids = list(ids)
+        c_types = self.getContainersInfo(ids)
+        # md_id -> (attribute name, form, sign_val, dim) by container type
+        md_by_type = {}
+        md_ids_by_form = {}
+        for a_type in set(t[0] for t in c_types.values()):
+            m_d = self.MetaData[a_type]
+            info = {}
+            for a_name in (list(m_d.keys()) if a_names is None else a_names):
+                try:
+                    (form, sign_val, dim, md_id, ref_type, link_perms) = m_d[a_name]
+                except KeyError:
+                    continue
+                if dim > 1 or (dim and form == 'T') or form not in VALUE_TABLES:
+                    # not supported by getContainerSingleAttribute as well
+                    continue
+                info[md_id] = (a_name, form, sign_val, dim)
+                md_ids_by_form.setdefault(form, set()).add(md_id)
+            md_by_type[a_type] = info
+        # (containerID, md_id) -> list of rows ordered by ValueIndex
+        rows_by_attr = {}
+        uniq_ids = list(c_types.keys())
+        for form in sorted(md_ids_by_form):
+            (table, columns) = VALUE_TABLES[form]
+            md_in = ', '.join(['%d' % md_id for md_id in md_ids_by_form[form]])
+            for i in range(0, len(uniq_ids), BULK_IDS_CHUNK):
+                ids_in = ', '.join(['%d' % cid for cid in uniq_ids[i:i+BULK_IDS_CHUNK]])
+                self.c.execute("""SELECT LinkContainer, LinkMetaData, ValueIndex, %s FROM %s
+                        WHERE LinkContainer IN (%s)
+                        AND LinkMetaData IN (%s)
+                        AND Status = "Actual"
+                        ORDER BY LinkContainer, LinkMetaData, ValueIndex""" % (columns, table, ids_in, md_in))
+                for row in self.c.fetchall():
+                    rows_by_attr.setdefault((row[0], row[1]), []).append(row)
+        res = {}
+        for cid in ids:
+            if cid in res:
                 continue
-            vals[a_name] = val
+            info = md_by_type[c_types[cid][0]]
+            vals = {}
+            for md_id in info:
+                rows = rows_by_attr.get((cid, md_id))
+                if not rows:
+                    continue
+                (a_name, form, sign_val, dim) = info[md_id]
+                if dim:
+                    vals[a_name] = [_convertValue(form, sign_val, r[3:]) for r in rows]
+                elif len(rows) == 1:
+                    val = _convertValue(form, sign_val, rows[0][3:])
+                    if val is not None:
+                        vals[a_name] = val
+            res[cid] = vals
+        return res
+
+    def getAttributesColumns(self, ids, a_names, defaults=None, resolve_refs=False):
+        """Returns values of attributes a_names of containers ids as columns:
+        {a_name: [value for each ID in ids]}. Missing values are replaced with values
+        from the defaults dictionary (None if there is no default).
+        Single and array attributes are supported. If resolve_refs is True, references
+        (attributes of the R form) are replaced with tuples (name, parent name, ID).
+        Number of queries does not depend on the number of containers.
+        """
+        ids = list(ids)
+        defaults = defaults or {}
+        vals = self.getContainersAttributes(ids, a_names)
+        if resolve_refs:
+            vals = self._resolveReferencedValues(vals)
+        return dict([(a_name, [vals[cid].get(a_name, defaults.get(a_name)) for cid in ids]) for a_name in a_names])
+
+    def _resolveReferencedValues(self, vals):
+        """Replaces references in attributes values {containerID: {attribute name: value}}
+        with tuples (name, parent name, ID), resolving all references with one query."""
+        c_types = self.getContainersInfo(list(vals.keys()))
+        refs = set()
+        ref_attrs = {}
+        for (cid, ans) in vals.items():
+            m_d = self.MetaData[c_types[cid][0]]
+            ref_attrs[cid] = [a for a in ans if m_d[a][0] == 'R']
+            for a in ref_attrs[cid]:
+                if m_d[a][2] == 0:
+                    refs.add(ans[a])
+                else:
+                    refs.update([cr for cr in ans[a] if cr is not None])
+        resolved = self.resolveReferences(refs) if refs else {}
+        for (cid, ans) in vals.items():
+            for a in ref_attrs[cid]:
+                if isinstance(ans[a], list):
+                    ans[a] = [resolved.get(cr) for cr in ans[a]]
+                else:
+                    ans[a] = resolved[ans[a]]
         return vals
 
+    def getWellMethodsLocations(self, projectID, pairs):
+        """Resolves (well name, method name) pairs of the project projectID with one joined query
+        (for every BULK_IDS_CHUNK wells).
+        Output:
+          dictionary {(well name, method name): (wellID, methodID, format, DPath, units, isBoundaries,
+          path, isProtected, owner name)}. Attributes that are not set are None, isBoundaries is True
+          for boundaries methods (wbnd), if there are both log data and boundaries methods with the
+          same name, log data are returned. Pairs that are not found are omitted.
+        """
+        self.auth.checkPermissions(projectID, Authorities.ACCESS_PROJ)
+        m_d = self.MetaData['weld']
+        attrs = []
+        for a_name in METHOD_LOCATION_ATTRIBUTES:
+            try:
+                (form, sign_val, dim, md_id, ref_type, link_perms) = m_d[a_name]
+            except KeyError:
+                form = None
+            if form is not None and (dim or len(VALUE_TABLES[form][1].split(',')) > 1):
+                form = None  # only single scalar values are supported
+            attrs.append((form, sign_val, md_id) if form else None)
+        def build_sql():
+            cols = []
+            joins = []
+            for (i, a) in enumerate(attrs):
+                if a is None:
+                    cols.append('NULL')
+                    continue
+                (table, column) = VALUE_TABLES[a[0]]
+                cols.append('a%d.%s' % (i, column))
+                joins.append("""LEFT JOIN %s AS a%d ON a%d.LinkContainer = m.CodeContainer
+                        AND a%d.LinkMetaData = %%s AND a%d.Status = 'Actual'""" % (table, i, i, i, i))
+            return """SELECT w.ContainerName, m.ContainerName, w.CodeContainer, m.CodeContainer,
+                    m.ContainerType, m.isProtected, u.UserName, %s
+                    FROM Containers AS w
+                    JOIN Containers AS m ON m.LinkUp = w.CodeContainer AND m.Status = 'Actual'
+                    AND m.ContainerType IN ('weld', 'wbnd')
+                    LEFT JOIN Users AS u ON m.ownerID = u.UserID
+                    %s
+                    WHERE w.LinkUp = %%s AND w.ContainerType = 'wel1' AND w.Status = 'Actual'
+                    AND w.ContainerName IN %%s AND m.ContainerName IN %%s""" % (', '.join(cols), '\n'.join(joins))
+        key = tuple(a[0] if a else None for a in attrs)
+        md_params = tuple(a[2] for a in attrs if a is not None)
+        wanted = set(pairs)
+        methods_by_well = {}
+        for (w_name, m_name) in wanted:
+            methods_by_well.setdefault(w_name, set()).add(m_name)
+        well_names = list(methods_by_well.keys())
+        res = {}
+        for i in range(0, len(well_names), BULK_IDS_CHUNK):
+            chunk = well_names[i:i+BULK_IDS_CHUNK]
+            m_names = set()
+            for w_name in chunk:
+                m_names.update(methods_by_well[w_name])
+            queries.execute(self.c, 'getWellMethodsLocations', md_params + (projectID, tuple(chunk), tuple(m_names)),
+                            key=key, build_sql=build_sql)
+            for row in self.c.fetchall():
+                (w_name, m_name, wid, mid, c_type, protected, owner) = row[:7]
+                if (w_name, m_name) not in wanted:
+                    continue
+                if c_type == 'wbnd' and (w_name, m_name) in res:
+                    continue
+                vals = [None if a is None else _convertValue(a[0], a[1], (v,)) for (a, v) in zip(attrs, row[7:])]
+                (format, dpath, units, path) = vals
+                res[(w_name, m_name)] = (wid, mid, format, dpath, units, c_type == 'wbnd', path, protected, owner)
+        return res
+
+    def getSubContainersListByTypeBulk(self, containerIDs, c_type):
+        """Bulk version of getSubContainersListByType.
+        Output:
+          dictionary {parent ID: [(ContainerID, name), ...]} for all containers from containerIDs
+          (parents without subordinate containers of type c_type are omitted), ordered by ContainerID.
+        """
+        ids = list(set(containerIDs))
+        # checking access permissions for projects containers belong to
+        self.getContainersInfo(ids)
+        res = {}
+        for i in range(0, len(ids), BULK_IDS_CHUNK):
+            chunk = ids[i:i+BULK_IDS_CHUNK]
+            self.c.execute("""SELECT LinkUp, CodeContainer, ContainerName FROM Containers
+                    WHERE LinkUp IN (%s) AND ContainerType = %%s AND Status = 'Actual'
+                    ORDER BY CodeContainer""" % ', '.join(['%d' % cid for cid in chunk]), (c_type,))
+            for (parent, cid, name) in self.c.fetchall():
+                res.setdefault(parent, []).append((cid, name))
+        return res
+
+    def getChangeLogPosition(self):
+        "Returns key of the last record of ChangeLog (0 if it is empty)"
+        self.c.execute("SELECT MAX(%s) FROM ChangeLog" % CHANGELOG_KEY)
+        return self.c.fetchall()[0][0] or 0
+
+    def getChangedContainersTypes(self, last_key, limit=CHANGELOG_READ_LIMIT, exclude=()):
+        """Reads records of ChangeLog added after the record last_key (no more than limit records),
+        skipping records with keys in exclude (already processed), and resolves them to containers they touch:
+        records of Containers refer to containers directly, records of DataValues tables - through LinkContainer of the value.
+        Output:
+          tuple (key of the last record read, set of (projectID, container type), complete, keys of records read),
+          complete is False if there are more records to read.
+        """
+        self.c.execute("""SELECT %s, TableType, Link FROM ChangeLog WHERE %s > %%s
+                ORDER BY %s LIMIT %%s""" % (CHANGELOG_KEY, CHANGELOG_KEY, CHANGELOG_KEY), (last_key, limit))
+        rows = self.c.fetchall()
+        complete = len(rows) < limit
+        last_read = rows[-1][0] if rows else last_key
+        rows = [r for r in rows if r[0] not in exclude]
+        if not rows:
+            return (last_read, set(), complete, [])
+        links = {}
+        for (_, table, link) in rows:
+            links.setdefault(table, set()).add(link)
+        value_tables = set(t for (t, _) in VALUE_TABLES.values())
+        res = set()
+        for (table, ids) in links.items():
+            ids = list(ids)
+            for i in range(0, len(ids), BULK_IDS_CHUNK):
+                ids_s = ', '.join(['%d' % oid for oid in ids[i:i+BULK_IDS_CHUNK]])
+                if table == 'Containers':
+                    self.c.execute("""SELECT TopParent, ContainerType FROM Containers
+                            WHERE CodeContainer IN (%s)""" % ids_s)
+                elif table in value_tables:
+                    self.c.execute("""SELECT c.TopParent, c.ContainerType FROM %s AS v
+                            JOIN Containers AS c ON c.CodeContainer = v.LinkContainer
+                            WHERE v.CodeValue IN (%s)""" % (table, ids_s))
+                else:
+                    continue
+                res.update(self.c.fetchall())
+        return (last_read, res, complete, [r[0] for r in rows])
+
     def getDistinctNamesByType(self, project_name, c_type):
         """Returns all distinct names for containers having
         type c_type.
@@ -2408,9 +2703,27 @@ class P4DBbase:
             if res1[1] is None:
                res1[1] =  MAXFLOAT
         else:
-            res1 = [-MAXFLOAT, MAXFLOAT]  
+            res1 = [-MAXFLOAT, MAXFLOAT]
         return res1
-        
+
+    def getMaxForParameterByParents(self, prid, cont_types, attr_name):
+        """Bulk version of getMinMaxForParameterInContainer (maximum only) for all the containers
+        of the project: returns maximum of defined values of attribute attr_name of containers of types
+        cont_types grouped by parent containers, {parent ID: max}. Parents without defined values are omitted.
+        """
+        self.auth.checkPermissions(prid, Authorities.ACCESS_PROJ)
+        self.c.execute("""
+        SELECT c.LinkUp, MAX(d.DataValue)
+        FROM Containers c, MetaData m, DataValuesD d
+        WHERE c.ContainerType IN (%s)
+        AND c.TopParent = %%s AND c.Status = 'Actual'
+        AND m.ContainerType = c.ContainerType AND m.KeyWord = %%s
+        AND d.LinkMetaData = m.CodeData AND d.LinkContainer = c.CodeContainer
+        AND d.Status = 'Actual'
+        AND d.DataValue < 3.401e+38
+        GROUP BY c.LinkUp""" % ', '.join(['%s'] * len(cont_types)), tuple(cont_types) + (prid, attr_name))
+        return dict([(parent, v) for (parent, v) in self.c.fetchall() if v is not None])
+
 
     def markSingleAttributeDeleted(self, containerID, a_name):
         """Mark container attribute as deleted.
@@ -2543,23 +2856,66 @@ class P4DBbase:
         self.auth.addLog('Containers', containerID, 'Delete')
 
     def markContainersTreeDeleted(self, containerID, force=False):
-        """Mark the whole tree of containers as deleted"""
-        ids = self.getSubContainersList(containerID)
-        for c_id in ids:
-            self.markContainersTreeDeleted(c_id[0], force)
-        self.markContainerDeleted_NEW(containerID, force)
+        """Mark the whole tree of containers as deleted, none of containers of the tree may be protected"""
+        return self.markContainersTreeDeletedBulk(containerID, force, check_descendants=True)
 
     def markContainersTreeDeleted_NEW(self, containerID, force=False):
+        """Mark the whole tree of containers as deleted, only the root container is checked for protection"""
+        return self.markContainersTreeDeletedBulk(containerID, force, check_descendants=False)
+
+    def getContainersTreeIds(self, containerID):
+        """Returns list of IDs of containerID and all its actual subcontainers of any depth,
+        parents go before their children. Tree is traversed level by level, one query per level
+        (for every BULK_IDS_CHUNK containers)."""
+        ids = [containerID]
+        level = [containerID]
+        while level:
+            next_level = []
+            for i in range(0, len(level), BULK_IDS_CHUNK):
+                self.c.execute("""SELECT CodeContainer FROM Containers
+                        WHERE LinkUp IN (%s) AND Status = 'Actual' """ % ', '.join(['%d' % cid for cid in level[i:i+BULK_IDS_CHUNK]]))
+                next_level += [r[0] for r in self.c.fetchall()]
+            ids += next_level
+            level = next_level
+        return ids
+
+    def markContainersTreeDeletedBulk(self, containerID, force=False, check_descendants=True):
+        """Mark container, all its subcontainers of any depth, their attributes and references to
+        them as deleted. Containers are processed in sets of BULK_IDS_CHUNK, so the number of
+        queries depends on the depth of tree and number of containers divided by BULK_IDS_CHUNK.
+        Operations are logged to ChangeLog with one multi-row insert.
+        Returns number of containers deleted.
+        Exceptions:
+          DBAuthoritiesException if user has no rights to delete containers or the container
+          (or any container of the tree if check_descendants is True) is protected, unless force is True;
+          nothing is deleted in this case.
+        """
         prid = self.getParentProject(containerID)
         self.auth.checkPermissions(prid, Authorities.DELETE_CONT)
-        # Check for protection
         if not force:
             self.auth.assertNotProtected(containerID)
-        MAX_LEVEL = 5  # @TODO: We should eliminate the magic constant!
-        for i in range(MAX_LEVEL-1, 0-1, -1):
-            self.markChildrenOfLevelNDeleted(i, containerID)
-        self.auth.addLog('Containers', containerID, 'DeleteTree')
-        self.markLooseReferencesDeleted(prid)
+        ids = self.getContainersTreeIds(containerID)
+        chunks = [', '.join(['%d' % cid for cid in ids[i:i+BULK_IDS_CHUNK]]) for i in range(0, len(ids), BULK_IDS_CHUNK)]
+        # Check for protection of descendants
+        if not force and check_descendants:
+            for ids_in in chunks:
+                n = self.c.execute("""SELECT CodeContainer FROM Containers
+                        WHERE CodeContainer IN (%s) AND isProtected """ % ids_in)
+                if n:
+                    raise DBAuthoritiesException('Protected container %d cannot be deleted or changed!' % self.c.fetchall()[0][0])
+        for ids_in in chunks:
+            self.c.execute("""UPDATE Containers SET Status = 'Deleted'
+                    WHERE CodeContainer IN (%s) AND Status = 'Actual' """ % ids_in)
+            for (table, columns) in VALUE_TABLES.values():
+                self.c.execute("""UPDATE %s SET Status = 'Deleted'
+                        WHERE LinkContainer IN (%s) AND Status = 'Actual' """ % (table, ids_in))
+            # references to deleted containers
+            self.c.execute("""UPDATE DataValuesR SET Status = 'Deleted'
+                    WHERE DataValue IN (%s) AND Status = 'Actual' """ % ids_in)
+            self.c.execute("""UPDATE DataValuesX SET Status = 'Deleted'
+                    WHERE DataValueR IN (%s) AND Status = 'Actual' """ % ids_in)
+        self.auth.addLogMany([('Containers', cid, 'Delete') for cid in ids] + [('Containers', containerID, 'DeleteTree')])
+        return len(ids)
 
     def markChildrenOfLevelNDeleted(self, n, containerID):
         "Generate and execute SQL to delete childen of a given container at tle level N"
@@ -3337,24 +3693,14 @@ class P4DBbase:
         if not n:
             return []
         res = []
-        for c_id in self.c.fetchall():
-            ans = self.getContainerAttributes(c_id[-1])
-##            print 'DEBUG:', ans
-            t, name = self.getContainerName(c_id[-1])
-            # replace references with type and name of referenced container
-            m_d = self.MetaData[t]
-            for a in ans:
-                (form, sign_val, dim, md_id, ref_type, link_perms) = m_d[a]
-                if form == 'R' and dim == 0:
-                    ans[a] = (self.getContainerName(ans[a])[1], 
-                              self.getContainerName(self.getParentContainer(ans[a]))[1],
-                              ans[a])
-                elif form == 'R' and dim > 0:
-                    ans[a] = [(self.getContainerName(cr)[1], 
-                               self.getContainerName(self.getParentContainer(cr))[1], 
-                               cr) for cr in ans[a]]
-                else:
-                    ans[a] = ans[a]
+        rows = self.c.fetchall()
+        # attributes of all the containers are read at once,
+        # references are replaced with type and name of referenced container
+        all_attrs = self._resolveReferencedValues(self.getContainersAttributes([c_id[-1] for c_id in rows]))
+        names = self.getContainersInfo([c_id[-1] for c_id in rows])
+        for c_id in rows:
+            ans = dict(all_attrs[c_id[-1]])
+            t, name = names[c_id[-1]][:2]
             path_t = [self.classIdString2type(c_id[i]) for i in range(0, len(c_id), 2)]
             path_n = [c_id[i] for i in range(1, len(c_id), 2)]
             c_path = list(zip(path_t, path_n))
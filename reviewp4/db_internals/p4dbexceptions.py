@@ -30,3 +30,8 @@ class DBAuthoritiesException(DBException):
     def __init__(self, a_cause):
         DBException.__init__(self, a_cause)
 
+
+class DBPoolTimeoutException(DBException):
+    "No connection to DB available in time"
+    def __init__(self, a_cause):
+        DBException.__init__(self, a_cause)
@@ -0,0 +1,110 @@
+# $Id:  $
+"""
+Registry of SQL query templates used by p4db. Queries are executed with parameters
+bound by DB driver instead of interpolating values into SQL text, execution time
+of each template is accounted for.
+Note: MySQLdb and PyMySQL drivers do not support server-side prepared statements, the
+driver escapes parameters on client side. SQL text of a template is built only once,
+variants of templates depending on the structure of query (e.g. set of joined tables)
+are cached by key.
+"""
+__version__ = "$Revision: 0 $"[11:-2]  # code version
+
+import time
+import threading
+
+
+class QueryTemplate:
+    "SQL text with placeholders (%s) for parameters and execution counters"
+    def __init__(self, name, sql):
+        self.name = name
+        self.sql = sql
+        self.calls = 0
+        self.rows = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def stats(self):
+        return {'name': self.name, 'calls': self.calls, 'rows': self.rows, 'total_time': self.total_time,
+                'max_time': self.max_time, 'avg_time': self.total_time / self.calls if self.calls else 0.0,
+                'rows_per_s': self.rows / self.total_time if self.total_time else 0.0}
+
+
+class QueryRegistry:
+    "Named query templates used by p4db"
+    def __init__(self):
+        self.templates = {}
+        self.variants = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, sql):
+        "Registers template and returns it, re-registering of the name replaces SQL but keeps counters"
+        with self._lock:
+            t = self.templates.get(name)
+            if t is None:
+                t = self.templates[name] = QueryTemplate(name, sql)
+            else:
+                t.sql = sql
+        return t
+
+    def variant(self, name, key, build_sql):
+        """Returns template for variant of query name designated by key (hashable),
+        SQL of variant is built by build_sql() on the first call only.
+        Counters are kept for the query name as a whole."""
+        sql = self.variants.get((name, key))
+        if sql is None:
+            sql = build_sql()
+            with self._lock:
+                self.variants[(name, key)] = sql
+        t = self.templates.get(name) or self.register(name, sql)
+        return t, sql
+
+    def execute(self, cursor, name, params=(), key=None, build_sql=None):
+        """Executes query name (or its variant key, see variant) with parameters params using cursor.
+        Returns the same as cursor.execute (number of rows)."""
+        if key is None:
+            t = self.templates[name]
+            sql = t.sql
+        else:
+            t, sql = self.variant(name, key, build_sql)
+        t_start = time.perf_counter()
+        n = cursor.execute(sql, params)
+        dt = time.perf_counter() - t_start
+        with self._lock:
+            t.calls += 1
+            t.rows += n or 0
+            t.total_time += dt
+            if dt > t.max_time:
+                t.max_time = dt
+        return n
+
+    def executemany(self, cursor, name, seq_params):
+        """Executes query name with every parameters tuple from seq_params. For INSERT ... VALUES
+        queries drivers send all the rows in one multi-row statement. Returns number of rows affected."""
+        t = self.templates[name]
+        t_start = time.perf_counter()
+        n = cursor.executemany(t.sql, seq_params)
+        dt = time.perf_counter() - t_start
+        with self._lock:
+            t.calls += 1
+            t.rows += n or 0
+            t.total_time += dt
+            if dt > t.max_time:
+                t.max_time = dt
+        return n
+
+    def stats(self):
+        "Returns list of counters of templates, the most time consuming first"
+        with self._lock:
+            res = [t.stats() for t in self.templates.values() if t.calls]
+        res.sort(key=lambda s: -s['total_time'])
+        return res
+
+    def reset(self):
+        with self._lock:
+            for t in self.templates.values():
+                t.calls = t.rows = 0
+                t.total_time = t.max_time = 0.0
+
+
+queries = QueryRegistry()
@@ -1,8 +1,9 @@
 from typing import Optional
 from fastapi import Depends, Header, HTTPException
 import logging
-from .db_internals import pool, ConnectionContext
+from .db_internals import pool, ConnectionContext, AsyncConnectionContext
 from .db_internals.p4dbexceptions import DBAuthoritiesException
+from .utilities.async_utils import run_blocking
 
 log = logging.getLogger(__name__)
 
@@ -13,9 +14,9 @@ def extract_name_from_header(x_diprojects_user: Optional[str] = Header(None)):
     return x_diprojects_user
 
 async def get_connection(user=Depends(extract_name_from_header)):
-    with ConnectionContext() as cn:
+    async with AsyncConnectionContext() as cn:
         try: 
-            cn.set_user(user)
+            await run_blocking(cn.set_user, user)
         except DBAuthoritiesException as ex:
             raise HTTPException(status_code=401, detail='Wrong user: ' + ex.cause)
         yield cn
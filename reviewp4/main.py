@@ -2,20 +2,42 @@ from typing import Optional
 from fastapi import FastAPI, Depends, Header, Request, HTTPException
 from fastapi.responses import JSONResponse
 from fastapi.middleware.gzip import GZipMiddleware
-from .routers import misc, wells, maps
+from .routers import misc, wells, maps, seismic
 import logging
+import asyncio
 from .dependencies import get_connection
-from .db_internals.p4dbexceptions import DBAuthoritiesException, DBNotFoundException
+from .db_internals import pool
+from .db_internals.p4dbexceptions import DBAuthoritiesException, DBNotFoundException, DBPoolTimeoutException
 from . import settings
+from .utilities import async_utils
+import pangea.dxheaders
 
 logging.basicConfig(level=logging.DEBUG, format='%(levelname)s: [%(asctime)s] %(message)s')
 log = logging.getLogger(__name__)
 
+pangea.dxheaders.header_cache.max_size = settings.DX_HEADER_CACHE_SZ
+pangea.dxheaders.header_cache.sidecar_dir = settings.DX_HEADER_SIDECAR_DIR
+
 app = FastAPI(title="ReView Data Access Server")
 if settings.ENABLE_GZIP:
     app.add_middleware(GZipMiddleware, minimum_size=settings.GZIP_MINIMUM_SIZE)
     log.info('Gzip compression enabled for size > %s', settings.GZIP_MINIMUM_SIZE)
 
+@app.on_event('startup')
+async def install_executor():
+    # Synchronous routes are run in the default executor, which is sized according to DB pool size
+    async_utils.install(asyncio.get_running_loop())
+
+@app.on_event('startup')
+async def start_db_pool():
+    # Connections are opened here rather than on import, a failure is not fatal: the pool opens them on demand
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(None, pool.open_min)
+    except Exception as ex:
+        log.error('Cannot open DB connections on startup: %s', ex)
+    pool.start_reaper(loop)
+
 @app.exception_handler(DBAuthoritiesException)
 def handle_auth_exception(req: Request, ex: DBAuthoritiesException):
     return JSONResponse(status_code=400, content=ex.cause)
@@ -24,13 +46,18 @@ def handle_auth_exception(req: Request, ex: DBAuthoritiesException):
 def handle_auth_exception(req: Request, ex: DBNotFoundException):
     return JSONResponse(status_code=400, content=ex.cause)
 
+@app.exception_handler(DBPoolTimeoutException)
+def handle_pool_timeout_exception(req: Request, ex: DBPoolTimeoutException):
+    return JSONResponse(status_code=503, content=ex.cause)
+
 app.include_router(misc.router, prefix='/aux')
 app.include_router(wells.router, prefix='/wells')
 app.include_router(maps.router, prefix='/maps')
+app.include_router(seismic.router, prefix='/seismic')
 
 
 @app.get('/users')
-async def users(cn=Depends(get_connection)):
+def users(cn=Depends(get_connection)):
     log.info('Users requested')
     with cn.getConnection().cursor() as c:
         c.execute('select * from Users')
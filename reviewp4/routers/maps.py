@@ -10,6 +10,7 @@ import reviewp4.db_internals.p4dbexceptions as p4dbexceptions
 import reviewp4.models as models
 import pangea
 import reviewp4.utilities.grid_utils as grid_utils
+import reviewp4.utilities.gen_utils as gen_utils
 
 from ..dependencies import get_connection, extract_name_from_header
 from ..utilities.gen_utils import pack_message
@@ -21,7 +22,7 @@ router = APIRouter(tags=['maps'])
 projRoot = '/opt/PANGmisc/DB_ROOT/PROJECTS'
 
 @router.get('/list/{project_name}')
-async def list_maps(project_name: str, db = Depends(get_connection)):
+def list_maps(project_name: str, db = Depends(get_connection)):
     """Returns list of grid geometries defined in the project specified with the project_name parameter.
     The result format is similar to the following one:
            Example:
@@ -64,7 +65,7 @@ async def list_maps(project_name: str, db = Depends(get_connection)):
     return {'maps': res, 'project': project_name}
 
 @router.get('/grid_geometry/{project_name}/{grid_name:path}')
-async def get_map_geometry(project_name: str, grid_name:str, db = Depends(get_connection)):
+def get_map_geometry(project_name: str, grid_name:str, db = Depends(get_connection)):
     """Returns parameters of a concrete grid
     """
     prid = db.getProjectByName(project_name)
@@ -86,7 +87,7 @@ async def get_map_geometry(project_name: str, grid_name:str, db = Depends(get_co
 
 
 @router.get('/list_maps/{project_name}/{grid_name:path}')
-async def list_maps(project_name: str, grid_name:str, db = Depends(get_connection)):
+def list_maps(project_name: str, grid_name:str, db = Depends(get_connection)):
     """Returns list of maps (grid data) belonging to the specified grid
     """
     log.info('Listing maps on grid %s', grid_name)
@@ -97,11 +98,12 @@ async def list_maps(project_name: str, grid_name:str, db = Depends(get_connectio
     return ans
 
 @router.get('/grid_data/{project_name}/{grid_name:path}')
-async def grid_data(project_name: str, grid_name:str, 
+def grid_data(project_name: str, grid_name:str, req: Request,
                     name:str = Query(..., description="Name of the concrete map data"), 
                     db = Depends(get_connection)):
     """Returns grid data in the following format:
        <iidddddd + data(f4)
+    Response has ETag and Last-Modified headers, 304 is returned if the file was not changed.
     """
     prid = db.getProjectByName(project_name)
     mid = db.getContainerByName(prid, None, grid_name)
@@ -110,9 +112,13 @@ async def grid_data(project_name: str, grid_name:str,
     gid = db.getContainerByName(mid, 'grd2', name)
     gpath = db.getContainerSingleAttribute(gid, 'Path')
     gpath_abs = os.path.join(projRoot, gpath)
+    validators = gen_utils.file_validators(gid, gpath, gpath_abs)
+    headers = gen_utils.file_headers(validators)
+    if validators is not None and gen_utils.not_modified(req, *validators):
+        return Response(status_code=304, headers=headers)
     log.info('Getting data from file %s', gpath_abs)
     gData = grid_utils.getEncodedGridDataFromFile(gpath_abs)
     assert (gData[4] == 'lsb'), 'Wrong byte order in data, lsb expected, found %s' % gData[4]
     del gData[4]
     tmp_bin = grid_utils.encode_grid(gData)
-    return Response(content=tmp_bin, media_type='application/octet-stream')
\ No newline at end of file
+    return Response(content=tmp_bin, media_type='application/octet-stream', headers=headers)
\ No newline at end of file
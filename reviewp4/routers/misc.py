@@ -16,24 +16,30 @@ import random
 import struct
 import os
 import msgpack
+import pangea.dxheaders
 
 from ..dependencies import get_connection, extract_name_from_header
 from ..utilities.gen_utils import pack_message
 from ..utilities import random_files
+from ..db_internals import pool
+from ..db_internals.p4db import PermissionsCache, shared_permissions_cache
+from ..db_internals.p4dbqueries import queries
+from ..utilities.async_utils import loop_lag_monitor
+from ..utilities.catalog_cache import wells_catalog, well_conversions
 
 log = logging.getLogger(__name__)
 
 router = APIRouter(tags=['service'])
 
 @router.get('/ping')
-async def ping(cn=Depends(get_connection)):
+def ping(cn=Depends(get_connection)):
     user = cn.auth.user
     log.info('ping called, user: %s', user)
     # cn.set_user(user)
     return cn.getVersion() + (str(user), cn.auth.getID())
 
 @router.get('/version')
-async def version(cn = Depends(get_connection)):
+def version(cn = Depends(get_connection)):
     log.info('Version requested')
     return cn.getVersion()
 
@@ -128,6 +134,56 @@ async def fill_cache(sz:int=Query(..., ge=1, description='Size of one file'),
 async def cache_status():
     return random_files.cache_status()
 
+@router.get('/pool_status')
+async def pool_status():
+    """State of the DB connections pool: size, idle and busy connections, number of waiting clients
+    and checkout counters (times are in seconds)."""
+    return pool.stats()
+
+@router.get('/permissions_cache_status')
+async def permissions_cache_status():
+    """Hits and misses of permissions caches: totals over all requests and counters of the process-wide cache."""
+    return {'total': PermissionsCache.total_stats(), 'shared': shared_permissions_cache.stats()}
+
+@router.get('/loop_lag')
+async def loop_lag():
+    """Event loop lag (delay of wakeups, s) and load of the executor running blocking operations."""
+    return loop_lag_monitor.stats()
+
+@router.get('/dx_header_cache')
+async def dx_header_cache_status():
+    """Status of the cache of parsed DX file headers."""
+    return pangea.dxheaders.header_cache.stats()
+
+@router.get('/wells_catalog_cache')
+async def wells_catalog_cache_status(invalidate: Optional[bool] = Query(False, description='Drop all cached catalogs')):
+    """Status of the cache of project-wide catalogs of wells (lists, info, methods names)."""
+    if invalidate:
+        wells_catalog.invalidate()
+    return wells_catalog.stats()
+
+@router.get('/well_conversions_cache')
+async def well_conversions_cache_status(invalidate: Optional[bool] = Query(False, description='Drop all cached tables')):
+    """Status of the cache of tables converting MD of wells to TVD and time."""
+    if invalidate:
+        well_conversions.invalidate()
+    return well_conversions.stats()
+
+@router.get('/query_stats')
+async def query_stats(reset: Optional[bool] = Query(False, description='Reset counters after reading')):
+    """Execution counters of registered DB queries (times are in seconds), the most time consuming first."""
+    res = queries.stats()
+    if reset:
+        queries.reset()
+    return res
+
+@router.post('/refresh_catalog')
+def refresh_catalog(cn=Depends(get_connection)):
+    """Reload descriptions of container types and attributes (MetaData) shared by all connections,
+    should be called after changes in the structure of DB."""
+    log.info('Refreshing MetaData catalog, user: %s', cn.auth.user)
+    return cn.refreshCatalog()
+
 
 async def random_stream_files(nmsgs: int, delimit: bool=False):
     tot_number_output = 0
@@ -150,7 +206,7 @@ async def msgs_from_files(n: Optional[int]=Query(1, ge=1, description='Number of
     return StreamingResponse(random_stream_files(n, delimit=delimit), media_type='application/octet-stream')
 
 @router.get('/list_projects')
-async def list_projects(db = Depends(get_connection)):
+def list_projects(db = Depends(get_connection)):
         prl = db.getProjectsList()
         out = [p[1] for p in prl]
         return out
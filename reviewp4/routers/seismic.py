@@ -0,0 +1,123 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+import os
+import logging
+
+import numpy as np
+
+from ..dependencies import get_connection
+from ..utilities.seismic_utils import cubes_cache, cube_geometry, array_blocks_iter
+
+log = logging.getLogger(__name__)
+
+router = APIRouter(tags=['seismic'])
+
+projRoot = '/opt/PANGmisc/DB_ROOT/PROJECTS'
+
+FRAMED_DESCR = 'Output msgpack messages [header, first_row, n_rows, n_columns, data(f4)] instead of raw f4 data'
+DELIMIT_DESCR = 'Add delimiters between messages (b"msg1" + uint32), used with framed only'
+
+def _open_cube(db, project_name, cube_name, name):
+    "Returns reader of the cube data name belonging to the cube (3D survey) cube_name"
+    prid = db.getProjectByName(project_name)
+    cid = db.getContainerByName(prid, 'cube', cube_name)
+    did = db.getContainerByName(cid, 'cubd', name)
+    dpath_abs = os.path.join(projRoot, db.getContainerSingleAttribute(did, 'Path'))
+    log.debug('Cube data %s/%s: %s', cube_name, name, dpath_abs)
+    return cubes_cache.get(dpath_abs)
+
+def _check_index(ind, n, what):
+    if ind < 0 or ind >= n:
+        raise HTTPException(status_code=400, detail='%s index %d out of range [0, %d)' % (what, ind, n))
+
+def _slice_response(arr, header, framed, delimit):
+    "Streams 2D slice arr, its shape is output in the X-Shape header"
+    return StreamingResponse(array_blocks_iter(arr, header, delimit=delimit, framed=framed),
+                             media_type='application/octet-stream', headers={'X-Shape': '%d,%d' % arr.shape})
+
+
+@router.get('/list/{project_name}')
+def list_cubes(project_name: str, db = Depends(get_connection)):
+    """Returns list of cubes (3D surveys) defined in the project together with names of cubes data.
+    Example: {"project": "test2", "cubes": [{"name": "3D_south", "data": ["Amplitude", "Phase"]}]}
+    """
+    prid = db.getProjectByName(project_name)
+    res = []
+    for cid, cname in db.getSubContainersListByType(prid, 'cube'):
+        data = [s[2] for s in db.getSubContainersListWithCAttribute(cid, 'Path') if s[1] == 'cubd']
+        res.append({'name': cname, 'data': data})
+    return {'cubes': res, 'project': project_name}
+
+@router.get('/geometry/{project_name}/{cube_name:path}')
+def get_cube_geometry(project_name: str, cube_name: str,
+        name: str = Query(..., description='Name of the cube data'),
+        db = Depends(get_connection)):
+    """Returns geometry of the cube data as read from the DX file: origin, inline (v_i) and cross-line (v_x) vectors,
+    numbers of inlines and cross-lines (n_i, n_x) and time axis (time_origin, time_step, n_samples).
+    """
+    return cube_geometry(_open_cube(db, project_name, cube_name, name))
+
+@router.get('/inline/{project_name}/{cube_name:path}')
+def get_inline(project_name: str, cube_name: str,
+        name: str = Query(..., description='Name of the cube data'),
+        i: int = Query(..., description='Inline index, 0-based'),
+        framed: Optional[bool] = Query(False, description=FRAMED_DESCR),
+        delimit: Optional[bool] = Query(True, description=DELIMIT_DESCR),
+        db = Depends(get_connection)):
+    """Outputs inline i as array (n_x, n_samples) of f4 (little endian), traces one after another.
+    """
+    reader = _open_cube(db, project_name, cube_name, name)
+    _check_index(i, reader.dx_cube.n_i, 'Inline')
+    return _slice_response(reader.inline(i), ['inline', name, i], framed, delimit)
+
+@router.get('/xline/{project_name}/{cube_name:path}')
+def get_xline(project_name: str, cube_name: str,
+        name: str = Query(..., description='Name of the cube data'),
+        j: int = Query(..., description='Cross-line index, 0-based'),
+        framed: Optional[bool] = Query(False, description=FRAMED_DESCR),
+        delimit: Optional[bool] = Query(True, description=DELIMIT_DESCR),
+        db = Depends(get_connection)):
+    """Outputs cross-line j as array (n_i, n_samples) of f4 (little endian), traces one after another.
+    """
+    reader = _open_cube(db, project_name, cube_name, name)
+    _check_index(j, reader.dx_cube.n_x, 'Cross-line')
+    return _slice_response(reader.xline(j), ['xline', name, j], framed, delimit)
+
+@router.get('/time_slice/{project_name}/{cube_name:path}')
+def get_time_slice(project_name: str, cube_name: str,
+        name: str = Query(..., description='Name of the cube data'),
+        t: float = Query(..., description='Time of slice, the nearest sample is output'),
+        framed: Optional[bool] = Query(False, description=FRAMED_DESCR),
+        delimit: Optional[bool] = Query(True, description=DELIMIT_DESCR),
+        db = Depends(get_connection)):
+    """Outputs time slice as array (n_i, n_x) of f4 (little endian), rows correspond to inlines.
+    """
+    reader = _open_cube(db, project_name, cube_name, name)
+    try:
+        k = reader.z_axis.z_to_index(t)
+    except IndexError as ex:
+        raise HTTPException(status_code=400, detail=str(ex))
+    return _slice_response(reader.time_slice(k), ['time_slice', name, k], framed, delimit)
+
+@router.post('/traces/{project_name}/{cube_name:path}')
+def get_traces(project_name: str, cube_name: str, traces: List[List[int]],
+        name: str = Query(..., description='Name of the cube data'),
+        framed: Optional[bool] = Query(False, description=FRAMED_DESCR),
+        delimit: Optional[bool] = Query(True, description=DELIMIT_DESCR),
+        db = Depends(get_connection)):
+    """Outputs traces listed in the request body as [[inline_index, xline_index], ...] as array
+    (n_traces, n_samples) of f4 (little endian), in the order of the list.
+    """
+    reader = _open_cube(db, project_name, cube_name, name)
+    ij = np.array(traces, dtype=np.int64).reshape(-1, 2)
+    cube = reader.dx_cube
+    bad = (ij[:, 0] < 0) | (ij[:, 0] >= cube.n_i) | (ij[:, 1] < 0) | (ij[:, 1] >= cube.n_x)
+    if bad.any():
+        raise HTTPException(status_code=400, detail='Traces out of cube: %s' % ij[bad].tolist())
+    return _slice_response(reader.data[ij[:, 0], ij[:, 1]], ['traces', name], framed, delimit)
+
+@router.get('/cache_status')
+async def cache_status():
+    """Status of the cache of open cubes."""
+    return cubes_cache.stats()
@@ -1,12 +1,14 @@
-from fastapi import APIRouter, Depends, Header, Request, Response, Query
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response, Query
+from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.encoders import jsonable_encoder
 import logging
 import time
 import base64
 import tempfile
 import os
-from typing import Optional, List
+from typing import Optional, List, Tuple
 import pickle
+import numpy as np
 
 import reviewp4.utilities.well_utils as well_utils
 import reviewp4.utilities.gen_utils as gen_utils
@@ -17,8 +19,11 @@ import pangea
 
 import msgpack
 
+from .. import settings
 from ..dependencies import get_connection, extract_name_from_header
 from ..utilities.gen_utils import pack_message
+from ..utilities.async_utils import prefetch_iter
+from ..utilities.catalog_cache import wells_catalog, well_conversions
 
 log = logging.getLogger(__name__)
 
@@ -42,37 +47,44 @@ TIE_BINDING_GROUP_PREFIX = "TieBindingGroup#"  # Prefix used to name WellTie tem
 HORIZON_PREFIX = "Horizon#"
 FAULT_PREFIX = "Fault#"
 
+ORDERED_DESCR = 'Output methods in the order of request; if false, they are output as soon as read'
+
 
 @router.get('/list/{project_name}')
-async def getWells(project_name: str, req: Request, db = Depends(get_connection)):
+def getWells(project_name: str, req: Request, db = Depends(get_connection)):
     """Returns list of wells defined in the project with coordinates.
     Input:
         user - user ID (fake session ID)
         project_name
     Output:
         [(well_name, x, y, altitude), ...]
+    Response has ETag, 304 is returned if the list was not changed.
     """
     def replaceNone(a):
         if a is None:
             return MAXFLOAT
         return a
+    def compute():
+        tmp = db.getSubContainersListWithAttributesMissingAsNone(prid, 'wel1', ['coords'])
+        return [(i[1], replaceNone(i[2]), replaceNone(i[3]), replaceNone(i[4])) for i in tmp]
     log.info('Accepts %s', req.headers.get('accept'))
     prid = db.getProjectByName(project_name)
-    tmp = db.getSubContainersListWithAttributesMissingAsNone(prid, 'wel1', ['coords'])
-    ans = [(i[1], replaceNone(i[2]), replaceNone(i[3]), replaceNone(i[4])) for i in tmp]
-    if req.headers.get('accept') == 'application/octet-stream':
-        ansb = msgpack.packb(ans)
-        return Response(content=ansb, media_type='application/octet-stream')
-    return ans
+    etag, ans = wells_catalog.get(db, prid, ('list',), compute)
+    return gen_utils.etag_response(req, etag, ans, allow_msgpack=True)
 
 @router.get('/info/{project_name}')
-def getWellsInfo(project_name: str, db = Depends(get_connection)):
+def getWellsInfo(project_name: str, req: Request, db = Depends(get_connection)):
     """Returns:
     [{'name': name, 'production_startdate': '...', 'well_type': "producing, injecting, ...", 'field': string, "well_status": string}]
+    Response has ETag, 304 is returned if the info was not changed.
     """
     start_time = time.time()
     prid = db.getProjectByName(project_name)
-    wl = db.getSubContainersListByType(prid, 'wel1')
+    etag, ans = wells_catalog.get(db, prid, ('info',), lambda: _wells_info(db, prid))
+    log.info("getWellsInfo lasted (s): %s", -start_time + time.time())
+    return gen_utils.etag_response(req, etag, ans)
+
+def _wells_info(db, prid: int):
     attrs_l = [ 'production_startdate', 'well_type', 'field', 'well_status', 'pad', 'alias',
                 'deposit', 'location', 'province', 'county', 'state', 'country', 'service_company', 'company', 'unique_well_id']
     attrs_def = {'production_startdate': '1900-01-01', 'well_type': '', 'field': '', 'well_status': '', 'pad': '', 'alias': '',
@@ -92,26 +104,45 @@ def getWellsInfo(project_name: str, db = Depends(get_connection)):
         for i in range(len(attrs_l)):
             ans_dict[attrs_l[i]] = c[i + 2] or attrs_def[attrs_l[i]]
         ans.append(ans_dict)
-    log.info("getWellsInfo lasted (s): %s", -start_time + time.time())
     return ans
 
 @router.get('/list_ext/{project_name}')
-def getWellsExt(project_name: str, ztype:int, bottom_only: bool=False, db = Depends(get_connection)):
+def getWellsExt(project_name: str, ztype:int, req: Request, bottom_only: bool=False,
+        md_step: Optional[float] = Query(None, gt=0, description="Step along MD of trajectories computed from directional logs (depth only)"),
+        db = Depends(get_connection)):
     """Returns list of wells defined in the project with coordinates AND its trajectories
     Input:
         user - user ID (fake session ID)
         project_name
         ztype = 1 for depth
         bottom_only = if true (1) only bottom points are added to trajectory
+        md_step = if given (and ztype = 1), trajectories are computed from directional logs of all wells at once,
+            points are taken with the step md_step from collar down to the maximum MD of methods;
+            400 is returned if trajectories would have more than WELL_TRAJECTORY_MAX_POINTS points in total
     Output:
         [(well_name, x, y, altitude, [[x, y, zabs_or_t], ...]), ...]
+        [(well_name, x, y, altitude, [[x, y, zabs, md], ...]), ...] if md_step is given
+    Response has ETag, 304 is returned if the list was not changed.
     """
+    start_time = time.time()
+    prid = db.getProjectByName(project_name)
+    if ztype and md_step:
+        try:
+            etag, ans = wells_catalog.get(db, prid, ('list_ext_md', md_step, bottom_only),
+                                          lambda: _wells_ext_by_md(db, prid, md_step, bottom_only))
+        except ValueError as ex:
+            raise HTTPException(status_code=400, detail=str(ex))
+    else:
+        etag, ans = wells_catalog.get(db, prid, ('list_ext', bool(ztype), bottom_only),
+                                      lambda: _wells_ext(db, prid, ztype, bottom_only))
+    log.info("getWellsExt lasted (s): %s", -start_time + time.time())
+    return gen_utils.etag_response(req, etag, ans)
+
+def _wells_ext(db, prid: int, ztype: int, bottom_only: bool):
     def replaceNone(a):
         if a is None:
             return MAXFLOAT
         return a
-    start_time = time.time()
-    prid = db.getProjectByName(project_name)
     cl = db.getSubContainersListWithAttributesMissingAsNone(prid, 'wel1', ['Coords'])
     if ztype:
         a_name = 'TrajectoryD'
@@ -132,10 +163,35 @@ def getWellsExt(project_name: str, ztype:int, bottom_only: bool=False, db = Depe
                         [(replaceNone(c[2]), replaceNone(c[3]), replaceNone(c[4])), traj[-1]]))
         else:
             ans.append((c[1], replaceNone(c[2]), replaceNone(c[3]), replaceNone(c[4]), traj))
-
-    log.info("getWellsExt lasted (s): %s", -start_time + time.time())
     return ans
 
+def _wells_ext_by_md(db, prid: int, md_step: float, bottom_only: bool):
+    """Trajectories of wells sampled along MD, computed from directional logs (wells without them are vertical).
+    Raises ValueError if the total number of points exceeds WELL_TRAJECTORY_MAX_POINTS."""
+    cl = db.getSubContainersListWithAttributesMissingAsNone(prid, 'wel1', ['Coords'])
+    cl_coords = [c for c in cl if None not in c[2:5]]
+    dl_data = well_utils.readDirectionalLogs(projRoot, db, [c[0] for c in cl_coords])
+    max_mds = db.getMaxForParameterByParents(prid, ['weld', 'wbnd'], 'bottom')
+    wells_max_md = []
+    for c in cl_coords:
+        dl = dl_data.get(c[0]) or []
+        wells_max_md.append(max(max_mds.get(c[0], 0.0), dl[-1]['md'] if dl else 0.0))
+    if not bottom_only:
+        n_points = sum(max_md // md_step + 2 for max_md in wells_max_md)
+        if n_points > settings.WELL_TRAJECTORY_MAX_POINTS:
+            raise ValueError('MD step %s gives %g points of trajectories, more than %d allowed' %
+                             (md_step, n_points, settings.WELL_TRAJECTORY_MAX_POINTS))
+    md_lists = []
+    for max_md in wells_max_md:
+        if bottom_only:
+            md_lists.append(np.array([0.0, max_md]))
+        else:
+            md_lists.append(np.append(np.arange(0.0, max_md, md_step), max_md))
+    points = well_utils.convertWellsMDsByDL([c[2:5] for c in cl_coords], [dl_data.get(c[0]) or [] for c in cl_coords], md_lists)
+    traj_dict = dict([(c[0], np.column_stack((p, mds)).tolist()) for (c, p, mds) in zip(cl_coords, points, md_lists)])
+    return [(c[1], c[2] if c[2] is not None else MAXFLOAT, c[3] if c[3] is not None else MAXFLOAT,
+             c[4] if c[4] is not None else MAXFLOAT, traj_dict.get(c[0], [])) for c in cl]
+
 @router.get('/trajectory/{project_name}/{well_name: path}')
 def getWellTrajectory(project_name: str, well_name: str, ztype: int = 0, db = Depends(get_connection)):
     """Return trajectory attribute for given well
@@ -158,6 +214,7 @@ def getDirectionalLog(project_name: str, well_name: str, req: Request, db = Depe
     """ Get directional log for well.
     Return:
         The same data structure as was input to getDirectionalLog method.
+    Response has ETag and Last-Modified headers, 304 is returned if the log was not changed.
     """
     prid = db.getProjectByName(project_name)
     wid = db.getContainerByName(prid, 'wel1', well_name)
@@ -167,13 +224,18 @@ def getDirectionalLog(project_name: str, well_name: str, req: Request, db = Depe
     dirid = dirll[0][0]
     d_path = db.getContainerSingleAttribute(dirid, 'Path')
     d_abspath = os.path.join(projRoot, d_path)
+    output_packed = (req.headers.get('accept') == 'application/octet-stream')
+    validators = gen_utils.file_validators(dirid, d_path, d_abspath, output_packed)
+    headers = gen_utils.file_headers(validators)
+    if validators is not None and gen_utils.not_modified(req, *validators):
+        return Response(status_code=304, headers=headers)
     log.info("Dirlog path: %s", d_abspath)
     with open(d_abspath, 'rb') as f:
         ans = pickle.load(f)
-    if req.headers.get('accept') == 'application/octet-stream':
+    if output_packed:
         ansb = msgpack.packb(ans)
-        return Response(content=ansb, media_type='application/octet-stream')
-    return ans
+        return Response(content=ansb, media_type='application/octet-stream', headers=headers)
+    return JSONResponse(content=jsonable_encoder(ans), headers=headers)
 
 @router.get('/list_methods/{project_name}/{well_name:path}')
 def getWellMethodsList(project_name: str, well_name: str, req: Request, long:bool = True, db = Depends(get_connection)):
@@ -199,8 +261,9 @@ def getWellMethodsList(project_name: str, well_name: str, req: Request, long:boo
             tmp[d[2]] = d[3]
             las_dict[d[0]] = tmp
         ans = []
+        attrs = db.getContainersAttributes([m[0] for m in m_list])
         for m in m_list:
-            d = db.getContainerAttributes(m[0])
+            d = attrs[m[0]]
             log.debug('Methods attributes: %s', (m, d))
             dout = d
             # well_utils.updateNoUnicode(dout,d)
@@ -224,8 +287,9 @@ def getWellMethodsList(project_name: str, well_name: str, req: Request, long:boo
     # boundaries require special processing:
     m_list = db.getSubContainersListByType(wid,"wbnd") # here we get list [[id, name], ...]
     if long:
+        attrs = db.getContainersAttributes([m[0] for m in m_list])
         for m in m_list:
-            d = db.getContainerAttributes(m[0])
+            d = attrs[m[0]]
             log.debug('Methods attributes: %s', (m, d))
             dout = d
             # well_utils.updateNoUnicode(dout,d)
@@ -247,9 +311,12 @@ def getWellMethodsList(project_name: str, well_name: str, req: Request, long:boo
 
 @router.get('/method_data/{project_name}/{well_name:path}')
 def getWellMethodData(project_name: str, well_name: str, req: Request, 
-        method_name:str=Query(..., alias='mn', description="method name"), db = Depends(get_connection)):
+        method_name:str=Query(..., alias='mn', description="method name"),
+        irregular_columns: bool = Query(False, description="Output irregular curves as two columns [mds, values] instead of pairs (md, value)"),
+        db = Depends(get_connection)):
     """Outputs single well method data. The output may be in json or in msgpack format according to the
     Accept header (application/json or application/octet-stream).
+    Data read from files have ETag and Last-Modified headers, 304 is returned if the data were not changed.
     """
     start_time = time.time()
 
@@ -273,51 +340,136 @@ def getWellMethodData(project_name: str, well_name: str, req: Request,
         if output_packed:
             return Response(content=msgpack.packb(ans), media_type='application/octet-stream')
         return ans
-    ans = well_utils.readWellMethodDataFromDB(None, projRoot, db, wid, method_name, encodeb64=(not output_packed))
+    loc = well_utils.resolveWellMethods(db, prid, [(well_name, method_name)]).get((well_name, method_name))
+    validators = None
+    if loc is not None and not loc.boundaries and loc.dpath:
+        # Format and units are output with data, changing them changes the data as well
+        validators = gen_utils.file_validators(loc.mid, loc.dpath, os.path.join(projRoot, loc.dpath),
+                                               output_packed, loc.format, loc.units, irregular_columns)
+    headers = gen_utils.file_headers(validators)
+    if validators is not None and gen_utils.not_modified(req, *validators):
+        return Response(status_code=304, headers=headers)
+    if output_packed and validators is not None and loc.format in well_utils.INTERVAL_FORMATS:
+        data = well_utils.packIntervalMethodData(os.path.join(projRoot, loc.dpath), loc.format, loc.units)
+        log.debug("getWellMethodData lasted (s): %s", -start_time + time.time())
+        return Response(content=data, media_type='application/octet-stream', headers=headers)
+    # Resolved method is read from its file without querying the DB again
+    from_file = validators is not None and loc.format is not None
+    if from_file:
+        abs_path = os.path.join(projRoot, loc.dpath)
+        cf = well_utils.openCurveFile(abs_path, loc.units) if loc.format == 'curve' else None
+    else:
+        cf = well_utils.openCurveFileFromDB(projRoot, db, wid, method_name)
+    if cf is not None:
+        # Regular curves are streamed from file by chunks
+        log.debug('Streaming curve %s from %s', method_name, cf.path)
+        if output_packed:
+            return StreamingResponse(well_utils.curveMsgpackIter(cf), media_type='application/octet-stream', headers=headers)
+        return StreamingResponse(well_utils.curveJsonIter(cf), media_type='application/json', headers=headers)
+    if from_file:
+        ans = well_utils.readWellMethodDataFromFile(abs_path, loc.format, encodeb64=(not output_packed),
+                                                    method_name=method_name, irregular_columns=irregular_columns)
+        ans.append(loc.units)
+    else:
+        ans = well_utils.readWellMethodDataFromDB(None, projRoot, db, wid, method_name, encodeb64=(not output_packed),
+                                                  irregular_columns=irregular_columns)
     log.debug('getWellMethodData returns: %s', ans)
     log.debug("getWellMethodData lasted (s): %s", -start_time + time.time())
     if output_packed:
-        return Response(content=msgpack.packb(ans), media_type='application/octet-stream')
-    return ans
-
-async def methods_data_iter(db, prid: int, well_name: str, wid:int, methods: List[str], delimit: bool = False):
-    for method_name in methods:
-        log.debug('Outputting method %s', method_name)
-        data = well_utils.readWellMethodDataFromDB(None, projRoot, db, wid, method_name, encodeb64=False)
-        if data[1] == 'None':
-            log.debug('fall back to boundaries')
-            data = well_utils.readBoundariesMethodFromDb(db, wid, method_name)
-        data = pack_message([well_name, method_name, data], delimit)
-        yield data
+        return Response(content=msgpack.packb(ans), media_type='application/octet-stream', headers=headers)
+    return JSONResponse(content=jsonable_encoder(ans), headers=headers)
+
+@router.get('/method_data_tvd/{project_name}/{well_name:path}')
+def getWellMethodDataInDomain(project_name: str, well_name: str, req: Request,
+        method_name: str = Query(..., alias='mn', description="method name"),
+        domain: str = Query('tvd', regex='^(tvd|twt)$', description="tvd - absolute depth, twt - two way time"),
+        step: Optional[float] = Query(None, gt=0, description="Step of resampling along TVD or time; if missing samples are not resampled"),
+        db = Depends(get_connection)):
+    """Outputs curve (regular or irregular) of well converted from MD to TVD or to time. MDs are converted
+    by the directional log of well, TVD is converted to time by trajectories (TrajectoryD, TrajectoryT).
+    Tables of conversion are cached per well and reused by requests of all methods of the well.
+    Output (json or msgpack according to the Accept header, as method_data):
+        [[start, step, bdata], 'curve', uom] if step is given (step is negative for TVD)
+        [[bdata], 'irregular_curve', uom] otherwise, bdata are pairs (tvd_or_t, value)
+    Response has ETag and Last-Modified headers, 304 is returned if the data were not changed.
+    """
+    start_time = time.time()
+    prid = db.getProjectByName(project_name)
+    loc = well_utils.resolveWellMethods(db, prid, [(well_name, method_name)]).get((well_name, method_name))
+    if loc is None or loc.boundaries or not loc.dpath:
+        raise HTTPException(status_code=400, detail='No curve %s in well %s' % (method_name, well_name))
+    conv_etag, conv = well_conversions.get(db, prid, ('conversion', loc.wid),
+                                           lambda: well_utils.readWellConversion(projRoot, db, loc.wid))
+    output_packed = (req.headers.get('accept') == 'application/octet-stream')
+    abs_path = os.path.join(projRoot, loc.dpath)
+    validators = gen_utils.file_validators(loc.mid, loc.dpath, abs_path, output_packed, loc.format, loc.units,
+                                           domain, step, conv_etag)
+    headers = gen_utils.file_headers(validators)
+    if validators is not None and gen_utils.not_modified(req, *validators):
+        return Response(status_code=304, headers=headers)
+    try:
+        ans = well_utils.convertMethodToDomain(abs_path, loc.format, conv, domain, step, encodeb64=(not output_packed),
+                                               max_samples=settings.WELL_RESAMPLE_MAX_SAMPLES)
+    except ValueError as ex:
+        raise HTTPException(status_code=400, detail='%s (method %s in well %s)' % (ex, method_name, well_name))
+    ans.append(loc.units)
+    log.debug("getWellMethodDataInDomain lasted (s): %s", -start_time + time.time())
+    if output_packed:
+        return Response(content=msgpack.packb(ans), media_type='application/octet-stream', headers=headers)
+    return JSONResponse(content=jsonable_encoder(ans), headers=headers)
+
+def _method_message_from_db(db, prid: int, well_name: str, method_name: str, delimit: bool = False, loc=None):
+    "Reads method with DB queries: boundaries and methods which data can't be read from file"
+    if loc is not None and loc.boundaries:
+        data = well_utils.readBoundariesMethodFromDb(db, loc.wid, method_name)
+        return [pack_message([well_name, method_name, data], delimit)]
+    wid = db.getContainerByName(prid, 'wel1', well_name)
+    data = well_utils.readWellMethodDataFromDB(None, projRoot, db, wid, method_name, encodeb64=False)
+    if data[1] == 'None':
+        log.debug('fall back to boundaries')
+        data = well_utils.readBoundariesMethodFromDb(db, wid, method_name)
+    return [pack_message([well_name, method_name, data], delimit)]
+
+def well_methods_messages_iter(db, prid: int, pairs: List[Tuple[str, str]], delimit: bool = False, ordered: bool = True):
+    """Outputs messages [well_name, method_name, method_data] for (well_name, method_name) pairs.
+    Locations of all the methods are resolved in advance, files are read concurrently
+    by readers with prefetch (see prefetch_iter), regular curves are read by chunks while being output.
+    Methods that need DB access are read in this thread, as the DB connection can't be shared."""
+    locs = well_utils.resolveWellMethods(db, prid, pairs)
+    def read(p):
+        return p, well_utils.readMethodMessage(projRoot, p[0], p[1], locs.get(p), delimit)
+    for (well_name, method_name), chunks in prefetch_iter(read, pairs, ordered=ordered):
+        log.debug('Outputting method %s of %s', method_name, well_name)
+        if chunks is None:
+            chunks = _method_message_from_db(db, prid, well_name, method_name, delimit, locs.get((well_name, method_name)))
+        yield from chunks
+
+def methods_data_iter(db, prid: int, well_name: str, methods: List[str], delimit: bool = False, ordered: bool = True):
+    return well_methods_messages_iter(db, prid, [(well_name, m) for m in methods], delimit, ordered)
 
 
 @router.get('/stream_data/{project_name}/{well_name:path}')
-async def streamWellMethodsData(project_name: str, well_name: str,  req: Request, 
+def streamWellMethodsData(project_name: str, well_name: str,  req: Request, 
         mn: List[str] = Query(..., description='methods names'), 
         delimit: Optional[bool] = Query(True, description='Add delimiters between messages (b"msg1" + uint32)'),
+        ordered: Optional[bool] = Query(True, description=ORDERED_DESCR),
                         db = Depends(get_connection)) -> StreamingResponse:
     """Outputs data of multiple well methods as a stream (sequence) of msgpack messages. Every message has the following format:
     [well_name, method_name, method_data]. This makes the output compatible with stream_multiwell_data.
     """
     log.debug('Stream data params: project %s; well %s; methods %s; add delimiters: %s', project_name, well_name, mn, delimit)
     prid = db.getProjectByName(project_name)
-    wid = db.getContainerByName(prid, 'wel1', well_name)
-    return StreamingResponse(methods_data_iter(db, prid, well_name, wid, mn, delimit=delimit), media_type='application/octet-stream')
+    return StreamingResponse(methods_data_iter(db, prid, well_name, mn, delimit=delimit, ordered=ordered), media_type='application/octet-stream')
 
-async def multiwell_methods_data_iter(db, prid: int, wells_and_meth: List[models.WellMethodsList], delimit: bool=False):
-    for w in wells_and_meth:
-        wid = db.getContainerByName(prid, 'wel1', w.well)
-        for method_name in w.methods:
-            data = well_utils.readWellMethodDataFromDB(None, projRoot, db, wid, method_name, encodeb64=False)
-            if data[1] == 'None':
-                log.debug('fall back to boundaries')
-                data = well_utils.readBoundariesMethodFromDb(db, wid, method_name)
-            yield pack_message([w.well, method_name, data], delimit)
+def multiwell_methods_data_iter(db, prid: int, wells_and_meth: List[models.WellMethodsList], delimit: bool=False, ordered: bool = True):
+    pairs = [(w.well, m) for w in wells_and_meth for m in w.methods]
+    return well_methods_messages_iter(db, prid, pairs, delimit, ordered)
 
 
 @router.post('/stream_multiwell_data/{project_name}')
-async def streamWellsMethods(project_name: str, body: List[models.WellMethodsList], 
+def streamWellsMethods(project_name: str, body: List[models.WellMethodsList], 
         delimit: Optional[bool] = Query(True, description='Add delimiters between messages (b"msg1" + uint32)'),
+        ordered: Optional[bool] = Query(True, description=ORDERED_DESCR),
         db = Depends(get_connection)):
     """Outputs log methods data for multiple wells/methods. 
     The output is a sequence (streamed) of 3-element lists in the following format: [well_name, method_name, method_data],
@@ -329,7 +481,7 @@ async def streamWellsMethods(project_name: str, body: List[models.WellMethodsLis
     log.debug('Multiwell stream: %s, add delimiters: %s', project_name, delimit)
     log.debug('Request body: %s', body)
     prid = db.getProjectByName(project_name)
-    return StreamingResponse(multiwell_methods_data_iter(db, prid, body, delimit=delimit), media_type='application/octet-stream')
+    return StreamingResponse(multiwell_methods_data_iter(db, prid, body, delimit=delimit, ordered=ordered), media_type='application/octet-stream')
 
 @router.get('/method_info/{project_name}/{well_name:path}')
 def getWellMethodInfo(project_name:str, well_name: str, 
@@ -348,10 +500,9 @@ def getWellMethodInfo(project_name:str, well_name: str,
     return ans
 
 def multiwell_methods_info_iter(db, prid: int, wells_and_meth: List[models.WellMethodsList]):
-    for w in wells_and_meth:
-        wid = db.getContainerByName(prid, 'wel1', w.well)
-        for method_name in w.methods:
-            yield [w.well, method_name, well_utils.readWellMethodInfo(db, prid, w.well, wid, method_name)]
+    pairs = [(w.well, m) for w in wells_and_meth for m in w.methods]
+    for (well_name, method_name), info in zip(pairs, well_utils.readWellsMethodsInfo(db, prid, pairs)):
+        yield [well_name, method_name, info]
 
 
 @router.post('/multiwell_methods_info/{project_name}')
@@ -375,11 +526,13 @@ def getWellProfilesNamesAndInfo(project_name: str, db = Depends(get_connection))
     prid = db.getProjectByName(project_name)
     mid = gen_utils._createOrGetMetaInf(db, prid)[0]
     pl = db.getSubContainersListByType(mid, 'wprf')
+    cols = db.getAttributesColumns([s[0] for s in pl], ['thickness', 'Refs2wells', 'color'],
+                                   defaults={'thickness': 1, 'Refs2wells': [], 'color': [0, 0, 0]})
     ans = [{'name':s[1], 
-            'thickness': db.getContainerSingleAttributeWithDefault(s[0], 'thickness', 1), 
-            'number_of_wells': len(db.getContainerSingleAttributeWithDefault(s[0], 'Refs2wells', [])),
-            'color': db.getContainerSingleAttributeWithDefault(s[0], 'color', [0, 0, 0])} 
-        for s in pl]
+            'thickness': thickness, 
+            'number_of_wells': len(refs),
+            'color': color} 
+        for (s, thickness, refs, color) in zip(pl, cols['thickness'], cols['Refs2wells'], cols['color'])]
     # ans = [{'name':s[1], 
     #         'thickness': db.getContainerSingleAttributeWithDefault(s[0], 'thickness', 1), 
     #         'color': map(int, db.getContainerSingleAttributeWithDefault(s[0], 'color', [0, 0, 0])),
@@ -388,18 +541,25 @@ def getWellProfilesNamesAndInfo(project_name: str, db = Depends(get_connection))
 
 
 @router.get('/log_method_names_for_profile/{project_name}')
-async def getProjectLogMethodsNames(project_name: str, profile_name: str = Query(..., description="name of wells profile (a named set of wells)"), db = Depends(get_connection)):
+def getProjectLogMethodsNames(req: Request, project_name: str, profile_name: str = Query(..., description="name of wells profile (a named set of wells)"), db = Depends(get_connection)):
     """Return list of well methods defined in project together with additional information,
     such as method type, number of wells that contain this method.
     Return:
         List [ (method_name, format_string, number_of_containing_wells, ...), ... ]
+    Response has ETag, 304 is returned if the list was not changed.
     May rise exceptions.
     """
     start_time = time.time()
     
     log.debug("getProjectLogMethodsNames %s", (project_name, profile_name))
-    # now, select boundaries
     prid = db.getProjectByName(project_name)
+    etag, ans = wells_catalog.get(db, prid, ('log_methods_for_profile', profile_name),
+                                  lambda: _log_methods_names_for_profile(db, prid, project_name, profile_name))
+    log.debug("getProjectLogMethodsNames lasted (s): %s", -start_time + time.time())
+    return gen_utils.etag_response(req, etag, ans)
+
+def _log_methods_names_for_profile(db, prid: int, project_name: str, profile_name: str):
+    # now, select boundaries
     mid = gen_utils._createOrGetMetaInf(db, prid)[0]
     wpid = db.getContainerByName(mid, 'wprf', profile_name)
     try:
@@ -410,11 +570,10 @@ async def getProjectLogMethodsNames(project_name: str, profile_name: str = Query
     ans = [(d[0].strip(), d[1], d[2]) for d in db.countParentContainersBySubcontainerNameAndAttrConstraintByList(prid, wells_refs, 'wel1', 'weld', 'format')]
     d_bounds = dict(map(lambda p: (p[0].lower().strip(), p[1]), db.countParentContainersBySubcontainerNameConstraintByList(prid, wells_refs, 'wel1', 'wbnd')))
     ans += [(p.strip(), 'boundary_method', d_bounds.get(p.lower().strip()) or 0) for p in db.getDistinctNamesByType(project_name, 'wbnd')]
-    log.debug("getProjectLogMethodsNames lasted (s): %s", -start_time + time.time())
     return ans
 
 @router.post('/log_method_names/{project_name}')
-async def getProjectLogMethodsNamesForWells(project_name: str, wells_list: List[str], db = Depends(get_connection)):
+def getProjectLogMethodsNamesForWells(project_name: str, wells_list: List[str], db = Depends(get_connection)):
     """Return list of well methods defined in project together with additional information,
     such as method type, number of wells that contain this method. Accepts JSON list of well names, empty list corresponds to
     all wells in the project.
@@ -425,8 +584,14 @@ async def getProjectLogMethodsNamesForWells(project_name: str, wells_list: List[
     start_time = time.time()
     
     log.debug("getProjectLogMethodsNamesForWells %s", (project_name, wells_list))
-    # now, select boundaries
     prid = db.getProjectByName(project_name)
+    ans = wells_catalog.get(db, prid, ('log_methods', tuple(wells_list)),
+                            lambda: _log_methods_names_for_wells(db, prid, project_name, wells_list))[1]
+    log.debug("getProjectLogMethodsNamesForWells lasted (s): %s", -start_time + time.time())
+    return ans
+
+def _log_methods_names_for_wells(db, prid: int, project_name: str, wells_list: List[str]):
+    # now, select boundaries
     if len(wells_list) != 0:
         wells_refs = [db.getContainerByName(prid, 'wel1', wn) for wn in wells_list]
         ans = [(d[0].strip(), d[1], d[2]) for d in db.countParentContainersBySubcontainerNameAndAttrConstraintByList(prid, wells_refs, 'wel1', 'weld', 'format')]
@@ -436,5 +601,4 @@ async def getProjectLogMethodsNamesForWells(project_name: str, wells_list: List[
         ans = [(d[0].strip(), d[1], d[2]) for d in db.countParentContainersBySubcontainerNameAndAttr(prid, 'wel1', 'weld', 'format')]
         d_bounds = dict(map(lambda p: (p[0].lower().strip(), p[1]), db.countParentContainersBySubcontainerName(prid, 'wel1', 'wbnd')))
         ans += [(p.strip(), 'boundary_method', d_bounds.get(p.lower().strip()) or 0) for p in db.getDistinctNamesByType(project_name, 'wbnd')]
-    log.debug("getProjectLogMethodsNamesForWells lasted (s): %s", -start_time + time.time())
     return ans
@@ -13,6 +13,46 @@ DB_USER = conf["DB_USER"]
 DB_PASSWORD = conf["DB_PASSWORD"]
 DB_DATABASE = conf["DB_DATABASE"]
 DB_POOL_SZ = conf.getint("DB_POOL_SZ", 4)
+DB_POOL_MAX_SZ = conf.getint("DB_POOL_MAX_SZ", 4*DB_POOL_SZ)
+DB_POOL_TIMEOUT = conf.getfloat("DB_POOL_TIMEOUT", 30.0)
+DB_CONN_MAX_AGE = conf.getfloat("DB_CONN_MAX_AGE", 3600.0)
+DB_CONN_MAX_IDLE = conf.getfloat("DB_CONN_MAX_IDLE", 300.0)
+# Threads executing blocking operations (DB queries, files reading)
+DB_EXECUTOR_SZ = conf.getint("DB_EXECUTOR_SZ", DB_POOL_MAX_SZ)
+# Threads reading files of streamed well methods, number of methods read in advance
+FILE_READERS_SZ = conf.getint("FILE_READERS_SZ", 8)
+STREAM_PREFETCH = conf.getint("STREAM_PREFETCH", 16)
+DB_CATALOG_TTL = conf.getfloat("DB_CATALOG_TTL", 600.0)
+DB_PERMISSIONS_CACHE_TTL = conf.getfloat("DB_PERMISSIONS_CACHE_TTL", 5.0)
+DB_PERMISSIONS_CACHE_SHARED = conf.getboolean("DB_PERMISSIONS_CACHE_SHARED", False)
+# Auto-increment key column of the ChangeLog table
+DB_CHANGELOG_KEY = conf.get("DB_CHANGELOG_KEY", "CodeLog")
+
+# Seismic cubes: number of open cubes kept in cache, rows of slice sent per block
+SEISMIC_CUBES_CACHE_SZ = conf.getint('SEISMIC_CUBES_CACHE_SZ', 16)
+SEISMIC_BLOCK_ROWS = conf.getint('SEISMIC_BLOCK_ROWS', 64)
+
+# Parsed headers of DX files: number of headers cached in memory, directory for sidecar files (empty - not used)
+DX_HEADER_CACHE_SZ = conf.getint('DX_HEADER_CACHE_SZ', 1024)
+DX_HEADER_SIDECAR_DIR = conf.get('DX_HEADER_SIDECAR_DIR', '') or None
+
+# Catalogs of wells: min interval (s) of ChangeLog polling, max age (s) of cached catalog, max catalogs per project
+WELL_CATALOG_POLL_INTERVAL = conf.getfloat('WELL_CATALOG_POLL_INTERVAL', 2.0)
+WELL_CATALOG_TTL = conf.getfloat('WELL_CATALOG_TTL', 300.0)
+WELL_CATALOG_MAX_ENTRIES = conf.getint('WELL_CATALOG_MAX_ENTRIES', 256)
+# Number of ChangeLog keys below the last one seen re-read on every poll (records committed out of key order)
+WELL_CATALOG_CHANGELOG_OVERLAP = conf.getint('WELL_CATALOG_CHANGELOG_OVERLAP', 1000)
+# Max number of MD conversion tables of wells (directional logs, time-depth) cached per project
+WELL_CONVERSION_MAX_ENTRIES = conf.getint('WELL_CONVERSION_MAX_ENTRIES', 1024)
+# Max number of samples of curve resampled along TVD or time (method_data_tvd), 400 is returned if exceeded
+WELL_RESAMPLE_MAX_SAMPLES = conf.getint('WELL_RESAMPLE_MAX_SAMPLES', 1000000)
+# Max total number of points of trajectories of wells sampled along MD (list_ext with md_step), 400 is returned if exceeded
+WELL_TRAJECTORY_MAX_POINTS = conf.getint('WELL_TRAJECTORY_MAX_POINTS', 1000000)
+
+# Cache-Control of responses with file-backed data (grids, well methods, directional logs) and catalogs of wells,
+# responses have ETag (and Last-Modified) headers anyway. Empty - header is not sent
+CACHE_CONTROL_FILES = conf.get('CACHE_CONTROL_FILES', 'private, no-cache')
+CACHE_CONTROL_CATALOGS = conf.get('CACHE_CONTROL_CATALOGS', 'private, no-cache')
 
 ENABLE_GZIP = conf.getboolean('ENABLE_GZIP', False)
 GZIP_MINIMUM_SIZE = conf.getint('GZIP_MINIMUM_SIZE', 1000)
@@ -20,3 +60,6 @@ GZIP_MINIMUM_SIZE = conf.getint('GZIP_MINIMUM_SIZE', 1000)
 TEMP = conf.get('TEMP', '/opt/PANGmisc/DB_ROOT/TMP/')
 
 LOG_LEVEL = conf.getint('LOG_LEVEL', logging.INFO)
+
+# Interval (s) of event loop lag measurements
+LOOP_LAG_INTERVAL = conf.getfloat('LOOP_LAG_INTERVAL', 0.5)
@@ -0,0 +1,99 @@
+# Utilities to keep the event loop responsive
+
+import asyncio
+import collections
+import concurrent.futures
+import functools
+import logging
+
+from .. import settings
+
+log = logging.getLogger(__name__)
+
+# Executor for the blocking work (DB queries, file reading). It is installed as the default executor of
+# the event loop on startup, so the synchronous (def) routes and dependencies are run there as well.
+executor = concurrent.futures.ThreadPoolExecutor(max_workers=settings.DB_EXECUTOR_SZ, thread_name_prefix='blocking')
+
+# Executor for concurrent reading of files while a response is streamed (see prefetch_iter).
+# It is separate from the executor above, whose threads run the streaming generators themselves.
+readers_executor = concurrent.futures.ThreadPoolExecutor(max_workers=settings.FILE_READERS_SZ, thread_name_prefix='reader')
+
+async def run_blocking(func, *args, **kwargs):
+    "Runs func(*args, **kwargs) in the executor and waits for result without blocking the event loop"
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+
+def prefetch_iter(func, items, depth=None, ordered=True, executor=None):
+    """Yields func(item) for every item of items computing up to depth results in advance in executor
+    (readers_executor by default). Results are yielded in the order of items, or as soon as they
+    are ready if ordered is False. Computations not started yet are cancelled if the iteration
+    is stopped (e.g. client disconnected)."""
+    depth = depth or settings.STREAM_PREFETCH
+    executor = executor or readers_executor
+    items = iter(items)
+    pending = collections.deque()
+    try:
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) < depth:
+                continue
+            if ordered:
+                yield pending.popleft().result()
+            else:
+                done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for f in done:
+                    pending.remove(f)
+                    yield f.result()
+        if ordered:
+            while pending:
+                yield pending.popleft().result()
+        else:
+            for f in concurrent.futures.as_completed(list(pending)):
+                pending.remove(f)
+                yield f.result()
+    finally:
+        for f in pending:
+            f.cancel()
+
+
+class LoopLagMonitor:
+    """Measures event loop lag: the delay of wakeup of a coroutine sleeping for interval seconds.
+    Big lag means that something blocks the event loop."""
+    def __init__(self, interval):
+        self.interval = interval
+        self.last = 0.0
+        self.max = 0.0
+        self.total = 0.0
+        self.n = 0
+        self.task = None
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            t_start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - t_start - self.interval)
+            self.last = lag
+            self.max = max(self.max, lag)
+            self.total += lag
+            self.n += 1
+            if lag > 10 * self.interval:
+                log.warning('Event loop was blocked for %s s', lag)
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.ensure_future(self.run())
+
+    def stats(self):
+        return {'interval': self.interval, 'last': self.last, 'max': self.max,
+                'avg': self.total / self.n if self.n else 0.0, 'samples': self.n,
+                'executor_size': executor._max_workers, 'executor_queue': executor._work_queue.qsize()}
+
+loop_lag_monitor = LoopLagMonitor(settings.LOOP_LAG_INTERVAL)
+
+def install(loop):
+    "Sets the executor as default one for loop and starts lag monitoring, called on application startup"
+    loop.set_default_executor(executor)
+    loop_lag_monitor.start()
+    log.info('Executor for blocking operations: %d threads', settings.DB_EXECUTOR_SZ)
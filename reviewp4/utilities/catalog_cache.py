@@ -0,0 +1,136 @@
+# In-process cache of project-wide catalogs (lists of wells, methods etc.) invalidated by ChangeLog
+
+import hashlib
+import logging
+import threading
+import time
+
+import msgpack
+
+from .. import settings
+
+log = logging.getLogger(__name__)
+
+# Types of containers changes of which invalidate catalog of wells
+WELL_CATALOG_TYPES = ('wel1', 'weld', 'wbnd', 'wmif', 'wprf', 'meta', 'dirl')
+
+
+def make_etag(value):
+    "Returns weak entity tag computed from the content of value (the same for JSON and msgpack representations)"
+    return 'W/"%s"' % hashlib.sha1(msgpack.packb(value, default=str)).hexdigest()
+
+
+class ProjectCatalogCache:
+    """Cache of values computed from the DB per project, shared between requests.
+    Every value is stored with its ETag. Freshness is maintained by polling ChangeLog
+    not more often than every poll_interval seconds: values of projects in which containers of
+    types c_types (or their attributes) were changed are dropped, values of other projects are kept.
+    Values older than ttl seconds are recomputed anyway (in case some changes are not logged).
+    Records with keys lower than the last one seen may be committed later, so overlap keys below the last one
+    are read again on every poll, records of this window already processed are skipped.
+    Values are not cached while ChangeLog can't be read, reading is retried on the next poll."""
+    def __init__(self, c_types, poll_interval=2.0, ttl=300.0, max_entries=256, overlap=1000):
+        self.c_types = set(c_types)
+        self.poll_interval = poll_interval
+        self.ttl = ttl
+        self.max_entries = max_entries       # per project
+        self.overlap = overlap
+        self._entries = {}                   # projectID -> {key: (etag, value, created)}
+        self._generations = {}               # projectID -> number of invalidations
+        self._epoch = 0                      # number of invalidations of all projects
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock()
+        self._last_key = None                # key of the last ChangeLog record seen
+        self._seen = set()                   # keys of records processed within the overlap window
+        self._failed = False                 # reading of ChangeLog failed on the last poll
+        self._polled = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def refresh(self, db):
+        "Reads new records of ChangeLog and drops values of changed projects"
+        if time.time() - self._polled < self.poll_interval:
+            return
+        with self._poll_lock:
+            if time.time() - self._polled < self.poll_interval:
+                return  # polled by other thread while we were waiting
+            try:
+                if self._last_key is None:
+                    self._last_key = db.getChangeLogPosition()
+                    self._seen = set()
+                    self.invalidate()
+                else:
+                    (last_key, changed, complete, keys) = db.getChangedContainersTypes(
+                        max(self._last_key - self.overlap, 0), exclude=self._seen)
+                    last_key = max(last_key, self._last_key)
+                    if not complete:
+                        log.info('Too many changes in ChangeLog after %s, dropping all catalogs', self._last_key)
+                        last_key = db.getChangeLogPosition()
+                        self._seen = set()
+                        self.invalidate()
+                    else:
+                        for prid in set(p for (p, c_type) in changed if c_type in self.c_types):
+                            self.invalidate(prid)
+                        self._seen = set(k for k in self._seen.union(keys) if k > last_key - self.overlap)
+                    self._last_key = last_key
+                if self._failed:
+                    log.info('ChangeLog is read again, catalogs are cached')
+                    self._failed = False
+            except Exception as ex:
+                if not self._failed:
+                    log.error('Cannot read ChangeLog, catalogs are not cached: %s', ex)
+                    self._failed = True
+                else:
+                    log.debug('Cannot read ChangeLog: %s', ex)
+                self._last_key = None
+                self.invalidate()
+            self._polled = time.time()
+
+    def get(self, db, prid, key, compute):
+        """Returns tuple (etag, value) of the value identified by key in the project prid,
+        compute() is called to get the value if it is not cached."""
+        self.refresh(db)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(prid, {}).get(key)
+            if entry is not None and now - entry[2] < self.ttl:
+                self.hits += 1
+                return entry[:2]
+            self.misses += 1
+            generation = (self._epoch, self._generations.get(prid, 0))
+        value = compute()
+        etag = make_etag(value)
+        with self._lock:
+            # Value computed while the project was being invalidated may be outdated already
+            if self._last_key is not None and (self._epoch, self._generations.get(prid, 0)) == generation:
+                entries = self._entries.setdefault(prid, {})
+                entries.pop(key, None)
+                entries[key] = (etag, value, now)
+                while len(entries) > self.max_entries:
+                    entries.pop(next(iter(entries)))
+        return (etag, value)
+
+    def invalidate(self, prid=None):
+        with self._lock:
+            self.invalidations += 1
+            if prid is None:
+                self._epoch += 1
+                self._entries.clear()
+            else:
+                self._generations[prid] = self._generations.get(prid, 0) + 1
+                self._entries.pop(prid, None)
+
+    def stats(self):
+        with self._lock:
+            return {'enabled': self._last_key is not None, 'projects': len(self._entries),
+                    'entries': sum(len(e) for e in self._entries.values()), 'hits': self.hits, 'misses': self.misses,
+                    'invalidations': self.invalidations, 'changelog_key': self._last_key, 'polled': self._polled}
+
+wells_catalog = ProjectCatalogCache(WELL_CATALOG_TYPES, poll_interval=settings.WELL_CATALOG_POLL_INTERVAL,
+                                    ttl=settings.WELL_CATALOG_TTL, max_entries=settings.WELL_CATALOG_MAX_ENTRIES,
+                                    overlap=settings.WELL_CATALOG_CHANGELOG_OVERLAP)
+# Tables converting MD of wells to TVD and time, per well
+well_conversions = ProjectCatalogCache(WELL_CATALOG_TYPES, poll_interval=settings.WELL_CATALOG_POLL_INTERVAL,
+                                       ttl=settings.WELL_CATALOG_TTL, max_entries=settings.WELL_CONVERSION_MAX_ENTRIES,
+                                       overlap=settings.WELL_CATALOG_CHANGELOG_OVERLAP)
@@ -5,6 +5,12 @@ import logging
 import msgpack
 import struct
 import os
+import hashlib
+from email.utils import formatdate, parsedate_to_datetime
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from fastapi.encoders import jsonable_encoder
+from .. import settings
 
 MSG_MAGIC = b'msg1'
 
@@ -57,7 +63,71 @@ def _createOrGetMetaInf(db, prid):
 def pack_message(obj, add_header: bool = False):
     """Pack message with msgpack and add header for streaming purposes.
     """
-    res = msgpack.packb(obj)
+    return frame_message(msgpack.packb(obj), add_header)
+
+def frame_message(res: bytes, add_header: bool = False):
+    "Adds header for streaming purposes to message already packed with msgpack"
     if add_header:
         res = MSG_MAGIC + struct.pack('<i', len(res)) + res
     return res
+
+
+def etag_matches(req: Request, etag: str) -> bool:
+    "Checks if If-None-Match header of request contains etag (weak comparison)"
+    inm = req.headers.get('if-none-match')
+    if not inm:
+        return False
+    if inm.strip() == '*':
+        return True
+    weak = lambda t: t[2:] if t.startswith('W/') else t
+    return weak(etag) in [weak(t.strip()) for t in inm.split(',')]
+
+def not_modified(req: Request, etag: str, mtime: float = None) -> bool:
+    """Checks conditional headers of request: If-None-Match if present, If-Modified-Since otherwise
+    (if mtime of data is known)"""
+    if req.headers.get('if-none-match'):
+        return etag_matches(req, etag)
+    ims = req.headers.get('if-modified-since')
+    if ims and mtime is not None:
+        try:
+            return int(mtime) <= parsedate_to_datetime(ims).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def validator_headers(etag: str, mtime: float = None, cache_control: str = None):
+    "Returns dictionary of headers ETag, Last-Modified (if mtime is known) and Cache-Control (if set)"
+    headers = {'ETag': etag, 'Vary': 'Accept'}
+    if mtime is not None:
+        headers['Last-Modified'] = formatdate(mtime, usegmt=True)
+    if cache_control:
+        headers['Cache-Control'] = cache_control
+    return headers
+
+def file_validators(cid: int, rel_path: str, abs_path: str, *variant):
+    """Returns tuple (etag, mtime) of data of container cid stored in file: ETag is computed from the container ID,
+    path of file relative to projects root, mtime and size of file and variant (parameters of representation).
+    Returns None if the file is not accessible."""
+    try:
+        st = os.stat(abs_path)
+    except OSError:
+        return None
+    key = repr((cid, rel_path, st.st_mtime_ns, st.st_size) + variant)
+    return ('W/"%s"' % hashlib.sha1(key.encode()).hexdigest(), st.st_mtime)
+
+def file_headers(validators):
+    "Returns headers of response with file-backed data given validators returned by file_validators (may be None)"
+    if validators is None:
+        return {}
+    return validator_headers(validators[0], validators[1], settings.CACHE_CONTROL_FILES)
+
+def etag_response(req: Request, etag: str, ans, allow_msgpack: bool = False):
+    """Returns response with ETag header: 304 Not Modified if client already has the same value,
+    ans packed with msgpack if allow_msgpack is True and client accepts application/octet-stream,
+    JSON otherwise."""
+    headers = validator_headers(etag, cache_control=settings.CACHE_CONTROL_CATALOGS)
+    if not_modified(req, etag):
+        return Response(status_code=304, headers=headers)
+    if allow_msgpack and req.headers.get('accept') == 'application/octet-stream':
+        return Response(content=msgpack.packb(ans), media_type='application/octet-stream', headers=headers)
+    return JSONResponse(content=jsonable_encoder(ans), headers=headers)
@@ -8,6 +8,7 @@ __version__ = "$Revision: 8224 $"[11:-2]  # code version
 import struct
 import codecs
 import pangea.dxextractobj
+import pangea.dxheaders
 import pangea.misc_util
 import os
 import pickle
@@ -22,8 +23,7 @@ def getEncodedGridDataFromFile(filepath):
     [[number of points], [origin], [vect2d 1], [vect2d 2], representation_of_data, encoded_data]
     where representation_of_data may by msb or lsb.
     """
-    dx = pangea.dxextractobj.DXParser()
-    dx.parse(filepath)
+    dx = pangea.dxheaders.parse_header(filepath)
     ol = dx.obj_list
     datastart = dx.datastart
     assert (ol[0].get_class() == 'gridpositions'), 'Illegal DX Object class in grid[0] - must be gridpositions'
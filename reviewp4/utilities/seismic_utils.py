@@ -0,0 +1,86 @@
+# Utilities to access seismic cubes stored in DX files
+
+import collections
+import logging
+import os
+import threading
+
+import numpy as np
+import pangea.trace_data
+
+from .. import settings
+from .gen_utils import pack_message
+
+log = logging.getLogger(__name__)
+
+
+class CubeHandlesCache:
+    """LRU cache of open (memory-mapped) cubes shared between requests, so that repeated reading
+    of slices does not parse DX header again. Cube is reopened if the file was modified
+    (its mtime or size changed). Handles evicted from cache are just forgotten: views of
+    their data being sent keep the mapping alive until they are garbage collected."""
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._cubes = collections.OrderedDict()  # path -> ((mtime, size), reader)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path) -> pangea.trace_data.SeisCubeReader:
+        st = os.stat(path)
+        sig = (st.st_mtime, st.st_size)
+        with self._lock:
+            entry = self._cubes.get(path)
+            if entry is not None and entry[0] == sig:
+                self._cubes.move_to_end(path)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        log.debug('Opening cube %s', path)
+        reader = pangea.trace_data.SeisCubeReader(path, use_mmap=True)
+        # Data are read through the mapping only, file object is not needed
+        reader.dx_cube.file.close()
+        reader.dx_cube.file = None
+        with self._lock:
+            self._cubes[path] = (sig, reader)
+            self._cubes.move_to_end(path)
+            while len(self._cubes) > self.max_size:
+                self._cubes.popitem(last=False)
+        return reader
+
+    def invalidate(self, path=None):
+        with self._lock:
+            if path is None:
+                self._cubes.clear()
+            else:
+                self._cubes.pop(path, None)
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._cubes), 'max_size': self.max_size, 'hits': self.hits, 'misses': self.misses,
+                    'cubes': list(self._cubes.keys())}
+
+cubes_cache = CubeHandlesCache(settings.SEISMIC_CUBES_CACHE_SZ)
+
+
+def cube_geometry(reader):
+    "Returns dictionary describing geometry and time axis of the cube"
+    origin, v_i, v_x, n_i, n_x = reader.geometry
+    z = reader.z_axis
+    return {'origin': list(origin[:2]), 'v_i': list(v_i), 'v_x': list(v_x), 'n_i': n_i, 'n_x': n_x,
+            'time_origin': z.origin, 'time_step': z.step, 'n_samples': z.n_points}
+
+
+def array_blocks_iter(arr, header, rows_per_block=None, delimit=False, framed=False):
+    """Outputs 2D array arr (which may be a strided view of mapped data) row blocks as bytes of '<f4',
+    rows_per_block rows at a time, so that the whole slice is never copied at once.
+    If framed is True every block is packed as msgpack message
+    [header, first_row, n_rows, n_columns, data_bytes] (see pack_message)."""
+    rows_per_block = rows_per_block or settings.SEISMIC_BLOCK_ROWS
+    n_rows, n_cols = arr.shape
+    for r in range(0, n_rows, rows_per_block):
+        block = np.ascontiguousarray(arr[r:r+rows_per_block], dtype='<f4')
+        if framed:
+            yield pack_message([header, r, block.shape[0], n_cols, block.tobytes()], delimit)
+        else:
+            yield block.tobytes()
@@ -10,6 +10,11 @@ __version__ = "$Revision: 10633 $"[11:-2]  # code revision
 import struct
 import codecs
 import pangea.dxextractobj
+import pangea.dxheaders
+import pangea.wellintervals
+import pangea.wellstats
+import pangea.welltraj
+from pangea.wellcurves import readIrregularCurveColumns, readIrregularCurveData  # re-exported
 import pangea.misc_util
 import os
 import pickle
@@ -27,10 +32,15 @@ from xmlrpc.client import Binary
 from xmlrpc.client import DateTime
 
 import base64
+import json
 import logging
+from collections import namedtuple
+
+import msgpack
+import numpy as np
 
 from reviewp4.db_internals.p4dbexceptions import DBException, DBNotFoundException
-from reviewp4.utilities.gen_utils import _createOrGetGeologicalObjects
+from reviewp4.utilities.gen_utils import _createOrGetGeologicalObjects, MSG_MAGIC, pack_message, frame_message
 
 log = logging.getLogger(__name__)
 
@@ -66,7 +76,7 @@ end
     bdata = data[0][2]
     start = data[0][0]
     step = data[0][1]
-    n_points = len(bdata.data) / 4
+    n_points = len(bdata.data) // 4
     header = header_tmpl % (n_points, start, step, n_points, n_points, codecs.encode(name, 'utf8'))
     f.write(header)
     f.write(bdata.data)
@@ -97,16 +107,13 @@ attribute "name" string "%s"
 end
 """
     bdata = data[0][0]
-    n_points = len(bdata.data) / 8
+    n_points = len(bdata.data) // 8
     data_start = n_points * 4
     header = header_tmpl % (n_points, n_points-1, n_points, data_start, codecs.encode(name, 'utf8'))
     f.write(header)
-    for i in range(n_points):
-        j = i * 8
-        f.write(bdata.data[j:j+4])
-    for i in range(n_points):
-        j = i * 8
-        f.write(bdata.data[j+4:j+8])
+    # pairs (md, value) are written as column of mds followed by column of values
+    pairs = np.frombuffer(bdata.data, pangea.wellstats.CURVE_DTYPE, 2 * n_points).reshape(n_points, 2)
+    f.write(pairs.T.tobytes())
     f.close()
     
 
@@ -115,34 +122,16 @@ def findCurveDataMinMax(data):
     Return: tuple (min, max)
     """
     assert (data[1] == 'curve'), 'Illegal data type %s when calling findCurveDataMinMax' % data[1]
-    bdata = data[0][2].data
-    n_points = len(bdata) / 4
-    d = struct.unpack('<%df' % n_points, bdata)
-    d = [x for x in d if x < MAXFLOAT09]
-    if len(d):
-        max_v = max(d)
-        min_v = min(d)
-    else:
-        max_v = MAXFLOAT
-        min_v = MAXFLOAT
-    return (min_v, max_v)
+    stats = methodDataStats(data)
+    return (stats['min'], stats['max'])
 
 def findIrregularCurveDataMinMax(data):
     """Find minimum and maximum values of data.
     Return: tuple (min, max)
     """
     assert (data[1] == 'irregular_curve'), 'Illegal data type %s when calling findIrregularCurveDataMinMax' % data[1]
-    bdata = data[0][0].data
-    n_points = len(bdata) / 4
-    d = struct.unpack('<%df' % n_points, bdata)
-    d1 = [d[i] for i in range(1, n_points, 2) if d[i] < MAXFLOAT09]
-    if d1:
-        max_v = max(d1)
-        min_v = min(d1)
-    else:
-        max_v = MAXFLOAT
-        min_v = MAXFLOAT
-    return (min_v, max_v)
+    stats = methodDataStats(data)
+    return (stats['min'], stats['max'])
 
 def findCurveTopBott(data):
     """Find top and bottom for curve data.
@@ -151,7 +140,7 @@ def findCurveTopBott(data):
     assert (data[1] == 'curve'), 'Illegal data type %s when calling findCurveTopBott' % data[1]
     top = data[0][0]
     bdata = data[0][2].data
-    n_points = len(bdata) / 4
+    n_points = len(bdata) // 4
     bottom = data[0][0] + data[0][1]*n_points
     return [top, bottom]
 
@@ -161,7 +150,7 @@ def findIrregularCurveTopBott(data):
     """
     assert (data[1] == 'irregular_curve'), 'Illegal data type %s when calling findIrregularCurveTopBott' % data[1]
     bdata = data[0][0].data
-    n_points = len(bdata) / 8
+    n_points = len(bdata) // 8
     top = struct.unpack('<f', bdata[:4])[0]
     bottom = struct.unpack('<f', bdata[(n_points-1)*8:(n_points-1)*8+4])[0]
     return [top, bottom]
@@ -209,20 +198,49 @@ def findLayersDataMinMax(data):
     Return list of two elements: [min, max]
     """
     assert (data[1] in ['measurement', "layer_model"]), 'Illegal data type %s when calling findLayersDataMinMax' % data[1]
-    if data[0]:
-        amax = max([p[2] for p in data[0]])
-        amin = min([p[2] for p in data[0]])
-    else:
-        amax = MAXFLOAT
-        amin = MAXFLOAT
-    return [amin, amax]
+    stats = methodDataStats(data)
+    return [stats.get('min', MAXFLOAT), stats.get('max', MAXFLOAT)]
+
+# Statistics of methods data stored as attributes of methods, in addition to top, bottom, min and max
+# (attributes missing in the catalog of DB are skipped)
+EXTRA_STATS_ATTRIBUTES = ['count', 'mean'] + pangea.wellstats.percentile_names()
+
+def methodDataStats(data):
+    """Returns statistics of method data (as passed to storeMethodData2Db) computed with pangea.wellstats:
+    top, bottom and count for all formats, min, max, mean and percentiles for methods with numeric values
+    (curves, irregular curves, interval methods with numbers in the 3rd column).
+    Returns empty dictionary for other formats (arrays, seismic segments)."""
+    format = data[1]
+    if format == 'curve':
+        return pangea.wellstats.curve_stats(data[0][2].data, data[0][0], data[0][1])
+    if format in ['irregular_curve', 'reflection_coefficients']:
+        return pangea.wellstats.irregular_curve_stats(data[0][0].data)
+    if format != 'boundary_method' and format not in INTERVAL_FORMATS:
+        return {}
+    rows = data[0]
+    if format == 'boundary_method':
+        mds = [p[0] for p in rows]
+        return pangea.wellstats.intervals_stats(mds, mds)
+    values = None
+    if rows and all(len(p) > 2 and isinstance(p[2], (int, float)) and not isinstance(p[2], bool) for p in rows):
+        values = [p[2] for p in rows]
+    return pangea.wellstats.intervals_stats([p[0] for p in rows], [p[1] for p in rows], values)
+
+def storeMethodStats(db, mid, stats):
+    "Stores statistics of method data (see methodDataStats) as attributes of method mid"
+    for a_name in EXTRA_STATS_ATTRIBUTES:
+        if a_name not in stats:
+            continue
+        try:
+            db.setContainerSingleAttribute(mid, a_name, stats[a_name])
+        except (KeyError, DBException) as ex:
+            log.debug('Statistics %s of method %d is not stored: %s', a_name, mid, ex)
 
 def readCurveData(filepath):
     """Read data of well log curve (regular curve).
     Return: [start, step, bdata]
     """
-    dx = pangea.dxextractobj.DXParser()
-    dx.parse(filepath)
+    dx = pangea.dxheaders.parse_header(filepath)
     ol = dx.obj_list
     datastart = dx.datastart
     assert (ol[0].get_class() == 'gridpositions'), 'Illegal DX Object class in well curve[0] - must be gridpositions'
@@ -234,37 +252,13 @@ def readCurveData(filepath):
         f.close()
         return [start, step, bdata]
 
-def readIrregularCurveData(filepath):
-    """Read data of well log curve (regular curve).
-    Return: [bdata]
-    """
-    dx = pangea.dxextractobj.DXParser()
-    dx.parse(filepath)
-    ol = dx.obj_list
-    datastart = dx.datastart
-    assert (ol[0].get_class() == 'array'), 'Illegal DX Object class in well curve[0] - must be array'
-    assert (ol[0].get_data_repr() == 'lsb'), 'Illegal DX Object representation: must be lsb'
-    assert (ol[2].get_data_repr() == 'lsb'), 'Illegal DX Object representation: must be lsb'
-    with open(filepath, 'rb') as f:
-        f.seek(datastart + ol[0].get_data_addr())
-        bdata1 = f.read(ol[0].get_data_length())
-        f.seek(datastart + ol[2].get_data_addr())
-        bdata2 = f.read(ol[2].get_data_length())
-        f.close()
-        bdata = bytearray()
-        for i in range(ol[0].get_items_no()):
-            bdata.extend(bdata1[i*4:i*4+4])
-            bdata.extend(bdata2[i*4:i*4+4])
-        return  [bdata]
-
 def readSeismicSegmentData(filepath):
     """
     Read sismic segment data from the DX file designated by filepath
     :param filepath:
     :return: seismic_segment data object corresponding to the input format of writeSeismicSegmentData
     """
-    dx = pangea.dxextractobj.DXParser()
-    dx.parse(filepath)
+    dx = pangea.dxheaders.parse_header(filepath)
     ol = dx.obj_list
     datastart = dx.datastart
     assert (ol[0].get_class() == 'array'), 'Illegal DX Object class in seismic segment[0] - must be array'
@@ -283,8 +277,7 @@ def readArrayData(filepath):
     """Read data of well log curve (regular curve).
     Return: [start, step, dim, start2, step2, bdata]
     """
-    dx = pangea.dxextractobj.DXParser()
-    dx.parse(filepath)
+    dx = pangea.dxheaders.parse_header(filepath)
     ol = dx.obj_list
     datastart = dx.datastart
     assert (ol[0].get_class() == 'gridpositions'), 'Illegal DX Object class in well curve[0] - must be gridpositions'
@@ -302,8 +295,7 @@ def readCurveStartStep(filepath):
     of previously saved curve.
     Return: list [start, step, number-of-points]
     """
-    dx = pangea.dxextractobj.DXParser()
-    dx.parse(filepath)
+    dx = pangea.dxheaders.parse_header(filepath)
     ol = dx.obj_list
     datastart = dx.datastart
     assert (ol[0].get_class() == 'gridpositions'), 'Illegal DX Object class in well curve[0] - must be gridpositions'
@@ -434,12 +426,13 @@ def makeUniqueNames(names_in, names_full, suff):
 
 def storeMethodData2Db(serv_instance, db,  well_name, w_path, method_name, mid, w_abspath, data, uid):
     assert ( not(data[1] in ["boundary_method"]) ), "This method is supported elsewere (e.g. storeBoundariesData2Db)"
+    stats = methodDataStats(data)
     if data[1] == 'curve':
         fname = well_name + '_D_' + method_name + '_qn.dx'
         (f, fname) = serv_instance._openUniqFileName(fname, w_abspath, uid)
         writeCurveData2File(f, data, method_name)
-        min_v, max_v = findCurveDataMinMax(data)
-        top, bottom = findCurveTopBott(data)
+        min_v, max_v = stats['min'], stats['max']
+        top, bottom = stats['top'], stats['bottom']
         db.setContainerSingleAttribute(mid, 'min', min_v)
         db.setContainerSingleAttribute(mid, 'max', max_v)
         db.setContainerSingleAttribute(mid, 'top', top)
@@ -450,8 +443,8 @@ def storeMethodData2Db(serv_instance, db,  well_name, w_path, method_name, mid,
         fname = well_name + '_D_' + method_name + '_qn.dx'
         (f, fname) = serv_instance._openUniqFileName(fname, w_abspath, uid)
         writeIrregularCurveData2File(f, data, method_name)
-        min_v, max_v = findIrregularCurveDataMinMax(data)
-        top, bottom = findIrregularCurveTopBott(data)
+        min_v, max_v = stats['min'], stats['max']
+        top, bottom = stats['top'], stats['bottom']
         db.setContainerSingleAttribute(mid, 'min', min_v)
         db.setContainerSingleAttribute(mid, 'max', max_v)
         db.setContainerSingleAttribute(mid, 'top', top)
@@ -469,53 +462,53 @@ def storeMethodData2Db(serv_instance, db,  well_name, w_path, method_name, mid,
         db.setContainerSingleAttribute(mid, 'bottom', bottom)
         db.setContainerSingleAttribute(mid, 'Type', 'BOUNDARIES')
     elif data[1] == "layers_method":
-        fname = well_name + '_D_' + method_name + '_lr.pickled'
+        fname = well_name + '_D_' + method_name + '_lr' + pangea.wellintervals.FILE_EXT
         (f, fname) = serv_instance._openUniqFileName(fname, w_abspath, uid)
         db.setContainerSingleAttribute(mid, 'format', 'layers_method')
-        pickle.dump(data[0], f)
+        pangea.wellintervals.dump_rows(data[0], f)
         f.close()
         top, bottom = findLayersTopBott(data)
         db.setContainerSingleAttribute(mid, 'top', top)
         db.setContainerSingleAttribute(mid, 'bottom', bottom)
         db.setContainerSingleAttribute(mid, 'Type', 'UNKNOWN')
     elif data[1] == "lithology_method":
-        fname = well_name + '_D_' + method_name + '_lt.pickled'
+        fname = well_name + '_D_' + method_name + '_lt' + pangea.wellintervals.FILE_EXT
         (f, fname) = serv_instance._openUniqFileName(fname, w_abspath, uid)
         db.setContainerSingleAttribute(mid, 'format', 'lithology_method')
-        pickle.dump(data[0], f)
+        pangea.wellintervals.dump_rows(data[0], f)
         f.close()
         top, bottom = findLayersTopBott(data)
         db.setContainerSingleAttribute(mid, 'top', top)
         db.setContainerSingleAttribute(mid, 'bottom', bottom)
         db.setContainerSingleAttribute(mid, 'Type', 'LITHOLOGY')
     elif data[1] == "saturation_method":
-        fname = well_name + '_D_' + method_name + '_st.pickled'
+        fname = well_name + '_D_' + method_name + '_st' + pangea.wellintervals.FILE_EXT
         (f, fname) = serv_instance._openUniqFileName(fname, w_abspath, uid)
         db.setContainerSingleAttribute(mid, 'format', 'saturation_method')
-        pickle.dump(data[0], f)
+        pangea.wellintervals.dump_rows(data[0], f)
         f.close()
         top, bottom = findLayersTopBott(data)
         db.setContainerSingleAttribute(mid, 'top', top)
         db.setContainerSingleAttribute(mid, 'bottom', bottom)
         db.setContainerSingleAttribute(mid, 'Type', 'SATURATION')
     elif data[1] == "stratigraphy":
-        fname = well_name + '_D_' + method_name + '_sr.pickled'
+        fname = well_name + '_D_' + method_name + '_sr' + pangea.wellintervals.FILE_EXT
         (f, fname) = serv_instance._openUniqFileName(fname, w_abspath, uid)
         db.setContainerSingleAttribute(mid, 'format', 'stratigraphy')
-        pickle.dump(data[0], f)
+        pangea.wellintervals.dump_rows(data[0], f)
         f.close()
         top, bottom = findLayersTopBott(data)
         db.setContainerSingleAttribute(mid, 'top', top)
         db.setContainerSingleAttribute(mid, 'bottom', bottom)
         db.setContainerSingleAttribute(mid, 'Type', 'UNKNOWN')
     elif (data[1] == "measurement") or (data[1] == "layer_model") :
-        fname = well_name + '_D_' + method_name + '_ms.pickled'
+        fname = well_name + '_D_' + method_name + '_ms' + pangea.wellintervals.FILE_EXT
         (f, fname) = serv_instance._openUniqFileName(fname, w_abspath, uid)
         db.setContainerSingleAttribute(mid, 'format', data[1])
-        pickle.dump(data[0], f)
+        pangea.wellintervals.dump_rows(data[0], f)
         f.close()
         top, bottom = findLayersTopBott(data)  # !!! @TODO: empty dictionary will cause exception!
-        amin, amax = findLayersDataMinMax(data)
+        amin, amax = stats.get('min', MAXFLOAT), stats.get('max', MAXFLOAT)
         # serv_instance.loger.debug('min, max of measurements or layer model', (amin, amax))
         db.setContainerSingleAttribute(mid, 'top', top)
         db.setContainerSingleAttribute(mid, 'bottom', bottom)
@@ -523,20 +516,20 @@ def storeMethodData2Db(serv_instance, db,  well_name, w_path, method_name, mid,
         db.setContainerSingleAttribute(mid, 'max', amax)
         db.setContainerSingleAttribute(mid, 'Type', 'UNKNOWN')
     elif data[1] == "test_results_method":
-        fname = well_name + '_D_' + method_name + '_ts.pickled'
+        fname = well_name + '_D_' + method_name + '_ts' + pangea.wellintervals.FILE_EXT
         (f, fname) = serv_instance._openUniqFileName(fname, w_abspath, uid)
         db.setContainerSingleAttribute(mid, 'format', 'test_results_method')
-        pickle.dump(data[0], f)
+        pangea.wellintervals.dump_rows(data[0], f)
         f.close()
         top, bottom = findLayersTopBott(data)
         db.setContainerSingleAttribute(mid, 'top', top)
         db.setContainerSingleAttribute(mid, 'bottom', bottom)
         db.setContainerSingleAttribute(mid, 'Type', 'UNKNOWN')
     elif data[1] == "coring_method":
-        fname = well_name + '_D_' + method_name + '_cr.pickled'
+        fname = well_name + '_D_' + method_name + '_cr' + pangea.wellintervals.FILE_EXT
         (f, fname) = serv_instance._openUniqFileName(fname, w_abspath, uid)
         db.setContainerSingleAttribute(mid, 'format', 'coring_method')
-        pickle.dump(data[0], f)
+        pangea.wellintervals.dump_rows(data[0], f)
         f.close()
         top, bottom = findLayersTopBott(data)
         db.setContainerSingleAttribute(mid, 'top', top)
@@ -545,6 +538,7 @@ def storeMethodData2Db(serv_instance, db,  well_name, w_path, method_name, mid,
     else:
         raise RuntimeError('Unsupported data type %s' % data[1])
 
+    storeMethodStats(db, mid, stats)
     m_path = os.path.join(w_path, fname)
     db.setContainerSingleAttribute(mid, 'DPath', m_path)
     db.setContainerSingleAttribute(mid, 'ZType', 1)
@@ -554,7 +548,7 @@ def storeMethodData2Db(serv_instance, db,  well_name, w_path, method_name, mid,
     except IndexError:
         pass
 
-def readWellMethodDataFromDB(loger, projRoot, db, wid, method_name, encodeb64=True):
+def readWellMethodDataFromDB(loger, projRoot, db, wid, method_name, encodeb64=True, irregular_columns=False):
     try:
         mid = db.getContainerByName(wid, 'weld', method_name)
     except DBException as ex:
@@ -573,6 +567,25 @@ def readWellMethodDataFromDB(loger, projRoot, db, wid, method_name, encodeb64=Tr
         log.debug('getWellMethodData returns: %s', ans)
         return ans
     abs_path = os.path.join(projRoot, path)
+    ans = readWellMethodDataFromFile(abs_path, format, encodeb64, method_name, irregular_columns)
+    try:
+        uom = db.getContainerSingleAttribute(mid, 'units')
+    except DBException as ex:
+        uom = ''
+    ans.append(uom)
+    return ans
+
+# Formats of methods stored as lists of rows (md_top, md_bottom, value...) or (md, value) for boundaries,
+# in the columnar format (see pangea.wellintervals) or pickled
+INTERVAL_FORMATS = ('boundary_method', 'layers_method', 'lithology_method', 'saturation_method',
+                    'stratigraphy', 'measurement', 'test_results_method', 'coring_method',
+                    'layer_model', 'core_description', 'volume_model')
+
+def readWellMethodDataFromFile(abs_path, format, encodeb64=True, method_name=None, irregular_columns=False):
+    """Reads data of well method stored in file abs_path in the given format.
+    If irregular_columns is True, data of irregular curves are output as two columns [mds, values]
+    instead of pairs (md, value).
+    Return: [data, format], the same as readWellMethodDataFromDB without units"""
     if format == 'curve':
         ans = readCurveData(abs_path)
         if encodeb64:
@@ -590,26 +603,154 @@ def readWellMethodDataFromDB(loger, projRoot, db, wid, method_name, encodeb64=Tr
             tmp[5] = base64.b64encode(tmp[5]) # coordinates
         ans = [tmp, 'seismic_segment']
     elif format in ['irregular_curve', 'reflection_coefficients']:
-        bdat = readIrregularCurveData(abs_path)[0]
+        if irregular_columns:
+            bdats = [memoryview(c).cast('B') for c in readIrregularCurveColumns(abs_path)]
+        else:
+            bdats = readIrregularCurveData(abs_path)
         if encodeb64:
-            bdat = base64.b64encode(bdat)
-        ans = [[bdat], format]
-    elif (format in ['boundary_method', 'layers_method', 'lithology_method', 'saturation_method',
-                     'stratigraphy', 'measurement', 'test_results_method', 'coring_method',
-                     'layer_model', 'core_description', 'volume_model']):
-        with open(abs_path, 'rb') as f:
-            d = pickle.load(f)
-            ans = [d,  format]
-            f.close()
+            bdats = [base64.b64encode(b) for b in bdats]
+        ans = [bdats, format]
+    elif format in INTERVAL_FORMATS:
+        ans = [pangea.wellintervals.load_rows(abs_path), format]
     else:
         log.error('Unsupported curve format %s for method %s', format,method_name)
         raise RuntimeError(codecs.encode('Unsupported curve format %s' % format, 'utf8'))
+    return ans
+
+
+# Size of chunks curve data are read by, multiple of 3 so that chunks are base64 encoded independently
+CURVE_CHUNK_SIZE = 3 * 64 * 1024
+
+class CurveFile(namedtuple('CurveFile', ['path', 'offset', 'length', 'start', 'step', 'uom'])):
+    """Location of data of regular curve in file: data are length bytes starting at offset."""
+    __slots__ = ()
+
+def openCurveFileFromDB(projRoot, db, wid, method_name):
+    """Returns CurveFile for the regular curve method_name of well wid. None is returned if
+    the method is not a regular curve or some of its attributes are missing, readWellMethodDataFromDB
+    should be used in this case."""
+    try:
+        mid = db.getContainerByName(wid, 'weld', method_name)
+        if db.getContainerSingleAttribute(mid, 'format') != 'curve':
+            return None
+        path = db.getContainerSingleAttribute(mid, 'DPath')
+    except DBException:
+        return None
     try:
         uom = db.getContainerSingleAttribute(mid, 'units')
-    except DBException as ex:
+    except DBException:
         uom = ''
-    ans.append(uom)
-    return ans
+    return openCurveFile(os.path.join(projRoot, path), uom)
+
+def openCurveFile(abs_path, uom=''):
+    "Returns CurveFile for the regular curve stored in abs_path"
+    dx = pangea.dxheaders.parse_header(abs_path)
+    ol = dx.obj_list
+    assert (ol[0].get_class() == 'gridpositions'), 'Illegal DX Object class in well curve[0] - must be gridpositions'
+    assert (ol[2].get_data_repr() == 'lsb'), 'Illegal DX Object representation: must be lsb'
+    [num_points], [start], [step] = ol[0].get_regarray_params()
+    offset = dx.datastart + ol[2].get_data_addr()
+    # the same number of bytes as f.read(length) would return
+    length = max(0, min(ol[2].get_data_length(), os.path.getsize(abs_path) - offset))
+    return CurveFile(abs_path, offset, length, start, step, uom)
+
+def iterFileChunks(path, offset, length, chunk_size=CURVE_CHUNK_SIZE):
+    """Yields length bytes of file path starting at offset by chunks of chunk_size bytes"""
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        while length > 0:
+            buf = f.read(min(chunk_size, length))
+            if not buf:
+                break
+            length -= len(buf)
+            yield buf
+
+def b64encodeIter(chunks):
+    """Incremental base64 encoder: yields encoded chunks, concatenation of them
+    is the same as base64.b64encode of concatenated input chunks"""
+    rest = b''
+    for c in chunks:
+        if rest:
+            c = rest + c
+        n = len(c) - len(c) % 3
+        rest = c[n:]
+        if n:
+            yield base64.b64encode(c[:n])
+    if rest:
+        yield base64.b64encode(rest)
+
+def _msgpackBinHeader(n):
+    "Header of msgpack bin object of n bytes (msgpack.Packer has no method for it)"
+    if n < 0x100:
+        return struct.pack('>BB', 0xc4, n)
+    if n < 0x10000:
+        return struct.pack('>BH', 0xc5, n)
+    return struct.pack('>BI', 0xc6, n)
+
+def curveMsgpackIter(cf, prefix=(), delimit=False):
+    """Outputs regular curve cf in msgpack format without reading the whole data in memory.
+    The output is the same as msgpack.packb([[start, step, data], 'curve', uom]) or, if prefix is not empty,
+    pack_message(list(prefix) + [[[start, step, data], 'curve', uom]], delimit)."""
+    p = msgpack.Packer()
+    head = b''
+    if prefix:
+        head += p.pack_array_header(len(prefix) + 1) + b''.join(p.pack(x) for x in prefix)
+    head += p.pack_array_header(3) + p.pack_array_header(3) + p.pack(cf.start) + p.pack(cf.step) + _msgpackBinHeader(cf.length)
+    tail = p.pack('curve') + p.pack(cf.uom)
+    if prefix and delimit:
+        head = MSG_MAGIC + struct.pack('<i', len(head) + cf.length + len(tail)) + head
+    yield head
+    yield from iterFileChunks(cf.path, cf.offset, cf.length)
+    yield tail
+
+def curveJsonIter(cf):
+    """Outputs regular curve cf as JSON [[start, step, base64_data], 'curve', uom], data are
+    base64 encoded by chunks"""
+    yield ('[[%s,%s,"' % (json.dumps(cf.start), json.dumps(cf.step))).encode('utf-8')
+    yield from b64encodeIter(iterFileChunks(cf.path, cf.offset, cf.length))
+    yield ('"],"curve",%s]' % json.dumps(cf.uom, ensure_ascii=False)).encode('utf-8')
+
+
+# Formats of methods which data are read from files only (no DB access needed)
+FILE_FORMATS = set(['curve', 'array', 'seismic_segment', 'irregular_curve', 'reflection_coefficients',
+                    'boundary_method', 'layers_method', 'lithology_method', 'saturation_method',
+                    'stratigraphy', 'measurement', 'test_results_method', 'coring_method',
+                    'layer_model', 'core_description', 'volume_model'])
+
+class MethodLocation(namedtuple('MethodLocation', ['wid', 'mid', 'format', 'dpath', 'units', 'boundaries',
+                                                   'path', 'protected', 'owner'])):
+    """Well method resolved from DB, see P4DBbase.getWellMethodsLocations. dpath is relative to projects root"""
+    __slots__ = ()
+
+def resolveWellMethods(db, prid, pairs):
+    """Resolves list of (well_name, method_name) pairs of the project prid.
+    Returns dictionary {(well_name, method_name): MethodLocation}, pairs that are not found are omitted.
+    Missing units are '', as readWellMethodDataFromDB outputs them."""
+    return dict((p, MethodLocation(*loc)._replace(units=loc[4] or ''))
+                for (p, loc) in db.getWellMethodsLocations(prid, pairs).items())
+
+def packIntervalMethodData(abs_path, format, uom):
+    """Returns data of interval method packed with msgpack, the same as msgpack.packb of
+    readWellMethodDataFromFile(abs_path, format, False) + [uom], rows in the columnar format
+    are packed without creating Python objects."""
+    return b'\x93' + pangea.wellintervals.load_rows_msgpack(abs_path) + msgpack.packb(format) + msgpack.packb(uom)
+
+def readMethodMessage(projRoot, well_name, method_name, loc, delimit=False):
+    """Reads method data of well from file according to the resolved location loc and returns iterable of
+    chunks of the message pack_message([well_name, method_name, data], delimit). Data of regular curves are not
+    read here: only the header of file is parsed, the returned iterator reads data by chunks (see curveMsgpackIter).
+    Returns None if data can't be read without DB (the location or file format is unknown)."""
+    if loc is None or loc.boundaries or loc.dpath is None or loc.format not in FILE_FORMATS:
+        return None
+    abs_path = os.path.join(projRoot, loc.dpath)
+    if loc.format == 'curve':
+        return curveMsgpackIter(openCurveFile(abs_path, loc.units), (well_name, method_name), delimit)
+    if loc.format in INTERVAL_FORMATS:
+        msg = b'\x93' + msgpack.packb(well_name) + msgpack.packb(method_name) + \
+              packIntervalMethodData(abs_path, loc.format, loc.units)
+        return [frame_message(msg, delimit)]
+    data = readWellMethodDataFromFile(abs_path, loc.format, False, method_name) + [loc.units]
+    return [pack_message([well_name, method_name, data], delimit)]
 
 
 def storeBoundariesData2Db(self, db, well_name, strid, wid, method_name, mid, data, uid):
@@ -694,31 +835,113 @@ def recalculateMDtoTVDbyDL(altitude, dlData, mdList):
         # Here the case of len(convTable) == 1 means that the only point was added at the 
         # previous step, so it is equal to (0.0, altitude)
         return [altitude - md for md in mdList]
-    def findValFromTableExtrapolateLastPoints(md):
-        tvd = pangea.misc_util.valueFromTableLinInter(convTable, md)
-        if tvd == MAXFLOAT:
-            dmd = convTable[-1][0] - convTable[-2][0]
-            dmaxmd = md - convTable[-2][0]
-            tvd = convTable[-2][1] + (convTable[-1][1] - convTable[-2][1]) * (dmaxmd/dmd)
-        elif tvd == -MAXFLOAT:
-            return MAXFLOAT
-        return tvd
-    ans = [findValFromTableExtrapolateLastPoints(md) for md in mdList]
+    # MDs are interpolated by the table, extrapolated beyond its last point (see pangea.welltraj)
+    ans = pangea.welltraj.convert(mdList, pangea.welltraj.conversion_table(convTable))[:, 0].tolist()
 #    return filter(lambda(x): x>=0.0, ans) # Drop all points with md < 0
     return ans
 
 def findValFromTableExtrapolateLastPoints(convTable, md):
     assert len(convTable) >= 2, 'Conversion table too short in well_utils.findValFromTableExtrapolateLastPoints'
     assert type(convTable[0]) == tuple, 'Invalid argument in findValFromTableExtrapolateLastPoints: must be list of tuples'
-    tvd = pangea.misc_util.valueFromTableLinInter(convTable, md)
-    if tvd == MAXFLOAT:
+    if md - convTable[-1][0] >= pangea.misc_util.DEF_ZACCUR:  # md is extrapolated
         dmd = convTable[-1][0] - convTable[-2][0]
         assert abs(dmd) > MD_EPS, 'Distance between two last points of conversion table in well_utils.findValFromTableExtrapolateLastPoints is too small: %f' % dmd
-        dmaxmd = md - convTable[-2][0]
-        tvd = convTable[-2][1] + (convTable[-1][1] - convTable[-2][1]) * (dmaxmd/dmd)
-    elif tvd == -MAXFLOAT:
-        return MAXFLOAT
-    return tvd
+    table = pangea.welltraj.conversion_table([p[:2] for p in convTable])
+    return pangea.welltraj.convert([md], table)[0, 0].item()
+
+def convertMDsByDL(coords, dlData, mdList):
+    """Accepts well coordinates (x_well, y_well, alt), directional log data and list of md values,
+    returns array (len(mdList), 3) of x, y and TVD (absolute depth) of points, the same as makeTrajectoryFromDL
+    and recalculateMDtoTVDbyDL give. MDs above the collar are MAXFLOAT.
+    """
+    return convertWellsMDsByDL([coords], [dlData], [mdList])[0]
+
+def convertWellsMDsByDL(coords_list, dlData_list, mdLists):
+    """Bulk version of convertMDsByDL: MDs of all wells are converted at once.
+    Wells without directional log (dlData is empty) are vertical.
+    Return: list of arrays (len(mdLists[i]), 3) of x, y, TVD
+    """
+    tables = [_trajectoryTable(coords, dlData) for (coords, dlData) in zip(coords_list, dlData_list)]
+    return pangea.welltraj.convert_wells(mdLists, tables)
+
+def _trajectoryTable(coords, dlData):
+    "Conversion table MD -> (x, y, TVD) by directional log, the well is vertical if there is no log"
+    (mds, xyz) = pangea.welltraj.trajectory_table(coords, dlData)
+    if len(mds) < 2:
+        # vertical well: the second point is 1m below the collar
+        (mds, xyz) = pangea.welltraj.conversion_table([(0.0, coords[0], coords[1], coords[2]),
+                                                       (1.0, coords[0], coords[1], coords[2] - 1.0)])
+    return (mds, xyz)
+
+def readWellConversion(projRoot, db, wid):
+    """Reads tables converting MDs of well wid to other domains:
+    'md', 'xyz' - MD -> (x, y, TVD) by directional log (straight vertical line if there is no log),
+    'zt' - depth (-TVD) -> time by trajectories TrajectoryD and TrajectoryT, sorted by depth
+    (empty if trajectories are missing or do not correspond to each other).
+    Return: dictionary of lists (to be cached)
+    """
+    coords = db.getContainerSingleAttribute(wid, 'Coords')
+    dlData = readDirectionalLogs(projRoot, db, [wid]).get(wid) or []
+    (mds, xyz) = _trajectoryTable(coords, dlData)
+    try:
+        tr_d = db.getContainerArrayAttribute(wid, 'TrajectoryD')
+        tr_t = db.getContainerArrayAttribute(wid, 'TrajectoryT')
+    except DBException as ex:
+        log.info('No trajectories in well %d: %s', wid, ex)
+        tr_d = tr_t = []
+    zt = []
+    if len(tr_d) == len(tr_t) and len(tr_d) >= 2:
+        # trajectories have the same points in depth and in time, time is a function of depth
+        z_t = np.array([(-pd[2], pt[2]) for (pd, pt) in zip(tr_d, tr_t)], dtype=np.float64)
+        z_t = z_t[(np.abs(z_t) < MAXFLOAT09).all(axis=1)]
+        (depths, ind) = np.unique(z_t[:, 0], return_index=True)
+        if len(depths) >= 2:
+            zt = np.column_stack((depths, z_t[ind, 1])).tolist()
+    return {'md': mds.tolist(), 'xyz': xyz.tolist(), 'zt': zt}
+
+# Domains methods can be converted to: TVD (absolute depth, as in trajectories) and two way time
+CONVERSION_DOMAINS = ('tvd', 'twt')
+
+def convertMethodToDomain(abs_path, format, conv, domain, step=None, encodeb64=True, max_samples=None):
+    """Reads curve (regular or irregular) stored in file abs_path and converts MDs of its samples to domain
+    ('tvd' or 'twt') by tables conv returned by readWellConversion. Samples above the collar or out of
+    time-depth correspondence are dropped.
+    If step is given, values are resampled with this step along TVD (step is output negative, as TVD decreases
+    downwards) or time, the nearest sample is taken. Raises ValueError if format can't be converted
+    or resampling gives more than max_samples samples.
+    Return: [[start, step, bdata], 'curve'] if step is given, [[bdata], 'irregular_curve'] otherwise
+    (bdata are values or pairs (tvd_or_t, value) of <f4)
+    """
+    if format == 'curve':
+        (start, md_step, bdata) = readCurveData(abs_path)
+        values = np.frombuffer(bdata, pangea.wellstats.CURVE_DTYPE, len(bdata) // pangea.wellstats.CURVE_DTYPE.itemsize)
+        mds = start + md_step * np.arange(len(values))
+    elif format in ['irregular_curve', 'reflection_coefficients']:
+        (mds, values) = readIrregularCurveColumns(abs_path)
+    else:
+        raise ValueError('Methods of format %s can not be converted to %s' % (format, domain))
+    keys = pangea.welltraj.convert(mds, (np.array(conv['md']), np.array(conv['xyz'])))[:, 2]
+    sign = -1.0     # TVD decreases downwards
+    if domain == 'twt':
+        z_t = np.array(conv['zt'])
+        if len(z_t) < 2:
+            raise ValueError('No time-depth correspondence')
+        # undefined TVD (MAXFLOAT) becomes -MAXFLOAT depth, and undefined time then
+        keys = pangea.welltraj.convert(-keys, (z_t[:, 0], z_t[:, 1:]))[:, 0]
+        sign = 1.0
+    ok = keys < MAXFLOAT09
+    (keys, values) = (keys[ok], values[ok])
+    if step:
+        (start, res) = pangea.welltraj.resample_nearest(sign * keys, values, step, max_samples)
+        bdata = memoryview(np.ascontiguousarray(res, dtype=pangea.wellstats.CURVE_DTYPE)).cast('B')
+        if encodeb64:
+            bdata = base64.b64encode(bdata)
+        return [[sign * start if start < MAXFLOAT09 else MAXFLOAT, sign * step, bdata], 'curve']
+    pairs = np.column_stack((keys, values)).astype(pangea.wellstats.CURVE_DTYPE)
+    bdata = memoryview(pairs).cast('B')
+    if encodeb64:
+        bdata = base64.b64encode(bdata)
+    return [[bdata], 'irregular_curve']
 
 def makeTrajectoryFromDL(maxMD, coords, dlData):
     """Makes trajectory from the directional log data. Extrapolates the trajectory to the maximum
@@ -728,26 +951,36 @@ def makeTrajectoryFromDL(maxMD, coords, dlData):
     [{'md': MD, 'dx': dX, 'dy': dY, 'tvd': TVD}, ...]
     The dlData is assumed to be sorted by md values.
     """
-    traj = [(p['dx'] + coords[0], p['dy'] + coords[1], p['tvd'] + 0.0) for p in dlData  ]
-    mdList = [p['md'] + 0.0 for p in dlData]
-    # Add first point corresponding to collar if md does not start from 0:
-    if len(dlData) == 0 or dlData[0]['md'] != 0.0:
-        traj.insert(0, coords)
-        mdList.insert(0, 0.0)
+    (mdList, xyz) = pangea.welltraj.trajectory_table(coords, dlData)
+    traj = [tuple(p) for p in xyz.tolist()]
     if len(traj) < 2:
         traj.append((coords[0], coords[1], coords[2] - maxMD))
     elif (maxMD < MAXFLOAT09) and (maxMD > mdList[-1]):  # do the extrapolation using the last 2 points
         dmd = mdList[-1] - mdList[-2]
         if dmd < MD_EPS:
             raise RuntimeError("Last two points of directional log are too close: %f and %f" % (mdList[-2], mdList[-1]))
-        dmaxmd = maxMD - mdList[-2]
-        x = traj[-2][0] + (traj[-1][0] - traj[-2][0]) * (dmaxmd/dmd)
-        y = traj[-2][1] + (traj[-1][1] - traj[-2][1]) * (dmaxmd/dmd)
-        tvd = traj[-2][2] + (traj[-1][2] - traj[-2][2]) * (dmaxmd/dmd)
-        traj.append((x, y, tvd))
-        mdList.append(maxMD)
+        traj.append(tuple(pangea.welltraj.extrapolate([maxMD], (mdList, xyz))[0].tolist()))
     return traj
 
+def readDirectionalLogs(projRoot, db, wids):
+    """Reads directional logs data ([{'md': MD, 'dx': dX, 'dy': dY, 'tvd': TVD}, ...]) of wells wids.
+    Return: {wid: dlData}, wells without directional log are omitted
+    """
+    dirls = db.getSubContainersListByTypeBulk(wids, 'dirl')
+    dir_ids = [l[0][0] for l in dirls.values()]
+    paths = dict(zip(dir_ids, db.getAttributesColumns(dir_ids, ['Path'])['Path'])) if dir_ids else {}
+    ans = {}
+    for (wid, l) in dirls.items():
+        d_path = paths.get(l[0][0])
+        if not d_path:
+            continue
+        try:
+            with open(os.path.join(projRoot, d_path), 'rb') as f:
+                ans[wid] = pickle.load(f)['data']
+        except (OSError, KeyError, pickle.UnpicklingError) as e:
+            log.error('Can not read directional log %s: %s', d_path, e)
+    return ans
+
 def getMaxMDForWellFromDB(db, prid, wid):
     minMD, maxMD = db.getMinMaxForParameterInContainer(prid, wid, 'weld', 'bottom')
     minMDb, maxMDb = db.getMinMaxForParameterInContainer(prid, wid, 'wbnd', 'bottom')
@@ -813,6 +1046,34 @@ def readWellMethodInfo(db, pid: int, well_name: str, wid: int, method_name: str,
             ans.append( (name, value or '', uom or '', comment or '') )
     return ans
 
+def readWellsMethodsInfo(db, pid: int, pairs):
+    """Bulk version of readWellMethodInfo (without info_name) for the list of (well_name, method_name) pairs.
+    Returns list of infos in the order of pairs, the number of queries does not depend on the number of pairs."""
+    locs = resolveWellMethods(db, pid, pairs)
+    for well_name in set(p[0] for p in pairs) - set(p[0] for p in locs):
+        db.getContainerByName(pid, 'wel1', well_name)  # raises DBNotFoundException for unknown wells
+    mids = list(set(l.mid for l in locs.values()))
+    infos = db.getSubContainersListByTypeBulk(mids, 'wmif') if mids else {}
+    info_ids = [c[0] for l in infos.values() for c in l]
+    cols = db.getAttributesColumns(info_ids, ['value', 'uom', 'comment']) if info_ids else {}
+    info_vals = dict(zip(info_ids, zip(*[cols[a] for a in ('value', 'uom', 'comment')]))) if info_ids else {}
+    res = []
+    for p in pairs:
+        loc = locs.get(p)
+        if loc is None:
+            log.error('No such method: %s in well %s', p[1], p[0])
+            res.append([])
+            continue
+        hasTimeData = int(loc.boundaries or bool(len(loc.path or '')))
+        ans = [['#owner#', loc.owner or '', '', ''], ['#protected#', loc.protected, '', ''], ['#hasTimeData#', hasTimeData, '', '']]
+        for (cid, name) in infos.get(loc.mid, []):
+            if len(name) == 0 or name[0] == '#':
+                continue   # Skip special names that could have infiltrated into the database
+            value, uom, comment = info_vals[cid]
+            ans.append((name, value or '', uom or '', comment or ''))
+        res.append(ans)
+    return res
+
 if __name__ == '__main__':
     from pprint import pprint
     # Do some tests here...